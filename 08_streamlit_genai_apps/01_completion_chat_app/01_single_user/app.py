@@ -1,7 +1,11 @@
+import os
+import sys
+# chat_common (helpers shared by the chat apps) lives two folders up
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from model import BotModel
+from chat_common.turn_metrics import summarize
 import streamlit as st
 from dotenv import load_dotenv
-import os
 
 
 load_dotenv()
@@ -27,19 +31,32 @@ for message in st.session_state.bot.get_messages():
         st.markdown(message["content"])
 
 # Main chat interface
+turn = None
 if prompt := st.chat_input("How can I help?"):
+    turn = st.session_state.bot.start_turn()
 
     with st.chat_message("user", avatar=USER_AVATAR):
         st.markdown(prompt)
 
     with st.chat_message("assistant", avatar=BOT_AVATAR):
         message_placeholder = st.empty()
+        render = turn.timed("render", message_placeholder.markdown)
         full_response = ""
-        for response in st.session_state.bot.send_message({"role": "user", "content": prompt}):
-            full_response += response.choices[0].delta.content or ""
-            message_placeholder.markdown(full_response + "|")
-        message_placeholder.markdown(full_response)
+        stream = st.session_state.bot.send_message({"role": "user", "content": prompt}, metrics=turn)
+        with turn.stage("stream"):
+            for delta in turn.stream(response.choices[0].delta.content or "" for response in stream):
+                full_response += delta
+                render(full_response + "|")
+        render(full_response)
     st.session_state.bot.messages.append({"role": "assistant", "content": full_response})
 
 # Save chat history after each interaction
-st.session_state.bot.save_chat_history()
\ No newline at end of file
+st.session_state.bot.save_chat_history(metrics=turn)
+
+if turn is not None:
+    turn_records = st.session_state.setdefault("turn_metrics", [])
+    turn_records.append(turn.finish())
+    del turn_records[:-50]
+if st.session_state.get("turn_metrics"):
+    with st.sidebar.expander("⏱️ Turn timings"):
+        st.json(summarize(st.session_state.turn_metrics))
\ No newline at end of file
@@ -1,20 +1,157 @@
+import os
+import atexit
 import shelve
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict
+
+# single:  the whole history pickled under one "messages" key, shelve
+#          opened and closed on every call (the original format)
+# records: shelve kept open for the process lifetime, one key per message
+#          plus a "seq" counter, so a turn writes only the new messages
+SHELVE_STORAGE_MODE = os.getenv("SHELVE_STORAGE_MODE", "records")
+
+SEQ_KEY = "seq"
+LEGACY_KEY = "messages"
+
+def _record_key(seq: int) -> str:
+    return f"msg:{seq:08d}"
+
+class _RecordStore:
+    """One open shelve per file, shared by every Database pointing at it.
+
+    Some dbm backends (sqlite3) refuse to be used from another thread, and
+    Streamlit reruns scripts on different threads, so every shelve call runs
+    on a single owner thread.
+    """
+
+    def __init__(self, dbName: str) -> None:
+        self.dbName = dbName
+        # A plain daemon thread rather than an executor, so close() still
+        # works from atexit after executors have been shut down
+        self._calls: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._serve, name="shelve", daemon=True).start()
+        self._db = None
+        # Messages as last written, to find what a save adds
+        self._saved = []
+        self._run(self._open)
+
+    def _serve(self):
+        while True:
+            future, fn, args = self._calls.get()
+            if fn is None:
+                return
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _run(self, fn, *args):
+        future = Future()
+        self._calls.put((future, fn, args))
+        return future.result()
+
+    def _open(self):
+        self._db = shelve.open(self.dbName)
+        if SEQ_KEY not in self._db and LEGACY_KEY in self._db:
+            self._migrate()
+        count = self._db.get(SEQ_KEY, 0)
+        self._saved = [self._db[_record_key(seq)] for seq in range(count)]
+
+    def _migrate(self):
+        """Split a single-key history into records; "seq" is written last."""
+        messages = self._db[LEGACY_KEY]
+        for seq, message in enumerate(messages):
+            self._db[_record_key(seq)] = message
+        self._db[SEQ_KEY] = len(messages)
+        del self._db[LEGACY_KEY]
+        self._db.sync()
+        print(f"✅ Migrated {len(messages)} messages in {self.dbName} to per-message records")
+
+    def load(self) -> [dict]:
+        return list(self._saved)
+
+    def save(self, messages: [dict]):
+        self._run(self._save, list(messages))
+
+    def _save(self, messages: [dict]):
+        count = len(self._saved)
+        if len(messages) >= count and messages[:count] == self._saved:
+            start = count
+        else:
+            # History was cleared or edited: rewrite it after the part
+            # that still matches
+            start = 0
+            while start < min(count, len(messages)) and messages[start] == self._saved[start]:
+                start += 1
+            # Lower "seq" before touching any record, so a crash below
+            # leaves only records that are still there and still right
+            self._db[SEQ_KEY] = start
+            self._db.sync()
+            for seq in range(len(messages), count):
+                del self._db[_record_key(seq)]
+        if start == len(messages) == count:
+            return
+        for seq in range(start, len(messages)):
+            self._db[_record_key(seq)] = messages[seq]
+        # Records beyond "seq" are ignored on load, so a crash mid-save
+        # leaves the history as it was before the new records
+        self._db[SEQ_KEY] = len(messages)
+        self._db.sync()
+        self._saved = messages
+
+    def close(self):
+        if self._db is not None:
+            self._run(self._db.close)
+            self._db = None
+        self._calls.put((None, None, None))
+
+_stores: Dict[str, _RecordStore] = {}
+_stores_lock = threading.Lock()
+
+def _get_store(dbName: str) -> _RecordStore:
+    with _stores_lock:
+        store = _stores.get(dbName)
+        if store is None:
+            store = _stores[dbName] = _RecordStore(dbName)
+        return store
+
+def close_all():
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+
+atexit.register(close_all)
 
 # Replace shelve and Connect your data to a
 # external data source
 # https://discuss.streamlit.io/t/best-practices-for-storing-user-data-in-a-streamlit-app-and-deploying-it-for-a-variable-number-of-users/39197
 class Database:
-    def __init__(self, dbName: str = "chat_history") -> None:
+    def __init__(self, dbName: str = "chat_history", mode: str = None) -> None:
         self.dbName = dbName
+        self.mode = mode or SHELVE_STORAGE_MODE
 
     # Load chat history from shelve file
     def load_chat_history(self)->[dict]:
+        if self.mode == "records":
+            return _get_store(self.dbName).load()
         with shelve.open(self.dbName) as db:
-            return db.get("messages", [])
+            return db.get(LEGACY_KEY, [])
 
 
     # Save chat history to shelve file
     def save_chat_history(self, messages: [dict]):
-        print("Database: Save", messages)
+        if self.mode == "records":
+            _get_store(self.dbName).save(messages)
+            return
         with shelve.open(self.dbName) as db:
-            db["messages"] = messages
+            db[LEGACY_KEY] = messages
+
+    # Release the open shelve (records mode); reopened on next use
+    def close(self):
+        with _stores_lock:
+            store = _stores.pop(self.dbName, None)
+        if store is not None:
+            store.close()
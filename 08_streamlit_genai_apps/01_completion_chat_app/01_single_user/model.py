@@ -1,7 +1,13 @@
+import os
+import sys
+# chat_common (helpers shared by the chat apps) lives two folders up
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from dotenv import load_dotenv, find_dotenv
 from database import Database
 from openai import OpenAI
+from chat_common.turn_metrics import TurnMetrics
 from typing import Any
+import time
 
 class BotModel:
     def __init__(self, name:str, model:str = "gpt-3.5-turbo-1106") -> None:
@@ -10,14 +16,20 @@ class BotModel:
         load_dotenv(find_dotenv()) 
         self.client : OpenAI = OpenAI()
         self.db = Database()
+        start = time.perf_counter()
         self.messages = self.load_chat_history()
+        # Reported as the first turn's load_history stage
+        self.load_history_s = time.perf_counter() - start
 
     def load_chat_history(self)->[]:
         return self.db.load_chat_history()
 
-    def save_chat_history(self):
-        print("Model: Save", self.messages)
-        self.db.save_chat_history(messages=self.messages)
+    def save_chat_history(self, metrics: TurnMetrics = None):
+        if metrics is None:
+            self.db.save_chat_history(messages=self.messages)
+            return
+        with metrics.stage("persist"):
+            self.db.save_chat_history(messages=self.messages)
 
     def delete_chat_history(self):
         print("Model: Delete")
@@ -30,13 +42,23 @@ class BotModel:
     def append_message(self, message: dict):
         self.messages.append(message)
 
-    def send_message(self, message: dict)->Any:
+    def start_turn(self) -> TurnMetrics:
+        metrics = TurnMetrics("completion_single_user")
+        if self.load_history_s is not None:
+            metrics.add("load_history", self.load_history_s)
+            self.load_history_s = None
+        return metrics
+
+    def send_message(self, message: dict, metrics: TurnMetrics = None)->Any:
         self.append_message(message=message)
-        stream = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.messages,
-            stream=True,
-        )
+        if metrics is None:
+            metrics = TurnMetrics("completion_single_user")
+        with metrics.stage("llm_request"):
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self.messages,
+                stream=True,
+            )
         return stream
 
     
\ No newline at end of file
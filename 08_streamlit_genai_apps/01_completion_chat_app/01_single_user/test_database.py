@@ -0,0 +1,79 @@
+import pytest
+
+from database import SEQ_KEY, _RecordStore
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingShelf:
+    """Shelf that dies (as the process would) after a number of changes."""
+
+    def __init__(self, db, changes_left: int):
+        self.db = db
+        self.changes_left = changes_left
+        self.changed = []
+
+    def _change(self, key):
+        if self.changes_left == 0:
+            raise Crash()
+        self.changes_left -= 1
+        self.changed.append(key)
+
+    def __setitem__(self, key, value):
+        self._change(key)
+        self.db[key] = value
+
+    def __delitem__(self, key):
+        self._change(key)
+        del self.db[key]
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def message(n, text=None):
+    return {"role": "user" if n % 2 == 0 else "assistant", "content": text or f"message {n}"}
+
+
+OLD = [message(n) for n in range(6)]
+EDITS = {
+    "cleared": [],
+    "shortened": OLD[:2],
+    "edited": OLD[:2] + [message(2, "edited"), message(3, "new answer")],
+}
+
+
+@pytest.mark.parametrize("edit", sorted(EDITS))
+@pytest.mark.parametrize("crash_after", range(8))
+def test_crash_while_rewriting_leaves_a_loadable_history(tmp_path, edit, crash_after):
+    path = str(tmp_path / "chat_history")
+    store = _RecordStore(path)
+    store.save(OLD)
+    real_db = store._db
+    store._db = CrashingShelf(real_db, crash_after)
+
+    try:
+        store.save(EDITS[edit])
+    except Crash:
+        pass
+    store._db = real_db
+    store.close()
+
+    history = _RecordStore(path).load()
+    # Either the new history, or an intact prefix of the old one
+    assert history == EDITS[edit] or history == OLD[:len(history)]
+
+
+def test_append_only_writes_the_new_records(tmp_path):
+    store = _RecordStore(str(tmp_path / "chat_history"))
+    store.save(OLD[:4])
+    real_db = store._db
+    store._db = shelf = CrashingShelf(real_db, changes_left=100)
+
+    store.save(OLD)
+    store._db = real_db
+    store.close()
+
+    assert shelf.changed == ["msg:00000004", "msg:00000005", SEQ_KEY]
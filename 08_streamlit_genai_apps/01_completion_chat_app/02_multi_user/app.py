@@ -1,7 +1,16 @@
+import os
+import sys
+# chat_common (helpers shared by the chat apps) lives two folders up
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from model import BotModel
+from context_builder import build_chat_context
+from chat_common.stream_renderer import StreamRenderer
+from llm_clients import llm_slot
+from chat_common.turn_metrics import TurnMetrics, summarize
 import streamlit as st
 from dotenv import load_dotenv
 import uuid
+import time
 from state_utils import save_user_session_state, load_user_session_state, get_user_session_path
 from model import (
     create_new_chat,
@@ -10,11 +19,11 @@ from model import (
     get_chat_by_id,
     save_chat_by_id,
     rename_chat_title,
-    delete_chat_by_id
+    delete_chat_by_id,
+    get_chat_cache_stats,
+    search_chats
 )
 
-import openai
-
 # Load environment variables
 load_dotenv()
 
@@ -23,6 +32,8 @@ st.title("Multi-User Chatbot powered by OpenAI LLM developed by Muhammad Farhan
 
 USER_AVATAR = "👤"
 BOT_AVATAR = "🤖"
+# Messages shown at once; older ones are paged in with "Load earlier messages"
+MESSAGE_WINDOW = 50
 
 # --- API KEY ---
 api_key = st.sidebar.text_input("🔑 Enter your OpenAI API key", type="password")
@@ -30,8 +41,6 @@ if not api_key:
     st.warning("Please enter your API key to start chatting.")
     st.stop()
 
-openai.api_key = api_key
-
 # --- USER ID ---
 user_id = st.sidebar.text_input("🧑 Your User ID", value="default_user")
 
@@ -48,6 +57,19 @@ if "selected_chat_id" not in st.session_state:
 st.sidebar.markdown("## 💬 Your Chats")
 chat_list = list_chats_for_user(user_id)
 
+# --- SIDEBAR: SEARCH ---
+search_query = st.sidebar.text_input("🔎 Search chats", placeholder='words, prefix*, "a phrase"')
+if search_query.strip():
+    titles = {chat['id']: chat['title'] for chat in chat_list}
+    results = [r for r in search_chats(user_id, search_query) if r['chat_id'] in titles]
+    if not results:
+        st.sidebar.caption("No matching messages.")
+    for result in results:
+        if st.sidebar.button(f"{titles[result['chat_id']]}: {result['snippet']}", key=f"search_{result['chat_id']}"):
+            st.session_state.selected_chat_id = result['chat_id']
+            st.rerun()
+    st.sidebar.divider()
+
 for chat in chat_list:
     if st.sidebar.button(chat['title'], key=chat['id']):
         st.session_state.selected_chat_id = chat['id']
@@ -60,21 +82,43 @@ if st.sidebar.button("➕ New Chat"):
     st.rerun()
 
 # --- MAIN CHAT AREA ---
+load_start = time.perf_counter()
 selected_chat = get_chat_by_id(user_id, st.session_state.selected_chat_id)
+load_history_s = time.perf_counter() - load_start
 if not selected_chat:
     st.info("Start by creating a new chat from the sidebar.")
     st.stop()
 
 # st.markdown(f"##### 📝 {selected_chat['title']}")
 
-# --- Display chat messages ---
-for msg in selected_chat["messages"]:
+# --- Display chat messages (windowed) ---
+if st.session_state.get("window_chat_id") != st.session_state.selected_chat_id:
+    st.session_state.window_chat_id = st.session_state.selected_chat_id
+    st.session_state.window_size = MESSAGE_WINDOW
+
+render_start = time.perf_counter()
+all_messages = selected_chat["messages"]
+hidden = max(0, len(all_messages) - st.session_state.window_size)
+if hidden and st.button(f"⬆️ Load earlier messages ({hidden} hidden)"):
+    st.session_state.window_size += MESSAGE_WINDOW
+    st.rerun()
+visible = all_messages[hidden:]
+for msg in visible:
     with st.chat_message(msg["role"], avatar=USER_AVATAR if msg["role"] == "user" else BOT_AVATAR):
         st.markdown(msg["content"])
+render_ms = (time.perf_counter() - render_start) * 1000
+
+with st.sidebar.expander("🐞 Debug"):
+    st.write(f"Rendered {len(visible)} of {len(all_messages)} messages in {render_ms:.1f} ms")
+    st.json(get_chat_cache_stats())
 
 # --- Chat input ---
 user_input = st.chat_input("Your message")
 if user_input:
+    metrics = TurnMetrics("completion_multi_user")
+    metrics.add("load_history", load_history_s)
+    turn_error = None
+
     # Add user message
     selected_chat["messages"].append({"role": "user", "content": user_input})
 
@@ -87,24 +131,41 @@ if user_input:
         response = ""
         with st.chat_message("assistant", avatar=BOT_AVATAR):
             message_placeholder = st.empty()
-            stream = openai.chat.completions.create(
-                model="gpt-4",
-                messages=selected_chat["messages"],
-                stream=True
-            )
-            for chunk in stream:
-                delta = chunk.choices[0].delta.content or ""
-                response += delta
-                message_placeholder.markdown(response + "▌")
-            message_placeholder.markdown(response)
+            # Pooled per-key client; the slot is held until the stream ends
+            with llm_slot(api_key) as client, StreamRenderer(metrics.timed(
+                "render", lambda text, done: message_placeholder.markdown(text if done else text + "▌")
+            )) as renderer:
+                with metrics.stage("build_context"):
+                    # Newest turns within the token budget plus a rolling summary
+                    context = build_chat_context(selected_chat)
+                with metrics.stage("llm_request"):
+                    stream = client.chat.completions.create(
+                        model="gpt-4",
+                        messages=context,
+                        stream=True
+                    )
+                with metrics.stage("stream"):
+                    for delta in metrics.stream(chunk.choices[0].delta.content or "" for chunk in stream):
+                        renderer.write(delta)
+            response = renderer.text
     except Exception as e:
+        turn_error = e
         response = f"❌ Error: {str(e)}"
         with st.chat_message("assistant", avatar=BOT_AVATAR):
             st.markdown(response)
 
     # Save assistant message
     selected_chat["messages"].append({"role": "assistant", "content": response})
-    save_chat_by_id(user_id, st.session_state.selected_chat_id, selected_chat)
+    with metrics.stage("persist"):
+        save_chat_by_id(user_id, st.session_state.selected_chat_id, selected_chat)
+    turn_records = st.session_state.setdefault("turn_metrics", [])
+    turn_records.append(metrics.finish(turn_error))
+    del turn_records[:-50]
+
+# --- SIDEBAR: TURN TIMINGS ---
+if st.session_state.get("turn_metrics"):
+    with st.sidebar.expander("⏱️ Turn timings"):
+        st.json(summarize(st.session_state.turn_metrics))
 
 # --- Delete Chat ---
 if st.sidebar.button("🗑️ Delete Chat"):
@@ -0,0 +1,153 @@
+"""
+Compare list/load/append latency of the chat storage modes in model.py
+(json, log and sqlite) at production scale.
+
+    python benchmark_storage_at_scale.py --users 10000 --chats 100 --messages 10
+
+The defaults match the target scale (10k users x 100 chats = 1M chats),
+which takes a while to generate; pass smaller --users/--chats for a
+quick run. The data set is generated once under --workdir/pristine and
+kept for reruns unless --cleanup is given. Each mode runs on its own copy,
+so appends made by one mode never show up in the next.
+
+For a small, broad comparison of every chat store in the completion apps
+(create/rename/delete too, and disk footprint), use
+../benchmark_chat_stores.py instead.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+from datetime import datetime, timedelta
+from typing import List, Dict
+
+import model
+import chat_search
+import sqlite_store
+
+def _synthetic_chat(user_id: str, index: int, messages: int) -> Dict:
+    created = datetime(2024, 1, 1) + timedelta(minutes=index)
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "title": f"Chat {index}",
+        "created_at": created.isoformat(),
+        "messages": [
+            {"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"Synthetic message {i} " + "lorem ipsum " * 20}
+            for i in range(messages)
+        ]
+    }
+
+def generate(workdir: str, users: int, chats: int, messages: int) -> Dict[str, List[str]]:
+    """Write the same data set as a chats/ tree and as a SQLite database."""
+    chats_dir = os.path.join(workdir, "chats")
+    db_path = os.path.join(workdir, "chats.db")
+    sqlite_store.SQLITE_DB_PATH = db_path
+    layout = {}
+    for u in range(users):
+        user_id = f"user_{u:05d}"
+        user_dir = os.path.join(chats_dir, user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        docs = [_synthetic_chat(user_id, c, messages) for c in range(chats)]
+        manifest = {}
+        for doc in docs:
+            with open(os.path.join(user_dir, f"{doc['id']}.json"), "w", encoding="utf-8") as f:
+                json.dump(doc, f, indent=2)
+            manifest[doc["id"]] = model._manifest_entry(doc)
+        with open(os.path.join(user_dir, model.MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        sqlite_store.import_chats(docs)
+        layout[user_id] = [doc["id"] for doc in docs]
+        if (u + 1) % 500 == 0:
+            print(f"  generated {u + 1}/{users} users")
+    with open(os.path.join(workdir, "layout.json"), "w", encoding="utf-8") as f:
+        json.dump(layout, f)
+    return layout
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def prepare(pristine: str, workdir: str, mode: str) -> str:
+    """Copy the part of the pristine data set that mode reads; returns its directory."""
+    mode_dir = os.path.join(workdir, mode)
+    shutil.rmtree(mode_dir, ignore_errors=True)
+    os.makedirs(mode_dir)
+    if mode == "sqlite":
+        shutil.copy2(os.path.join(pristine, "chats.db"), os.path.join(mode_dir, "chats.db"))
+    else:
+        shutil.copytree(os.path.join(pristine, "chats"), os.path.join(mode_dir, "chats"))
+    return mode_dir
+
+def run(mode: str, mode_dir: str, layout: Dict[str, List[str]], ops: int, seed: int) -> Dict:
+    model.CHAT_STORAGE_MODE = mode
+    model.BASE_CHAT_DIR = os.path.join(mode_dir, "chats")
+    model._chat_cache.clear()
+    model._log_state.clear()
+    sqlite_store.SQLITE_DB_PATH = os.path.join(mode_dir, "chats.db")
+    chat_search.SEARCH_INDEX_DIR = os.path.join(mode_dir, "search_index")
+    rng = random.Random(seed)
+    users = list(layout)
+    timings = {"list": [], "load": [], "append": []}
+    for _ in range(ops):
+        user_id = rng.choice(users)
+        chat_id = rng.choice(layout[user_id])
+
+        start = time.perf_counter()
+        model.list_chats_for_user(user_id)
+        timings["list"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chat = model.get_chat_by_id(user_id, chat_id)
+        timings["load"].append(time.perf_counter() - start)
+
+        chat["messages"].append({"role": "user", "content": "benchmark question"})
+        chat["messages"].append({"role": "assistant", "content": "benchmark answer " * 30})
+        start = time.perf_counter()
+        model.save_chat_by_id(user_id, chat_id, chat)
+        timings["append"].append(time.perf_counter() - start)
+    return {op: _percentiles(samples) for op, samples in timings.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--modes", default="json,log,sqlite")
+    parser.add_argument("--workdir", default="bench_data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    pristine = os.path.join(args.workdir, "pristine")
+    layout_path = os.path.join(pristine, "layout.json")
+    if os.path.exists(layout_path):
+        with open(layout_path, "r", encoding="utf-8") as f:
+            layout = json.load(f)
+        print(f"Reusing data set in {pristine} ({len(layout)} users)")
+    else:
+        print(f"Generating {args.users} users x {args.chats} chats x {args.messages} messages...")
+        layout = generate(pristine, args.users, args.chats, args.messages)
+        sqlite_store.close_all()
+
+    results = {}
+    for mode in args.modes.split(","):
+        mode_dir = prepare(pristine, args.workdir, mode)
+        try:
+            results[mode] = run(mode, mode_dir, layout, args.ops, args.seed)
+        finally:
+            sqlite_store.close_all()
+            chat_search.close_all()
+            shutil.rmtree(mode_dir, ignore_errors=True)
+        for op, stats in results[mode].items():
+            print(f"{mode:>6} {op:>6}: " + "  ".join(f"{k}={v:.2f}" for k, v in stats.items()))
+    print(json.dumps(results, indent=2))
+
+    if args.cleanup:
+        shutil.rmtree(args.workdir)
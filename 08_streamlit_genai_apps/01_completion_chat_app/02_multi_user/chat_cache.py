@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+class ChatCache:
+    """
+    Process-wide LRU of parsed chat documents, bounded by total size in bytes.
+
+    Each entry carries a validation signature (file mtime/size) captured
+    before the chat was read; a lookup only hits when the caller's current
+    signature still matches, so edits made outside this process are picked
+    up on the next read.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, Dict, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _copy(chat: Dict) -> Dict:
+        # Callers mutate the returned chat (e.g. append messages), so hand out
+        # a copy deep enough that the cached document stays untouched
+        return {**chat, "messages": [dict(m) for m in chat["messages"]]}
+
+    def get(self, key: Tuple[str, str], signature: Any) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[1])
+
+    def put(self, key: Tuple[str, str], signature: Any, chat: Dict, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (signature, self._copy(chat), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,161 @@
+"""
+Per-user full-text search over chat messages.
+
+Each user gets a small SQLite FTS5 index (an inverted index with BM25
+ranking) under SEARCH_INDEX_DIR. model.save_chat_by_id feeds it only the
+messages added since the last save, and delete_chat_by_id drops the chat,
+so queries never have to open chat files.
+
+Query syntax: words must all match, a trailing * (or the last word as you
+type) matches as a prefix, and "quoted text" matches as a phrase.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Iterable, Iterator
+
+SEARCH_INDEX_DIR = os.getenv("CHAT_SEARCH_DIR", "search_index")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS message_index USING fts5(
+    content, chat_id UNINDEXED, seq UNINDEXED,
+    tokenize = 'unicode61', prefix = '2 3 4'
+);
+CREATE TABLE IF NOT EXISTS indexed_chats (
+    chat_id TEXT PRIMARY KEY,
+    message_count INTEGER NOT NULL
+);
+"""
+
+# Open indexes, least recently used first. Streamlit runs every rerun on a
+# new thread, so connections are shared across threads, each behind a lock
+SEARCH_MAX_OPEN_INDEXES = int(os.getenv("SEARCH_MAX_OPEN_INDEXES", 64))
+
+class _Index:
+    def __init__(self, path: str) -> None:
+        os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.conn.close()
+
+_indexes: "OrderedDict[str, _Index]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _get_index(user_id: str) -> _Index:
+    path = os.path.join(SEARCH_INDEX_DIR, f"{user_id}.db")
+    evicted = []
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = _Index(path)
+            while len(_indexes) > SEARCH_MAX_OPEN_INDEXES:
+                evicted.append(_indexes.popitem(last=False)[1])
+        else:
+            _indexes.move_to_end(path)
+    for old in evicted:
+        old.close()
+    return index
+
+@contextmanager
+def _connection(user_id: str) -> Iterator[sqlite3.Connection]:
+    """The user's index connection, held exclusively for the block."""
+    while True:
+        index = _get_index(user_id)
+        with index.lock:
+            # Evicted between lookup and lock: open it again
+            if not index.closed:
+                yield index.conn
+                return
+
+def close_all() -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+        _indexes.clear()
+    for index in indexes:
+        index.close()
+
+def index_chat(user_id: str, chat_id: str, messages: List[Dict[str, str]]) -> None:
+    """Index the messages past the stored count; reindex if history shrank."""
+    with _connection(user_id) as conn, conn:
+        row = conn.execute(
+            "SELECT message_count FROM indexed_chats WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        indexed = row[0] if row else 0
+        if len(messages) < indexed:
+            conn.execute("DELETE FROM message_index WHERE chat_id = ?", (chat_id,))
+            indexed = 0
+        conn.executemany(
+            "INSERT INTO message_index (content, chat_id, seq) VALUES (?, ?, ?)",
+            [(m.get("content") or "", chat_id, seq)
+             for seq, m in enumerate(messages[indexed:], start=indexed)]
+        )
+        conn.execute(
+            "INSERT INTO indexed_chats (chat_id, message_count) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET message_count = excluded.message_count",
+            (chat_id, len(messages))
+        )
+
+def remove_chat(user_id: str, chat_id: str) -> None:
+    with _connection(user_id) as conn, conn:
+        conn.execute("DELETE FROM message_index WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM indexed_chats WHERE chat_id = ?", (chat_id,))
+
+def indexed_chat_ids(user_id: str) -> set:
+    with _connection(user_id) as conn:
+        return {row[0] for row in conn.execute("SELECT chat_id FROM indexed_chats")}
+
+def rebuild_index(user_id: str, chats: Iterable[Dict]) -> None:
+    """Drop and rebuild a user's index from complete chat documents."""
+    with _connection(user_id) as conn, conn:
+        conn.execute("DELETE FROM message_index")
+        conn.execute("DELETE FROM indexed_chats")
+    for chat in chats:
+        index_chat(user_id, chat["id"], chat["messages"])
+
+def _to_fts_query(query: str) -> str:
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            tokens = re.findall(r"\w+", phrase)
+            if tokens:
+                terms.append('"' + " ".join(tokens) + '"')
+        else:
+            prefix = word.endswith("*")
+            terms.extend(f'"{token}"' for token in re.findall(r"\w+", word))
+            if prefix and terms:
+                terms[-1] += "*"
+    # Match the word being typed as a prefix
+    if terms and not query.rstrip().endswith('"') and not terms[-1].endswith("*"):
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def search(user_id: str, query: str, limit: int = 10) -> List[Dict]:
+    """Best-matching chats first: [{chat_id, seq, snippet, score}]."""
+    fts_query = _to_fts_query(query)
+    if not fts_query:
+        return []
+    with _connection(user_id) as conn:
+        rows = conn.execute(
+            "SELECT chat_id, seq, snippet(message_index, 0, '**', '**', '…', 12), rank "
+            "FROM message_index WHERE message_index MATCH ? ORDER BY rank LIMIT ?",
+            (fts_query, limit * 20)
+        ).fetchall()
+    results = {}
+    for chat_id, seq, snippet, rank in rows:
+        # Rows come best-first, so the first hit per chat is its best one
+        if chat_id not in results:
+            results[chat_id] = {"chat_id": chat_id, "seq": seq, "snippet": snippet, "score": -rank}
+            if len(results) == limit:
+                break
+    return list(results.values())
@@ -0,0 +1,152 @@
+"""
+Token-budgeted context assembly for chat completions.
+
+Keeps the leading system prompt plus as many of the newest turns as fit in
+the budget, and replaces the older turns with a rolling summary. The summary
+is a plain dict ({"upto", "fingerprint", "text"}) so it can be stored with
+the chat and extended incrementally on the next turn.
+
+Run as a script to measure prompt-size reduction over a chats/ tree:
+
+    python context_builder.py --chats-dir chats --budget 3000
+"""
+import os
+import re
+import math
+import hashlib
+from typing import List, Dict, Optional, Callable, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def count_tokens(text: str) -> int:
+    """
+    Offline approximation of a BPE tokenizer: one token per punctuation mark
+    and roughly one per four characters of each word.
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_RE.findall(text or ""))
+
+def count_message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message.get("content", "")) + MESSAGE_TOKEN_OVERHEAD
+
+def _fingerprint(message: Dict[str, str]) -> str:
+    raw = f"{message.get('role')}\x00{message.get('content')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def extractive_summary(messages: List[Dict[str, str]]) -> str:
+    """Default summarizer: first sentence of each turn, one line per turn."""
+    lines = []
+    for m in messages:
+        text = " ".join((m.get("content") or "").split())
+        first = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+        if len(first) > 160:
+            first = first[:157] + "..."
+        if first:
+            lines.append(f"- {m.get('role')}: {first}")
+    return "\n".join(lines)
+
+def _trim_summary(text: str, max_tokens: int) -> str:
+    """Drop the oldest summary lines until the summary fits."""
+    lines = text.split("\n")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def build_context(
+    messages: List[Dict[str, str]],
+    budget: int = None,
+    summary: Optional[Dict] = None,
+    summarizer: Callable[[List[Dict[str, str]]], str] = extractive_summary
+) -> Tuple[List[Dict[str, str]], Optional[Dict]]:
+    """
+    Return (context messages, summary) for a request within `budget` tokens.
+    Pass back the returned summary on the next call to reuse it; it is only
+    extended with the turns that newly fell out of the window.
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    n_system = 0
+    while n_system < len(messages) and messages[n_system].get("role") == "system":
+        n_system += 1
+    system, turns = messages[:n_system], messages[n_system:]
+
+    costs = [count_message_tokens(m) for m in turns]
+    available = budget - sum(count_message_tokens(m) for m in system)
+    if sum(costs) <= available:
+        return list(messages), summary
+
+    summary_budget = max(64, budget // 4)
+    window_budget = available - summary_budget - MESSAGE_TOKEN_OVERHEAD
+    keep, used = 0, 0
+    for cost in reversed(costs):
+        # Always keep the newest turn, even if it alone exceeds the budget
+        if keep and used + cost > window_budget:
+            break
+        keep += 1
+        used += cost
+    upto = n_system + len(turns) - keep
+    if upto == n_system:
+        # A single oversized turn: nothing older to summarize
+        return list(messages), summary
+
+    valid = (
+        summary is not None
+        and n_system < summary.get("upto", 0) <= upto
+        and summary.get("fingerprint") == _fingerprint(messages[summary["upto"] - 1])
+    )
+    if valid and summary["upto"] == upto:
+        text = summary["text"]
+    elif valid:
+        text = summary["text"] + "\n" + summarizer(messages[summary["upto"]:upto])
+    else:
+        text = summarizer(messages[n_system:upto])
+    summary = {
+        "upto": upto,
+        "fingerprint": _fingerprint(messages[upto - 1]),
+        "text": _trim_summary(text, summary_budget)
+    }
+
+    context = system + [{"role": "system", "content": SUMMARY_PREFIX + summary["text"]}] + messages[upto:]
+    return context, summary
+
+def build_chat_context(chat: Dict, budget: int = None) -> List[Dict[str, str]]:
+    """build_context for a stored chat; caches the summary on the chat itself."""
+    context, summary = build_context(chat["messages"], budget, chat.get("context_summary"))
+    if summary is not None:
+        chat["context_summary"] = summary
+    return context
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats-dir", default="chats")
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    chats = before = after = trimmed = 0
+    for root, _, files in os.walk(args.chats_dir):
+        for fname in files:
+            if not fname.endswith(".json") or fname.startswith("_"):
+                continue
+            with open(os.path.join(root, fname), "r", encoding="utf-8") as f:
+                chat = json.load(f)
+            if not chat.get("messages"):
+                continue
+            context, _ = build_context(chat["messages"], args.budget)
+            full = sum(count_message_tokens(m) for m in chat["messages"])
+            sent = sum(count_message_tokens(m) for m in context)
+            chats += 1
+            before += full
+            after += sent
+            trimmed += sent < full
+    if not chats:
+        print(f"No chats with messages found under {args.chats_dir}")
+    else:
+        print(f"Chats: {chats} ({trimmed} over the {args.budget}-token budget)")
+        print(f"Prompt tokens: {before} -> {after} ({100 * (1 - after / before):.1f}% reduction)")
@@ -1,15 +1,58 @@
 import os
 import json
+import atexit
+import threading
+import weakref
 from typing import List, Dict
+from safe_write import atomic_write_json, remove_stale_temp_files
+
+# ✅ Every live Database, flushed by one exit handler. Held weakly so the
+# instances Streamlit rebuilds on reruns can still be garbage-collected
+# (a pending flush timer keeps an instance alive until it has flushed)
+_open_databases = weakref.WeakSet()
+
+def _flush_all():
+    for db in list(_open_databases):
+        db.flush()
+
+atexit.register(_flush_all)
 
 class Database:
-    def __init__(self, db_root: str = "chat_data") -> None:
+    def __init__(self, db_root: str = "chat_data", write_behind: bool = True, flush_delay: float = 0.5) -> None:
         self.db_root = db_root
         os.makedirs(self.db_root, exist_ok=True)
+        self._known_dirs = {self.db_root}
+        # Per-user meta.json kept in memory. With write_behind, mutations only
+        # mark the user dirty and a timer flushes within flush_delay seconds
+        # (and on shutdown). Assumes this process is the only writer.
+        self.write_behind = write_behind
+        self.flush_delay = flush_delay
+        self._meta: Dict[str, Dict[str, str]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        # Serializes flushes so an older snapshot never overwrites a newer one
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        _open_databases.add(self)
+
+    def close(self):
+        """Flush pending titles and stop tracking this instance."""
+        self.flush()
+        _open_databases.discard(self)
+
+    def __enter__(self) -> "Database":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
 
     def _get_user_dir(self, user_id: str) -> str:
         path = os.path.join(self.db_root, user_id)
-        os.makedirs(path, exist_ok=True)
+        if path not in self._known_dirs:
+            os.makedirs(path, exist_ok=True)
+            # Clear temp files left by a save that crashed before its rename
+            remove_stale_temp_files(path)
+            self._known_dirs.add(path)
         return path
 
     def _get_chat_file(self, user_id: str, chat_id: str) -> str:
@@ -27,41 +70,79 @@ class Database:
 
     def save_chat_history(self, user_id: str, chat_id: str, messages: List[dict]):
         file_path = self._get_chat_file(user_id, chat_id)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
+        atomic_write_json(file_path, messages, ensure_ascii=False, indent=2)
 
     def delete_chat(self, user_id: str, chat_id: str):
         file_path = self._get_chat_file(user_id, chat_id)
         if os.path.exists(file_path):
             os.remove(file_path)
-        meta = self._load_meta(user_id)
-        if chat_id in meta:
-            del meta[chat_id]
-            self._save_meta(user_id, meta)
+        with self._lock:
+            meta = self._load_meta(user_id)
+            if chat_id in meta:
+                del meta[chat_id]
+                self._mark_dirty(user_id)
+        self._maybe_flush()
 
     def _load_meta(self, user_id: str) -> Dict[str, str]:
-        meta_path = self._get_meta_file(user_id)
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {}
+        """Cached meta for a user; call with self._lock held."""
+        meta = self._meta.get(user_id)
+        if meta is None:
+            meta_path = self._get_meta_file(user_id)
+            meta = {}
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            self._meta[user_id] = meta
+        return meta
 
     def _save_meta(self, user_id: str, meta: Dict[str, str]):
         meta_path = self._get_meta_file(user_id)
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f, ensure_ascii=False, indent=2)
+        atomic_write_json(meta_path, meta, ensure_ascii=False, indent=2)
+
+    def _mark_dirty(self, user_id: str):
+        self._dirty.add(user_id)
+        if self.write_behind and self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _maybe_flush(self):
+        if not self.write_behind:
+            self.flush()
+
+    def flush(self):
+        """Write every dirty user's meta.json now."""
+        with self._flush_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                pending = {user_id: dict(self._meta[user_id]) for user_id in self._dirty}
+                self._dirty.clear()
+            for user_id, meta in pending.items():
+                try:
+                    self._save_meta(user_id, meta)
+                except OSError as e:
+                    print(f"❌ Failed to save chat titles for {user_id}: {e}")
+                    with self._lock:
+                        self._mark_dirty(user_id)
 
     def save_chat_title_if_new(self, user_id: str, chat_id: str, title: str):
-        meta = self._load_meta(user_id)
-        if chat_id not in meta:
-            meta[chat_id] = title
-            self._save_meta(user_id, meta)
+        with self._lock:
+            meta = self._load_meta(user_id)
+            if chat_id not in meta:
+                meta[chat_id] = title
+                self._mark_dirty(user_id)
+        self._maybe_flush()
 
     def rename_chat(self, user_id: str, chat_id: str, new_title: str):
-        meta = self._load_meta(user_id)
-        if chat_id in meta:
-            meta[chat_id] = new_title
-            self._save_meta(user_id, meta)
+        with self._lock:
+            meta = self._load_meta(user_id)
+            if chat_id in meta:
+                meta[chat_id] = new_title
+                self._mark_dirty(user_id)
+        self._maybe_flush()
 
     def list_chats(self, user_id: str) -> Dict[str, str]:
-        return self._load_meta(user_id)
+        with self._lock:
+            return dict(self._load_meta(user_id))
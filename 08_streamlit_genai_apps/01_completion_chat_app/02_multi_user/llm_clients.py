@@ -0,0 +1,130 @@
+"""
+Process-wide registry of OpenAI clients, one per API key.
+
+Every Streamlit session with the same key shares one client, and therefore
+one keep-alive connection pool, instead of creating clients per rerun or
+mutating the global `openai.api_key` (which leaks keys between sessions).
+Each key also gets a concurrency cap so one user can't exhaust the pool.
+At most LLM_MAX_CLIENTS keys keep a client; the least recently used one is
+dropped and its pool closed as soon as no request is using it.
+
+Set OPENAI_BASE_URL to point the clients at a local or fake endpoint.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import openai
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+# How long a request waits for a free slot before giving up
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+# Keys that keep a pooled client at once
+LLM_MAX_CLIENTS = int(os.getenv("LLM_MAX_CLIENTS", 256))
+
+class LLMBusyError(RuntimeError):
+    pass
+
+class _PooledClient:
+    def __init__(self, api_key: str) -> None:
+        self.http_client = httpx.Client(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=60
+            )
+        )
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self.http_client,
+            max_retries=2
+        )
+        self.slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+        # Requests holding or waiting for a slot; guarded by _registry_lock
+        self.active = 0
+        self.evicted = False
+
+    def close(self) -> None:
+        try:
+            self.http_client.close()
+        except Exception as e:
+            print(f"⚠️ Closing OpenAI client failed: {e}")
+
+# key hash -> _PooledClient, least recently used first
+_registry: "OrderedDict[str, _PooledClient]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+def api_key_hash(api_key: str) -> str:
+    # Never keep raw keys as registry keys
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def _get_entry(api_key: str, hold: bool = False) -> _PooledClient:
+    """Entry for this key; with hold, counted as in use until _release."""
+    key = api_key_hash(api_key)
+    idle = []
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is None:
+            entry = _registry[key] = _PooledClient(api_key)
+            while len(_registry) > LLM_MAX_CLIENTS:
+                _, old = _registry.popitem(last=False)
+                old.evicted = True
+                if old.active == 0:
+                    idle.append(old)
+        else:
+            _registry.move_to_end(key)
+        if hold:
+            entry.active += 1
+    # Closing waits on the pool; don't hold up other sessions meanwhile
+    for old in idle:
+        old.close()
+    return entry
+
+def _release(entry: _PooledClient) -> None:
+    with _registry_lock:
+        entry.active -= 1
+        close = entry.evicted and entry.active == 0
+    if close:
+        # Evicted while in use; its last request is done now
+        entry.close()
+
+def get_client(api_key: str) -> openai.OpenAI:
+    """Shared client for this key, without taking a concurrency slot.
+
+    Not counted as in use, so it may be closed once evicted; make
+    requests through llm_slot.
+    """
+    return _get_entry(api_key).client
+
+@contextmanager
+def llm_slot(api_key: str, timeout: float = None) -> Iterator[openai.OpenAI]:
+    """
+    Yield the shared client while holding one of the key's concurrency slots.
+    Keep streaming responses inside the block so the slot covers the stream.
+    """
+    entry = _get_entry(api_key, hold=True)
+    try:
+        if not entry.slots.acquire(timeout=LLM_QUEUE_TIMEOUT if timeout is None else timeout):
+            raise LLMBusyError("Too many concurrent requests for this API key, please retry.")
+        try:
+            yield entry.client
+        finally:
+            entry.slots.release()
+    finally:
+        _release(entry)
+
+def close_all() -> None:
+    with _registry_lock:
+        entries = list(_registry.values())
+        _registry.clear()
+    for entry in entries:
+        entry.close()
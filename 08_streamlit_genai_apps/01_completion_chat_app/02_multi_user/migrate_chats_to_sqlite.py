@@ -0,0 +1,53 @@
+"""
+Bulk-import an existing chats/ tree (json or log storage mode) into the
+SQLite chat store.
+
+    python migrate_chats_to_sqlite.py --chats-dir chats --db chats.db
+
+Then run the app with CHAT_STORAGE_MODE=sqlite (and CHAT_SQLITE_PATH if the
+database is not at the default path). Re-running is safe: chats are
+replaced by id.
+"""
+import os
+import time
+import argparse
+
+import model
+import sqlite_store
+
+def migrate(chats_dir: str, db_path: str, batch_size: int = 500) -> int:
+    sqlite_store.SQLITE_DB_PATH = db_path
+    migrated = 0
+    batch = []
+    for user_id in sorted(os.listdir(chats_dir)):
+        user_dir = os.path.join(chats_dir, user_id)
+        if not os.path.isdir(user_dir):
+            continue
+        for fname in model._list_chat_files(user_dir):
+            chat_id = fname[:-len(".json")]
+            try:
+                chat = model._read_chat(user_dir, chat_id)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable chat {user_id}/{fname}: {e}")
+                continue
+            chat.setdefault("user_id", user_id)
+            batch.append(chat)
+            if len(batch) >= batch_size:
+                sqlite_store.import_chats(batch)
+                migrated += len(batch)
+                batch = []
+    if batch:
+        sqlite_store.import_chats(batch)
+        migrated += len(batch)
+    return migrated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats-dir", default=model.BASE_CHAT_DIR)
+    parser.add_argument("--db", default=sqlite_store.SQLITE_DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = migrate(args.chats_dir, args.db, args.batch_size)
+    print(f"✅ Migrated {count} chats into {args.db} in {time.perf_counter() - start:.1f}s")
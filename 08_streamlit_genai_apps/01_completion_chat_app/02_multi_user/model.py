@@ -1,18 +1,247 @@
 import os
 import uuid
+import copy
 import json
+import threading
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
+import sqlite_store
+import chat_search
+from chat_cache import ChatCache
+from safe_write import atomic_write_json, remove_stale_temp_files
 
 # ✅ Persistent directory for all user chats
 BASE_CHAT_DIR = "chats"
 
+# ✅ Per-user manifest of {chat_id: {id, title, created_at}} so the sidebar
+# can be listed with one small read instead of opening every chat file
+MANIFEST_FILE = "_manifest.json"
+_manifest_lock = threading.Lock()
+
+# ✅ Chat storage mode:
+#   "json"   - every save rewrites <chat_id>.json
+#   "log"    - <chat_id>.json is a snapshot and each save appends only the new
+#              messages to <chat_id>.jsonl; the log is folded back into the
+#              snapshot in the background once it grows past the threshold
+#   "sqlite" - all chats live in one SQLite database, see sqlite_store.py
+CHAT_STORAGE_MODE = os.getenv("CHAT_STORAGE_MODE", "json")
+COMPACT_THRESHOLD_BYTES = int(os.getenv("CHAT_COMPACT_THRESHOLD_BYTES", 256 * 1024))
+
+# ✅ Parsed chats cached across reruns and sessions, validated by file mtime/size
+_chat_cache = ChatCache(max_bytes=int(os.getenv("CHAT_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+
+_known_user_dirs = set()
+
 def _get_user_chat_dir(user_id: str) -> str:
     user_dir = os.path.join(BASE_CHAT_DIR, user_id)
-    os.makedirs(user_dir, exist_ok=True)
+    if user_dir not in _known_user_dirs:
+        os.makedirs(user_dir, exist_ok=True)
+        # Clear temp files left by a save that crashed before its rename
+        remove_stale_temp_files(user_dir)
+        _known_user_dirs.add(user_dir)
     return user_dir
 
+def _list_chat_files(user_dir: str) -> List[str]:
+    return [f for f in os.listdir(user_dir) if f.endswith(".json") and f != MANIFEST_FILE]
+
+# --- Manifest: per-user chat index ---
+
+def _manifest_entry(chat_data: Dict) -> Dict:
+    return {
+        "id": chat_data["id"],
+        "title": chat_data["title"],
+        "created_at": chat_data["created_at"]
+    }
+
+def _load_manifest(user_id: str) -> Optional[Dict[str, Dict]]:
+    """Return the manifest, or None if it is missing or unreadable."""
+    manifest_path = os.path.join(_get_user_chat_dir(user_id), MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+def _save_manifest(user_id: str, manifest: Dict[str, Dict]) -> None:
+    manifest_path = os.path.join(_get_user_chat_dir(user_id), MANIFEST_FILE)
+    atomic_write_json(manifest_path, manifest)
+
+def _update_manifest(user_id: str, chat_id: str, entry: Optional[Dict]) -> None:
+    """Set (or remove, if entry is None) a single chat in the manifest."""
+    with _manifest_lock:
+        manifest = _load_manifest(user_id)
+        if manifest is None:
+            # Missing or corrupt: rebuild from the chat files, which already
+            # reflect the change that triggered this update
+            _rebuild_manifest_locked(user_id)
+            return
+        if entry is None:
+            if chat_id not in manifest:
+                return
+            del manifest[chat_id]
+        else:
+            if manifest.get(chat_id) == entry:
+                return
+            manifest[chat_id] = entry
+        _save_manifest(user_id, manifest)
+
+def _rebuild_manifest_locked(user_id: str) -> Dict[str, Dict]:
+    user_dir = _get_user_chat_dir(user_id)
+    manifest = {}
+    for fname in _list_chat_files(user_dir):
+        try:
+            data = _read_chat(user_dir, fname[:-len(".json")])
+            manifest[data["id"]] = _manifest_entry(data)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Skipping unreadable chat file {fname}: {e}")
+    _save_manifest(user_id, manifest)
+    return manifest
+
+def rebuild_chat_manifest(user_id: str) -> Dict[str, Dict]:
+    """Rebuild the manifest from scratch by reading every chat file."""
+    with _manifest_lock:
+        return _rebuild_manifest_locked(user_id)
+
+def repair_chat_manifest(user_id: str) -> Dict[str, Dict]:
+    """
+    Reconcile the manifest with the chat files on disk.
+    Drops entries whose file is gone and only opens chat files that are
+    missing from the manifest, so it stays cheap when little is wrong.
+    """
+    with _manifest_lock:
+        manifest = _load_manifest(user_id)
+        if manifest is None:
+            return _rebuild_manifest_locked(user_id)
+        user_dir = _get_user_chat_dir(user_id)
+        on_disk = {fname[:-len(".json")] for fname in _list_chat_files(user_dir)}
+        changed = False
+        for chat_id in list(manifest):
+            if chat_id not in on_disk:
+                del manifest[chat_id]
+                changed = True
+        for chat_id in on_disk - manifest.keys():
+            try:
+                manifest[chat_id] = _manifest_entry(_read_chat(user_dir, chat_id))
+                changed = True
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Skipping unreadable chat file {chat_id}.json: {e}")
+        if changed:
+            _save_manifest(user_id, manifest)
+        return manifest
+
+def _get_manifest(user_id: str) -> Dict[str, Dict]:
+    manifest = _load_manifest(user_id)
+    if manifest is None:
+        manifest = rebuild_chat_manifest(user_id)
+    return manifest
+
+# --- Append-only message log ---
+#
+# Each line of <chat_id>.jsonl is one record:
+#   {"seq": n, "messages": [...]}  messages appended at index n
+#   {"set": {"title": ...}}        other chat fields changed (title, summary)
+#   {"reset": {...chat}}           whole chat replaced (history was edited)
+# Replay is idempotent: an append whose seq is already covered by the
+# snapshot is skipped, so a crash between writing a compacted snapshot and
+# removing the log cannot duplicate messages.
+
+_chat_locks: Dict[tuple, threading.Lock] = {}
+_chat_locks_guard = threading.Lock()
+# (user_id, chat_id) -> {"count": persisted message count, "fields": other fields}
+_log_state: Dict[tuple, Dict] = {}
+
+def _get_chat_lock(user_id: str, chat_id: str) -> threading.Lock:
+    with _chat_locks_guard:
+        return _chat_locks.setdefault((user_id, chat_id), threading.Lock())
+
+def _apply_log_record(chat: Dict, record: Dict) -> Dict:
+    if "reset" in record:
+        return record["reset"]
+    if "set" in record:
+        chat.update(record["set"])
+    if "messages" in record:
+        seq = record["seq"]
+        known = len(chat["messages"])
+        if seq > known:
+            print(f"⚠️ Gap in message log for chat {chat['id']} (seq {seq}, have {known}), skipping")
+        else:
+            # Skip any prefix already folded into the snapshot
+            chat["messages"].extend(record["messages"][known - seq:])
+    return chat
+
+def _read_chat(user_dir: str, chat_id: str) -> Optional[Dict]:
+    """Read a chat snapshot and replay its message log, if any."""
+    chat_path = os.path.join(user_dir, f"{chat_id}.json")
+    if not os.path.exists(chat_path):
+        return None
+    with open(chat_path, "r", encoding="utf-8") as f:
+        chat = json.load(f)
+    log_path = os.path.join(user_dir, f"{chat_id}.jsonl")
+    if os.path.exists(log_path):
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    print(f"⚠️ Ignoring unreadable record in {log_path}")
+                    continue
+                chat = _apply_log_record(chat, record)
+    return chat
+
+def _append_chat_log(user_id: str, chat_id: str, chat_data: Dict) -> None:
+    user_dir = _get_user_chat_dir(user_id)
+    key = (user_id, chat_id)
+    with _get_chat_lock(user_id, chat_id):
+        state = _log_state.get(key)
+        if state is None:
+            persisted = _read_chat(user_dir, chat_id)
+            state = {
+                "count": len(persisted["messages"]) if persisted else 0,
+                "fields": {k: v for k, v in (persisted or {}).items() if k != "messages"}
+            }
+
+        messages = chat_data["messages"]
+        fields = copy.deepcopy({k: v for k, v in chat_data.items() if k != "messages"})
+        records = []
+        if len(messages) < state["count"]:
+            records.append({"reset": chat_data})
+        else:
+            changed = {k: v for k, v in fields.items() if state["fields"].get(k) != v}
+            if changed:
+                records.append({"set": changed})
+            if len(messages) > state["count"]:
+                records.append({"seq": state["count"], "messages": messages[state["count"]:]})
+
+        log_size = 0
+        if records:
+            with open(os.path.join(user_dir, f"{chat_id}.jsonl"), "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                log_size = f.tell()
+        _log_state[key] = {"count": len(messages), "fields": fields}
+
+    if log_size > COMPACT_THRESHOLD_BYTES:
+        threading.Thread(target=compact_chat, args=(user_id, chat_id), daemon=True).start()
+
+def compact_chat(user_id: str, chat_id: str) -> None:
+    """Fold a chat's message log into its snapshot and remove the log."""
+    user_dir = _get_user_chat_dir(user_id)
+    log_path = os.path.join(user_dir, f"{chat_id}.jsonl")
+    with _get_chat_lock(user_id, chat_id):
+        if not os.path.exists(log_path):
+            return
+        chat = _read_chat(user_dir, chat_id)
+        if chat is None:
+            return
+        chat_path = os.path.join(user_dir, f"{chat_id}.json")
+        atomic_write_json(chat_path, chat, indent=2)
+        os.remove(log_path)
+
 def create_new_chat(user_id: str, title: str = "New Chat") -> str:
+    if CHAT_STORAGE_MODE == "sqlite":
+        return sqlite_store.create_new_chat(user_id, title)
     user_dir = _get_user_chat_dir(user_id)
     chat_id = str(uuid.uuid4())
     chat_file_path = os.path.join(user_dir, f"{chat_id}.json")
@@ -25,71 +254,154 @@ def create_new_chat(user_id: str, title: str = "New Chat") -> str:
         "messages": []
     }
 
-    with open(chat_file_path, "w", encoding="utf-8") as f:
-        json.dump(chat_data, f, indent=2)
+    atomic_write_json(chat_file_path, chat_data, indent=2)
 
+    _update_manifest(user_id, chat_id, _manifest_entry(chat_data))
     return chat_id
 
 def list_chat_ids_for_user(user_id: str) -> List[str]:
-    user_dir = _get_user_chat_dir(user_id)
-    return [f.split(".")[0] for f in os.listdir(user_dir) if f.endswith(".json")]
+    if CHAT_STORAGE_MODE == "sqlite":
+        return sqlite_store.list_chat_ids_for_user(user_id)
+    return [chat["id"] for chat in list_chats_for_user(user_id)]
 
 def list_chats_for_user(user_id: str) -> List[Dict]:
-    user_dir = _get_user_chat_dir(user_id)
-    chats = []
-    for fname in os.listdir(user_dir):
-        if fname.endswith(".json"):
-            with open(os.path.join(user_dir, fname), "r", encoding="utf-8") as f:
-                data = json.load(f)
-                chats.append({
-                    "id": data["id"],
-                    "title": data["title"],
-                    "created_at": data["created_at"]
-                })
+    if CHAT_STORAGE_MODE == "sqlite":
+        return sqlite_store.list_chats_for_user(user_id)
+    chats = list(_get_manifest(user_id).values())
     # Sort chats by created_at descending
     return sorted(chats, key=lambda x: x["created_at"], reverse=True)
 
+def _chat_signature(user_dir: str, chat_id: str) -> Optional[tuple]:
+    """(mtime, size) of the snapshot and log, or None if the chat is missing."""
+    try:
+        snapshot = os.stat(os.path.join(user_dir, f"{chat_id}.json"))
+    except FileNotFoundError:
+        return None
+    try:
+        log = os.stat(os.path.join(user_dir, f"{chat_id}.jsonl"))
+        log_signature = (log.st_mtime_ns, log.st_size)
+    except FileNotFoundError:
+        log_signature = None
+    return (snapshot.st_mtime_ns, snapshot.st_size, log_signature)
+
+def get_chat_cache_stats() -> Dict[str, int]:
+    return _chat_cache.stats()
+
 def get_chat_by_id(user_id: str, chat_id: str) -> Dict:
-    chat_path = os.path.join(_get_user_chat_dir(user_id), f"{chat_id}.json")
-    if not os.path.exists(chat_path):
+    if CHAT_STORAGE_MODE == "sqlite":
+        return sqlite_store.get_chat_by_id(user_id, chat_id)
+    user_dir = _get_user_chat_dir(user_id)
+    key = (user_id, chat_id)
+    signature = _chat_signature(user_dir, chat_id)
+    if signature is not None:
+        chat = _chat_cache.get(key, signature)
+        if chat is not None:
+            return chat
+    chat = _read_chat(user_dir, chat_id)
+    if chat is None:
+        _chat_cache.invalidate(key)
+        # Drop a stale manifest entry left behind by an out-of-band delete
+        _update_manifest(user_id, chat_id, None)
         return None
-    with open(chat_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if signature is None:
+        # The snapshot appeared between stat and read; without a signature
+        # to validate against, don't cache it
+        return chat
+    # Sized by bytes on disk, a cheap proxy for the parsed document
+    _chat_cache.put(key, signature, chat, signature[1] + (signature[2] or (0, 0))[1])
+    return chat
 
 def save_chat_by_id(user_id: str, chat_id: str, chat_data: Dict) -> None:
-    chat_path = os.path.join(_get_user_chat_dir(user_id), f"{chat_id}.json")
-    with open(chat_path, "w", encoding="utf-8") as f:
-        json.dump(chat_data, f, indent=2)
+    if CHAT_STORAGE_MODE == "sqlite":
+        sqlite_store.save_chat_by_id(user_id, chat_id, chat_data)
+    else:
+        _chat_cache.invalidate((user_id, chat_id))
+        if CHAT_STORAGE_MODE == "log":
+            _append_chat_log(user_id, chat_id, chat_data)
+        else:
+            chat_path = os.path.join(_get_user_chat_dir(user_id), f"{chat_id}.json")
+            atomic_write_json(chat_path, chat_data, indent=2)
+        # No-op unless the title (or a missing entry) actually changed
+        _update_manifest(user_id, chat_id, _manifest_entry(chat_data))
+    _update_search_index(user_id, chat_id, chat_data["messages"])
 
 def rename_chat_title(user_id: str, chat_id: str, new_title: str) -> None:
+    if CHAT_STORAGE_MODE == "sqlite":
+        return sqlite_store.rename_chat_title(user_id, chat_id, new_title)
     chat = get_chat_by_id(user_id, chat_id)
     if chat:
         chat["title"] = new_title
         save_chat_by_id(user_id, chat_id, chat)
 
 def delete_chat_by_id(user_id: str, chat_id: str) -> None:
-    chat_path = os.path.join(_get_user_chat_dir(user_id), f"{chat_id}.json")
-    if os.path.exists(chat_path):
-        os.remove(chat_path)
+    if CHAT_STORAGE_MODE == "sqlite":
+        sqlite_store.delete_chat_by_id(user_id, chat_id)
+    else:
+        user_dir = _get_user_chat_dir(user_id)
+        with _get_chat_lock(user_id, chat_id):
+            for ext in (".json", ".jsonl"):
+                chat_path = os.path.join(user_dir, f"{chat_id}{ext}")
+                if os.path.exists(chat_path):
+                    os.remove(chat_path)
+            _log_state.pop((user_id, chat_id), None)
+        _chat_cache.invalidate((user_id, chat_id))
+        _update_manifest(user_id, chat_id, None)
+    try:
+        chat_search.remove_chat(user_id, chat_id)
+    except Exception as e:
+        print(f"⚠️ Search index update failed: {e}")
+
+# --- Full-text search ---
+
+def _update_search_index(user_id: str, chat_id: str, messages: List[Dict]) -> None:
+    # The index is derived data: never fail a save because of it
+    try:
+        chat_search.index_chat(user_id, chat_id, messages)
+    except Exception as e:
+        print(f"⚠️ Search index update failed: {e}")
+
+def search_chats(user_id: str, query: str, limit: int = 10) -> List[Dict]:
+    """
+    Ranked search over a user's messages. Chats saved before the index
+    existed are indexed on first search.
+    """
+    indexed = chat_search.indexed_chat_ids(user_id)
+    for chat_id in set(list_chat_ids_for_user(user_id)) - indexed:
+        chat = get_chat_by_id(user_id, chat_id)
+        if chat:
+            _update_search_index(user_id, chat_id, chat["messages"])
+    return chat_search.search(user_id, query, limit)
 
 
 # --- BotModel: Handles reply generation using OpenAI ---
 
-import openai
+import time
+from context_builder import build_context, _fingerprint
+from llm_clients import api_key_hash, llm_slot
+from response_cache import ResponseCache, make_key
+
+# ✅ Shared by every BotModel in the process; also persisted on disk
+_response_cache = ResponseCache()
+
+def get_response_cache_stats() -> Dict:
+    return _response_cache.stats()
 
 class BotModel:
-    def __init__(self, model="gpt-3.5-turbo", api_key=None):
+    def __init__(self, model="gpt-3.5-turbo", api_key=None, context_budget=None):
         self.model = model
+        self.context_budget = context_budget
+        # Rolling summaries keyed by each conversation's first message
+        self._summaries: Dict[str, Dict] = {}
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             print("⚠️ Warning: OPENAI_API_KEY not set. Running in mock mode.")
-        else:
-            openai.api_key = self.api_key
 
-    def generate_reply(self, messages: List[Dict[str, str]]) -> str:
+    def generate_reply(self, messages: List[Dict[str, str]], use_cache: bool = True, **sampling) -> str:
         """
         Generate a reply based on chat history.
         If OpenAI API key is set, use GPT. Otherwise, return echo.
+        Identical requests are answered from the response cache; pass
+        use_cache=False when you want a fresh sample (e.g. temperature > 0).
         """
         if not messages:
             return "Hello! How can I assist you today?"
@@ -99,12 +411,37 @@ class BotModel:
             last_user_msg = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
             return f"Echo: {last_user_msg}"
 
+        conversation = _fingerprint(messages[0])
+        context, summary = build_context(messages, self.context_budget, self._summaries.get(conversation))
+        if summary is not None:
+            self._summaries[conversation] = summary
+            if len(self._summaries) > 256:
+                self._summaries.pop(next(iter(self._summaries)))
+
+        # Per key: answers must not cross accounts or skip the key check
+        key = make_key(self.model, context, sampling, api_key_hash(self.api_key))
+        if use_cache:
+            cached = _response_cache.get(key)
+            if cached is not None:
+                return cached
+
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=messages
-            )
-            return response.choices[0].message["content"].strip()
+            start = time.perf_counter()
+            with llm_slot(self.api_key) as client:
+                response = client.chat.completions.create(
+                    model=self.model,
+                    messages=context,
+                    **sampling
+                )
+            reply = response.choices[0].message.content.strip()
         except Exception as e:
             print(f"❌ OpenAI API Error: {e}")
             return "Sorry, I'm having trouble generating a response right now."
+
+        if use_cache:
+            # The reply is good even if it can't be cached
+            try:
+                _response_cache.put(key, reply, time.perf_counter() - start)
+            except Exception as e:
+                print(f"⚠️ Response cache write failed: {e}")
+        return reply
@@ -0,0 +1,202 @@
+"""
+Exact-match cache of completion responses.
+
+Keys are a SHA-256 of the canonical JSON of (model, messages, sampling
+params, account), so the same question asked in a fresh chat hits, but
+only for the API key that paid for the answer. Entries live in a
+byte-bounded in-memory LRU backed by one small JSON file per entry under
+RESPONSE_CACHE_DIR, which survives restarts. Both tiers honour the TTL.
+
+The disk tier is capped at RESPONSE_CACHE_MAX_DISK_ENTRIES files and
+RESPONSE_CACHE_MAX_DISK_BYTES. Each process indexes the directory on first
+write (oldest first, by mtime) and then, on every store, deletes expired
+entries and the oldest ones until it is back under both caps.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from safe_write import atomic_write_bytes
+
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "response_cache")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+RESPONSE_CACHE_MAX_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_DISK_ENTRIES", 20000))
+RESPONSE_CACHE_MAX_DISK_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_DISK_BYTES", 128 * 1024 * 1024))
+
+def make_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any], account: str) -> str:
+    """Cache key; account is a hash of the API key, never the key itself."""
+    canonical = json.dumps(
+        {"model": model, "messages": messages, "params": params, "account": account},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(
+        self,
+        cache_dir: str = None,
+        ttl: float = None,
+        max_bytes: int = None,
+        max_disk_entries: int = None,
+        max_disk_bytes: int = None
+    ) -> None:
+        self.cache_dir = cache_dir or RESPONSE_CACHE_DIR
+        self.ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_disk_entries = RESPONSE_CACHE_MAX_DISK_ENTRIES if max_disk_entries is None else max_disk_entries
+        self.max_disk_bytes = RESPONSE_CACHE_MAX_DISK_BYTES if max_disk_bytes is None else max_disk_bytes
+        # key -> (response, expires_at, latency, size)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        # key -> (file size, expires_at), oldest first; None until first store
+        self._disk: "Optional[OrderedDict[str, tuple]]" = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "saved_latency_s": 0.0
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, response: str, expires_at: float, latency: float) -> None:
+        size = len(response.encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._bytes -= old[3]
+        self._memory[key] = (response, expires_at, latency, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= evicted[3]
+            self.counters["evictions"] += 1
+
+    def _load_disk_index(self) -> None:
+        """Index files already on disk, oldest first (lock held)."""
+        found = []
+        try:
+            shards = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            shards = []
+        for shard in shards:
+            try:
+                entries = os.scandir(os.path.join(self.cache_dir, shard))
+            except (NotADirectoryError, FileNotFoundError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.endswith(".json"):
+                        st = entry.stat()
+                        # Written at store time, so mtime + ttl is its expiry
+                        found.append((st.st_mtime, entry.name[:-5], st.st_size))
+        found.sort()
+        self._disk = OrderedDict((key, (size, mtime + self.ttl)) for mtime, key, size in found)
+        self._disk_bytes = sum(size for size, _ in self._disk.values())
+
+    def _forget_disk_entry(self, key: str) -> None:
+        if self._disk is not None:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old[0]
+
+    def _trim_disk(self, now: float) -> List[str]:
+        """Drop expired, then oldest, entries past the caps (lock held); returns paths to delete."""
+        doomed = []
+        while self._disk:
+            key, (size, expires_at) = next(iter(self._disk.items()))
+            if expires_at > now and len(self._disk) <= self.max_disk_entries and self._disk_bytes <= self.max_disk_bytes:
+                break
+            if expires_at > now:
+                self.counters["disk_evictions"] += 1
+            self._forget_disk_entry(key)
+            doomed.append(self._path(key))
+        return doomed
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    self.counters["saved_latency_s"] += entry[2]
+                    return entry[0]
+                del self._memory[key]
+                self._bytes -= entry[3]
+                expired = True
+
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            record = None
+
+        with self._lock:
+            if record is None or record["expires_at"] <= now:
+                # One lookup counts as expired at most once, whichever tier had it
+                if expired or record is not None:
+                    self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                if record is not None:
+                    self._forget_disk_entry(key)
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+                return None
+            self._remember(key, record["response"], record["expires_at"], record["latency"])
+            self.counters["disk_hits"] += 1
+            self.counters["saved_latency_s"] += record["latency"]
+        return record["response"]
+
+    def put(self, key: str, response: str, latency: float) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at, latency)
+            self.counters["stores"] += 1
+            if self._disk is None:
+                self._load_disk_index()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"response": response, "expires_at": expires_at, "latency": latency}).encode("utf-8")
+        atomic_write_bytes(path, data)
+        with self._lock:
+            self._forget_disk_entry(key)
+            self._disk[key] = (len(data), expires_at)
+            self._disk_bytes += len(data)
+            doomed = self._trim_disk(now)
+        for doomed_path in doomed:
+            try:
+                os.remove(doomed_path)
+            except OSError:
+                # Already gone, e.g. removed by another process
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._memory)
+            stats["bytes"] = self._bytes
+            if self._disk is not None:
+                stats["disk_entries"] = len(self._disk)
+                stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,224 @@
+"""
+Crash-safe file writes with group commit.
+
+Writing a chat with open(path, "w") truncates it first, so a crash mid-write
+loses the chat, and two tabs saving the same chat interleave. Here every
+write goes to a temp file in the same directory, which is fsynced and then
+atomically renamed over the target under a per-file lock. A reader sees
+either the old file or the new one, and write_* only returns once the data
+is durable.
+
+The renames are made durable by group commit: writes into one directory
+share a single directory fsync. The first writer to need it leads. It waits
+until no other writer in that directory is mid-write, or for
+GROUP_COMMIT_WINDOW seconds at most, then fsyncs once for every rename so
+far. A writer alone never waits. A writer waiting on someone else's fsync
+gives up after GROUP_COMMIT_MAX_WAIT and fsyncs the directory itself. File
+fsyncs stay with each writer; they run in parallel, and the filesystem
+coalesces their journal commits.
+
+A crash between writing the temp file and the rename leaves a
+<name>.<pid>.<thread>.tmp behind next to an intact target;
+remove_stale_temp_files clears those.
+
+Run as a script for a multi-threaded stress test and throughput numbers:
+
+    python safe_write.py --threads 16 --writes 200
+"""
+import os
+import json
+import time
+import weakref
+import threading
+from typing import Any, Dict
+
+# Set CHAT_FSYNC=0 to keep atomic renames but skip fsync (e.g. on tmpfs)
+FSYNC_ENABLED = os.getenv("CHAT_FSYNC", "1") != "0"
+# Temp files older than this are left over from a crash, not in flight
+STALE_TMP_SECONDS = float(os.getenv("STALE_TMP_SECONDS", 300))
+# Longest a leader holds the directory fsync open for writers still writing
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", 0.005))
+# Longest a writer waits on another writer's directory fsync
+GROUP_COMMIT_MAX_WAIT = float(os.getenv("GROUP_COMMIT_MAX_WAIT", 1.0))
+
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+def lock_for(path: str) -> threading.Lock:
+    path = os.path.abspath(path)
+    with _file_locks_guard:
+        return _file_locks.setdefault(path, threading.Lock())
+
+def _fsync_dir(directory: str) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"⚠️ Directory fsync failed for {directory}: {e}")
+
+class _DirectoryGroup:
+    """Group commit state for one directory's fsync."""
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.writing = 0     # writers between taking the file lock and renaming
+        self.requested = 0   # renames done, numbered in order
+        self.synced = 0      # renames up to this number are durable
+        self.syncing = False
+
+_groups: "weakref.WeakValueDictionary[str, _DirectoryGroup]" = weakref.WeakValueDictionary()
+_groups_guard = threading.Lock()
+counters = {"writes": 0, "dir_fsyncs": 0}
+_counters_lock = threading.Lock()
+
+def _group_for(directory: str) -> _DirectoryGroup:
+    with _groups_guard:
+        group = _groups.get(directory)
+        if group is None:
+            group = _groups[directory] = _DirectoryGroup()
+        return group
+
+def _commit_rename(group: _DirectoryGroup, directory: str) -> None:
+    """Return once a directory fsync covering our rename has finished."""
+    with group.cond:
+        group.writing -= 1
+        group.requested += 1
+        ticket = group.requested
+        group.cond.notify_all()
+        deadline = time.monotonic() + GROUP_COMMIT_MAX_WAIT
+        while group.synced < ticket and group.syncing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            group.cond.wait(remaining)
+        if group.synced >= ticket:
+            return
+        lead = not group.syncing
+        if lead:
+            group.syncing = True
+            # Let writers already under way get their renames into this sync
+            group.cond.wait_for(lambda: group.writing == 0, timeout=GROUP_COMMIT_WINDOW)
+            target = group.requested
+    if not lead:
+        # The leader is stuck in its fsync; don't wait on it any longer
+        _fsync_dir(directory)
+        with _counters_lock:
+            counters["dir_fsyncs"] += 1
+        return
+    try:
+        _fsync_dir(directory)
+        with _counters_lock:
+            counters["dir_fsyncs"] += 1
+    finally:
+        with group.cond:
+            group.synced = max(group.synced, target)
+            group.syncing = False
+            group.cond.notify_all()
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    group = _group_for(directory)
+    with lock_for(path):
+        with group.cond:
+            group.writing += 1
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                if FSYNC_ENABLED:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            with group.cond:
+                group.writing -= 1
+                group.cond.notify_all()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    with _counters_lock:
+        counters["writes"] += 1
+    if FSYNC_ENABLED:
+        # Make the rename itself durable, shared with concurrent writers
+        _commit_rename(group, directory)
+    else:
+        with group.cond:
+            group.writing -= 1
+            group.cond.notify_all()
+
+def atomic_write_json(path: str, obj: Any, **dump_kwargs) -> None:
+    atomic_write_bytes(path, json.dumps(obj, **dump_kwargs).encode("utf-8"))
+
+def remove_stale_temp_files(directory: str, max_age: float = None) -> int:
+    """Delete temp files a crashed write left in directory; returns how many."""
+    max_age = STALE_TMP_SECONDS if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not name.endswith(".tmp"):
+            continue
+        tmp_path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(tmp_path) <= cutoff:
+                os.remove(tmp_path)
+                removed += 1
+        except OSError:
+            # Renamed or removed by its writer meanwhile
+            pass
+    return removed
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=200, help="writes per thread")
+    parser.add_argument("--files", type=int, default=32, help="shared target files")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="safe_write_")
+    paths = [os.path.join(workdir, f"chat_{i}.json") for i in range(args.files)]
+    acked: Dict[str, Dict] = {}
+    acked_lock = threading.Lock()
+
+    def worker(tid: int) -> None:
+        for n in range(args.writes):
+            path = paths[(tid + n) % len(paths)]
+            doc = {"writer": tid, "n": n, "messages": [{"role": "user", "content": "x" * 200}] * 20}
+            atomic_write_json(path, doc)
+            with acked_lock:
+                acked.setdefault(path, {})[tid] = n
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    # Every file must parse, and hold a write that was acknowledged
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        assert doc["n"] <= acked[path][doc["writer"]], path
+    leftovers = [f for f in os.listdir(workdir) if f.endswith(".tmp")]
+    assert not leftovers, leftovers
+    shutil.rmtree(workdir)
+    total = args.threads * args.writes
+    print(f"{total} writes in {elapsed:.2f}s = {total / elapsed:8.0f} writes/s, "
+          f"{counters['dir_fsyncs']} directory fsyncs")
+    print("✅ all files intact, no temp files left")
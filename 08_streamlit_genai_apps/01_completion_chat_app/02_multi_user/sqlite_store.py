@@ -0,0 +1,176 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Iterator, Optional
+
+# ✅ Single SQLite database (WAL mode) holding every user's chats
+SQLITE_DB_PATH = os.getenv("CHAT_SQLITE_PATH", "chats.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    context_summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chats_user_created ON chats (user_id, created_at);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+) WITHOUT ROWID;
+"""
+
+# One connection per database path, shared by every session. Streamlit runs
+# each rerun on a new thread, so a per-thread connection would mean a new
+# connect and schema check per rerun; the lock serialises use instead
+class _Database:
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(chats)")]
+        if "context_summary" not in columns:
+            # Databases created before rolling summaries were stored
+            self.conn.execute("ALTER TABLE chats ADD COLUMN context_summary TEXT")
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.conn.close()
+
+_databases: Dict[str, _Database] = {}
+_databases_lock = threading.Lock()
+
+@contextmanager
+def _connection() -> Iterator[sqlite3.Connection]:
+    """The connection to SQLITE_DB_PATH, held exclusively for the block."""
+    while True:
+        with _databases_lock:
+            database = _databases.get(SQLITE_DB_PATH)
+            if database is None:
+                database = _databases[SQLITE_DB_PATH] = _Database(SQLITE_DB_PATH)
+        with database.lock:
+            # Closed between lookup and lock: open it again
+            if not database.closed:
+                yield database.conn
+                return
+
+def close_all() -> None:
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for database in databases:
+        database.close()
+
+def create_new_chat(user_id: str, title: str = "New Chat") -> str:
+    chat_id = str(uuid.uuid4())
+    with _connection() as conn, conn:
+        conn.execute(
+            "INSERT INTO chats (id, user_id, title, created_at) VALUES (?, ?, ?, ?)",
+            (chat_id, user_id, title, datetime.now().isoformat())
+        )
+    return chat_id
+
+def list_chat_ids_for_user(user_id: str) -> List[str]:
+    with _connection() as conn:
+        rows = conn.execute(
+            "SELECT id FROM chats WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+        )
+        return [row[0] for row in rows]
+
+def list_chats_for_user(user_id: str) -> List[Dict]:
+    with _connection() as conn:
+        rows = conn.execute(
+            "SELECT id, title, created_at FROM chats WHERE user_id = ? ORDER BY created_at DESC",
+            (user_id,)
+        )
+        return [{"id": row[0], "title": row[1], "created_at": row[2]} for row in rows]
+
+def get_chat_by_id(user_id: str, chat_id: str) -> Optional[Dict]:
+    with _connection() as conn:
+        row = conn.execute(
+            "SELECT id, user_id, title, created_at, context_summary FROM chats WHERE id = ? AND user_id = ?",
+            (chat_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = conn.execute(
+            "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY seq", (chat_id,)
+        ).fetchall()
+    chat = {
+        "id": row[0],
+        "user_id": row[1],
+        "title": row[2],
+        "created_at": row[3],
+        "messages": [{"role": role, "content": content} for role, content in messages]
+    }
+    if row[4]:
+        chat["context_summary"] = json.loads(row[4])
+    return chat
+
+def save_chat_by_id(user_id: str, chat_id: str, chat_data: Dict) -> None:
+    """Insert only the messages past the stored count; rewrite if history shrank."""
+    messages = chat_data["messages"]
+    with _connection() as conn, conn:
+        summary = chat_data.get("context_summary")
+        conn.execute(
+            "INSERT INTO chats (id, user_id, title, created_at, context_summary) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET title = excluded.title, context_summary = excluded.context_summary",
+            (chat_id, user_id, chat_data["title"],
+             chat_data.get("created_at") or datetime.now().isoformat(),
+             json.dumps(summary) if summary else None)
+        )
+        stored = conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE chat_id = ?", (chat_id,)
+        ).fetchone()[0]
+        if len(messages) < stored:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            stored = 0
+        conn.executemany(
+            "INSERT INTO messages (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(chat_id, seq, m["role"], m["content"])
+             for seq, m in enumerate(messages[stored:], start=stored)]
+        )
+
+def rename_chat_title(user_id: str, chat_id: str, new_title: str) -> None:
+    with _connection() as conn, conn:
+        conn.execute(
+            "UPDATE chats SET title = ? WHERE id = ? AND user_id = ?",
+            (new_title, chat_id, user_id)
+        )
+
+def delete_chat_by_id(user_id: str, chat_id: str) -> None:
+    with _connection() as conn, conn:
+        deleted = conn.execute(
+            "DELETE FROM chats WHERE id = ? AND user_id = ?", (chat_id, user_id)
+        ).rowcount
+        if deleted:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+
+def import_chats(chats: List[Dict]) -> None:
+    """Bulk-insert complete chat documents in a single transaction."""
+    with _connection() as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO chats (id, user_id, title, created_at, context_summary) VALUES (?, ?, ?, ?, ?)",
+            [(c["id"], c["user_id"], c["title"], c["created_at"],
+              json.dumps(c["context_summary"]) if c.get("context_summary") else None) for c in chats]
+        )
+        conn.executemany(
+            "DELETE FROM messages WHERE chat_id = ?", [(c["id"],) for c in chats]
+        )
+        conn.executemany(
+            "INSERT INTO messages (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(c["id"], seq, m["role"], m["content"])
+             for c in chats for seq, m in enumerate(c["messages"])]
+        )
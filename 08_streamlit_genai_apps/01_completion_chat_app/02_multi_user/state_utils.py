@@ -1,18 +1,129 @@
 import os
 import json
+import zlib
+import atexit
+import struct
+import threading
+from typing import Dict, Optional
+from safe_write import atomic_write_bytes
 
 SESSION_DIR = "session_state"
 BASE_CHAT_DIR = "chats"
 
+# json: rewrite <user>.json on every save (the original behaviour)
+# snapshot: diff against the last persisted state and write a compressed
+#           <user>.snap at most once per SESSION_SNAPSHOT_DELAY seconds
+SESSION_STATE_MODE = os.getenv("SESSION_STATE_MODE", "snapshot")
+SESSION_SNAPSHOT_DELAY = float(os.getenv("SESSION_SNAPSHOT_DELAY", 1.0))
+
+# --- Snapshot format ---
+# header: 4-byte magic + uint16 schema version, then zlib-compressed JSON
+SNAPSHOT_MAGIC = b"SSNP"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct(">4sH")
+
+# user_id -> {key: encoded value} as last written to disk
+_persisted: Dict[str, Dict[str, str]] = {}
+# user_id -> {key: encoded value} waiting for the debounce timer
+_pending: Dict[str, Dict[str, str]] = {}
+_timers: Dict[str, threading.Timer] = {}
+_lock = threading.Lock()
+# Serializes writes so an older snapshot never overwrites a newer one
+_write_lock = threading.Lock()
+
 def get_user_session_path(user_id):
     return os.path.join(SESSION_DIR, f"{user_id}.json")
 
+def get_user_snapshot_path(user_id):
+    return os.path.join(SESSION_DIR, f"{user_id}.snap")
+
+def _encode_state(state_dict) -> Dict[str, str]:
+    return {key: json.dumps(value, sort_keys=True, separators=(",", ":"))
+            for key, value in state_dict.items()}
+
+def _pack(encoded: Dict[str, str]) -> bytes:
+    body = "{" + ",".join(f"{json.dumps(k)}:{v}" for k, v in encoded.items()) + "}"
+    return _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION) + zlib.compress(body.encode("utf-8"))
+
+def _unpack(data: bytes) -> Optional[dict]:
+    """Decode a snapshot; None if the header is not one we understand."""
+    if len(data) < _HEADER.size:
+        return None
+    magic, version = _HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    return json.loads(zlib.decompress(data[_HEADER.size:]).decode("utf-8"))
+
+def _flush_user(user_id):
+    with _write_lock:
+        with _lock:
+            _timers.pop(user_id, None)
+            encoded = _pending.pop(user_id, None)
+        if encoded is None:
+            return
+        try:
+            os.makedirs(SESSION_DIR, exist_ok=True)
+            atomic_write_bytes(get_user_snapshot_path(user_id), _pack(encoded))
+        except OSError as e:
+            print(f"❌ Failed to save session state for {user_id}: {e}")
+            with _lock:
+                # Retried by the next save or the shutdown flush
+                _pending.setdefault(user_id, encoded)
+            return
+        with _lock:
+            _persisted[user_id] = encoded
+
+def flush_session_states():
+    """Write every pending snapshot now (also runs at shutdown)."""
+    with _lock:
+        users = list(_pending)
+        for timer in _timers.values():
+            timer.cancel()
+    for user_id in users:
+        _flush_user(user_id)
+
+atexit.register(flush_session_states)
+
 def save_user_session_state(user_id, state_dict):
-    os.makedirs(SESSION_DIR, exist_ok=True)
-    with open(get_user_session_path(user_id), "w") as f:
-        json.dump(state_dict, f)
+    if SESSION_STATE_MODE != "snapshot":
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        with open(get_user_session_path(user_id), "w") as f:
+            json.dump(state_dict, f)
+        return
+
+    # Encode here so unserializable state fails in the caller, not the timer
+    encoded = _encode_state(state_dict)
+    with _lock:
+        if encoded == _pending.get(user_id, _persisted.get(user_id)):
+            return
+        _pending[user_id] = encoded
+        if user_id not in _timers:
+            timer = threading.Timer(SESSION_SNAPSHOT_DELAY, _flush_user, args=(user_id,))
+            timer.daemon = True
+            _timers[user_id] = timer
+            timer.start()
 
 def load_user_session_state(user_id):
+    with _lock:
+        encoded = _pending.get(user_id)
+    if encoded is not None:
+        return {key: json.loads(value) for key, value in encoded.items()}
+
+    if SESSION_STATE_MODE == "snapshot":
+        try:
+            with open(get_user_snapshot_path(user_id), "rb") as f:
+                state = _unpack(f.read())
+            if state is not None:
+                with _lock:
+                    _persisted.setdefault(user_id, _encode_state(state))
+                return state
+            print(f"⚠️ Unknown session snapshot format for {user_id}, falling back to JSON")
+        except FileNotFoundError:
+            pass
+        except (ValueError, zlib.error) as e:
+            print(f"⚠️ Corrupt session snapshot for {user_id}: {e}")
+
+    # Files written before snapshots existed, or with SESSION_STATE_MODE=json
     try:
         with open(get_user_session_path(user_id), "r") as f:
             return json.load(f)
@@ -0,0 +1,35 @@
+import pytest
+
+import model
+
+
+@pytest.fixture
+def chats(tmp_path, monkeypatch):
+    """Point the chat store at an empty directory with a cold cache."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(model, "CHAT_STORAGE_MODE", "json")
+    monkeypatch.setattr(model, "_known_user_dirs", set())
+    model._chat_cache.clear()
+    yield model
+    model._chat_cache.clear()
+
+
+def test_repeat_reads_hit_the_cache(chats):
+    chat_id = chats.create_new_chat("alice", "Algebra")
+    hits = chats.get_chat_cache_stats()["hits"]
+
+    assert chats.get_chat_by_id("alice", chat_id)["title"] == "Algebra"
+    assert chats.get_chat_by_id("alice", chat_id)["title"] == "Algebra"
+
+    assert chats.get_chat_cache_stats()["hits"] == hits + 1
+
+
+def test_chat_created_between_stat_and_read_is_returned_uncached(chats, monkeypatch):
+    chat_id = chats.create_new_chat("alice", "Algebra")
+    # The stat misses the snapshot, as if it were written just after
+    monkeypatch.setattr(chats, "_chat_signature", lambda user_dir, chat_id: None)
+
+    chat = chats.get_chat_by_id("alice", chat_id)
+
+    assert chat["title"] == "Algebra"
+    assert chats.get_chat_cache_stats()["entries"] == 0
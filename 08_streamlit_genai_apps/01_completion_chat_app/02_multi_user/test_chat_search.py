@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+import pytest
+
+import chat_search
+
+
+@pytest.fixture
+def search_dir(tmp_path, monkeypatch):
+    chat_search.close_all()
+    monkeypatch.setattr(chat_search, "SEARCH_INDEX_DIR", str(tmp_path))
+    yield tmp_path
+    chat_search.close_all()
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    """Count sqlite3.connect calls made by chat_search."""
+    calls = []
+    real_connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        calls.append(args[0])
+        return real_connect(*args, **kwargs)
+    monkeypatch.setattr(chat_search.sqlite3, "connect", counting_connect)
+    return calls
+
+
+def in_new_thread(fn, *args):
+    """Run fn the way a Streamlit rerun would: on a fresh thread."""
+    result = {}
+    t = threading.Thread(target=lambda: result.setdefault("value", fn(*args)))
+    t.start()
+    t.join()
+    return result.get("value")
+
+
+def test_reruns_on_new_threads_share_one_connection(search_dir, connects):
+    in_new_thread(chat_search.index_chat, "alice", "c1", [{"role": "user", "content": "prime numbers"}])
+    for _ in range(5):
+        hits = in_new_thread(chat_search.search, "alice", "prime")
+        assert [h["chat_id"] for h in hits] == ["c1"]
+
+    assert len(connects) == 1
+
+
+def test_least_recently_used_index_is_closed_and_reopened(search_dir, connects, monkeypatch):
+    monkeypatch.setattr(chat_search, "SEARCH_MAX_OPEN_INDEXES", 2)
+    for user in ("alice", "bob", "carol"):
+        chat_search.index_chat(user, "c1", [{"role": "user", "content": f"hello {user}"}])
+
+    assert len(chat_search._indexes) == 2
+    assert [h["chat_id"] for h in chat_search.search("alice", "alice")] == ["c1"]
+    assert len(connects) == 4
+
+
+def test_concurrent_saves_to_one_index(search_dir):
+    def save(n):
+        chat_search.index_chat("alice", f"c{n}", [{"role": "user", "content": f"topic{n} algebra"}])
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert chat_search.indexed_chat_ids("alice") == {f"c{n}" for n in range(16)}
+    assert len(chat_search.search("alice", "algebra", limit=50)) == 16
@@ -0,0 +1,82 @@
+import gc
+import random
+import threading
+import weakref
+
+import pytest
+
+import database
+from database import Database
+
+
+def run_title_writers(db, threads=8, users=4, ops=200):
+    """Concurrent creates and renames; returns the title each chat must end with."""
+    expected = {}
+    expected_lock = threading.Lock()
+
+    def worker(tid):
+        rng = random.Random(tid)
+        mine = {}
+        for n in range(ops):
+            if n % 2 == 0 or not mine:
+                # Chat ids are unique per thread, so the final title is known
+                user_id, chat_id = f"user_{rng.randrange(users)}", f"t{tid}_{n}"
+                db.save_chat_title_if_new(user_id, chat_id, f"Chat {n}")
+            else:
+                user_id, chat_id = rng.choice(list(mine))
+                db.rename_chat(user_id, chat_id, f"Renamed {n}")
+            mine[(user_id, chat_id)] = db.list_chats(user_id)[chat_id]
+        with expected_lock:
+            for (user_id, chat_id), title in mine.items():
+                expected.setdefault(user_id, {})[chat_id] = title
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return expected
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_concurrent_title_writes_are_not_lost(tmp_path, write_behind):
+    with Database(db_root=str(tmp_path), write_behind=write_behind) as db:
+        expected = run_title_writers(db)
+
+    reopened = Database(db_root=str(tmp_path), write_behind=False)
+    for user_id, titles in expected.items():
+        assert reopened.list_chats(user_id) == titles
+
+
+def test_write_behind_flushes_after_the_delay(tmp_path):
+    db = Database(db_root=str(tmp_path), write_behind=True, flush_delay=0.2)
+    db.save_chat_title_if_new("alice", "c1", "Algebra")
+    timer = db._flush_timer
+    assert Database(db_root=str(tmp_path)).list_chats("alice") == {}
+
+    timer.join()
+
+    assert Database(db_root=str(tmp_path)).list_chats("alice") == {"c1": "Algebra"}
+
+
+def test_exit_handler_flushes_live_instances(tmp_path):
+    db = Database(db_root=str(tmp_path), write_behind=True, flush_delay=60)
+    db.save_chat_title_if_new("alice", "c1", "Algebra")
+
+    database._flush_all()
+
+    assert Database(db_root=str(tmp_path)).list_chats("alice") == {"c1": "Algebra"}
+
+
+def test_rebuilt_instances_are_not_kept_alive(tmp_path):
+    refs = []
+    for _ in range(20):
+        # What a Streamlit rerun does
+        db = Database(db_root=str(tmp_path))
+        db.save_chat_title_if_new("alice", "c1", "Algebra")
+        db.close()
+        refs.append(weakref.ref(db))
+    del db
+    gc.collect()
+
+    assert all(ref() is None for ref in refs)
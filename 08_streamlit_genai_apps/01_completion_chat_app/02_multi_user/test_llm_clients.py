@@ -0,0 +1,188 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+import llm_clients
+import model
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """Local stand-in for the chat completions endpoint.
+
+    mode is "ok", "slow" (sleeps `delay` before answering) or "error" (400).
+    """
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.mode = "ok"
+        self.delay = 0.0
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if server.mode == "slow":
+                time.sleep(server.delay)
+            if server.mode == "error":
+                status, body = 400, {"error": {"message": "bad request", "type": "invalid_request_error"}}
+            else:
+                status, body = 200, {
+                    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " 42 "}}]
+                }
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        payload = json.dumps(body).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout test)
+            pass
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    server = FakeOpenAI()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    llm_clients.close_all()
+    yield server
+    llm_clients.close_all()
+    server.shutdown()
+    server.server_close()
+
+
+def ask(client: openai.OpenAI) -> str:
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo", messages=[{"role": "user", "content": "6 x 7?"}]
+    )
+    return response.choices[0].message.content
+
+
+def slot_is_free(api_key: str) -> bool:
+    try:
+        with llm_clients.llm_slot(api_key, timeout=0):
+            return True
+    except llm_clients.LLMBusyError:
+        return False
+
+
+def test_sequential_calls_reuse_one_pooled_connection(fake_openai):
+    for _ in range(5):
+        with llm_clients.llm_slot("sk-pool") as client:
+            assert ask(client) == " 42 "
+
+    assert fake_openai.requests == 5
+    assert fake_openai.connections == 1
+    assert llm_clients.get_client("sk-pool") is client
+
+
+def test_slots_cap_parallel_calls_per_key(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CONCURRENCY", 2)
+    fake_openai.mode, fake_openai.delay = "slow", 0.2
+
+    def worker() -> None:
+        with llm_clients.llm_slot("sk-cap") as client:
+            ask(client)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert fake_openai.requests == 6
+    assert fake_openai.max_in_flight == 2
+
+
+def test_busy_key_fails_fast_when_no_slot_is_free(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CONCURRENCY", 1)
+    with llm_clients.llm_slot("sk-busy"):
+        assert not slot_is_free("sk-busy")
+    assert slot_is_free("sk-busy")
+
+
+def test_timeout_releases_the_slot(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_clients, "LLM_TIMEOUT", 0.2)
+    fake_openai.mode, fake_openai.delay = "slow", 1.0
+
+    with pytest.raises(openai.APITimeoutError):
+        with llm_clients.llm_slot("sk-timeout") as client:
+            client.with_options(max_retries=0).chat.completions.create(
+                model="gpt-3.5-turbo", messages=[{"role": "user", "content": "6 x 7?"}]
+            )
+
+    assert slot_is_free("sk-timeout")
+
+
+def test_error_reply_releases_the_slot(fake_openai, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CONCURRENCY", 1)
+    fake_openai.mode = "error"
+    bot = model.BotModel(api_key="sk-error")
+
+    reply = bot.generate_reply([{"role": "user", "content": "6 x 7?"}], use_cache=False)
+
+    assert reply.startswith("Sorry")
+    assert slot_is_free("sk-error")
+    fake_openai.mode = "ok"
+    assert bot.generate_reply([{"role": "user", "content": "6 x 7?"}], use_cache=False) == "42"
+
+
+def test_least_recently_used_idle_client_is_closed(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CLIENTS", 2)
+    first = llm_clients._get_entry("sk-a")
+    second = llm_clients._get_entry("sk-b")
+    llm_clients._get_entry("sk-a")
+
+    llm_clients._get_entry("sk-c")
+
+    assert second.http_client.is_closed
+    assert not first.http_client.is_closed
+    assert len(llm_clients._registry) == 2
+
+
+def test_client_evicted_mid_request_is_closed_when_done(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CLIENTS", 1)
+    with llm_clients.llm_slot("sk-a") as client:
+        entry = llm_clients._get_entry("sk-a")
+        llm_clients._get_entry("sk-b")
+        # Evicted, but still answering this request
+        assert not entry.http_client.is_closed
+        assert ask(client) == " 42 "
+
+    assert entry.http_client.is_closed
+    assert llm_clients.get_client("sk-a") is not client
@@ -0,0 +1,106 @@
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import model
+from response_cache import ResponseCache
+
+
+def disk_keys(cache_dir):
+    return sorted(name[:-5] for _, _, names in os.walk(cache_dir) for name in names if name.endswith(".json"))
+
+
+def test_disk_tier_keeps_only_the_newest_entries(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_disk_entries=3)
+    for n in range(5):
+        cache.put(f"{n:02d}key", f"answer {n}", 0.1)
+
+    assert disk_keys(tmp_path) == ["02key", "03key", "04key"]
+    stats = cache.stats()
+    assert stats["disk_entries"] == 3
+    assert stats["disk_evictions"] == 2
+
+
+def test_disk_tier_respects_the_byte_cap(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_disk_bytes=1000)
+    for n in range(10):
+        cache.put(f"{n:02d}key", "x" * 300, 0.1)
+
+    assert cache.stats()["disk_bytes"] <= 1000
+    assert disk_keys(tmp_path) == ["08key", "09key"]
+
+
+def test_files_from_an_earlier_process_count_against_the_cap(tmp_path):
+    ResponseCache(cache_dir=str(tmp_path)).put("00old", "stale", 0.1)
+    cache = ResponseCache(cache_dir=str(tmp_path), max_disk_entries=1)
+
+    cache.put("01new", "fresh", 0.1)
+
+    assert disk_keys(tmp_path) == ["01new"]
+
+
+def test_expired_entries_are_pruned_on_store(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttl=0.05)
+    cache.put("00old", "stale", 0.1)
+    time.sleep(0.1)
+
+    cache.put("01new", "fresh", 0.1)
+
+    assert disk_keys(tmp_path) == ["01new"]
+    assert cache.stats()["disk_evictions"] == 0
+
+
+def test_expired_lookup_is_counted_once(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttl=0.05)
+    cache.put("00key", "answer", 0.1)
+    time.sleep(0.1)
+
+    assert cache.get("00key") is None
+
+    stats = cache.stats()
+    assert (stats["expired"], stats["misses"]) == (1, 1)
+    assert disk_keys(tmp_path) == []
+
+
+def test_reply_survives_a_failing_cache_write(monkeypatch):
+    completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" 42 "))])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: completion)))
+
+    @contextmanager
+    def fake_slot(api_key):
+        yield client
+
+    def full_disk(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(model, "llm_slot", fake_slot)
+    monkeypatch.setattr(model._response_cache, "get", lambda key: None)
+    monkeypatch.setattr(model._response_cache, "put", full_disk)
+
+    bot = model.BotModel(api_key="sk-test")
+    assert bot.generate_reply([{"role": "user", "content": "6 x 7?"}]) == "42"
+
+
+def test_cached_answers_stay_with_the_key_that_paid_for_them(tmp_path, monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="42"))])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    @contextmanager
+    def fake_slot(api_key):
+        yield client
+
+    monkeypatch.setattr(model, "llm_slot", fake_slot)
+    monkeypatch.setattr(model, "_response_cache", ResponseCache(cache_dir=str(tmp_path)))
+    question = [{"role": "user", "content": "6 x 7?"}]
+
+    for _ in range(2):
+        assert model.BotModel(api_key="sk-alice").generate_reply(question) == "42"
+    assert len(calls) == 1
+
+    assert model.BotModel(api_key="sk-mallory").generate_reply(question) == "42"
+    assert len(calls) == 2
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import model
+import safe_write
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_write_replaces_the_target_atomically(tmp_path):
+    path = str(tmp_path / "chat.json")
+    safe_write.atomic_write_json(path, {"n": 1})
+    safe_write.atomic_write_json(path, {"n": 2})
+
+    assert read_json(path) == {"n": 2}
+    assert os.listdir(tmp_path) == ["chat.json"]
+
+
+def test_failed_write_keeps_the_old_file_and_no_temp(tmp_path, monkeypatch):
+    path = str(tmp_path / "chat.json")
+    safe_write.atomic_write_json(path, {"n": 1})
+
+    def crash(src, dst):
+        raise OSError("disk went away")
+    monkeypatch.setattr(safe_write.os, "replace", crash)
+
+    with pytest.raises(OSError):
+        safe_write.atomic_write_json(path, {"n": 2})
+
+    assert read_json(path) == {"n": 1}
+    assert os.listdir(tmp_path) == ["chat.json"]
+
+
+def test_concurrent_writers_never_leave_a_torn_file(tmp_path):
+    path = str(tmp_path / "chat.json")
+
+    def worker(tid):
+        for n in range(50):
+            safe_write.atomic_write_json(path, {"writer": tid, "n": n, "pad": "x" * 4096})
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert read_json(path)["n"] == 49
+    assert os.listdir(tmp_path) == ["chat.json"]
+
+
+@pytest.fixture
+def dir_fsyncs(monkeypatch):
+    """Directory fsyncs, each taking 10ms as on a real disk."""
+    calls = []
+
+    def slow_fsync(directory):
+        calls.append(directory)
+        time.sleep(0.01)
+    monkeypatch.setattr(safe_write, "FSYNC_ENABLED", True)
+    monkeypatch.setattr(safe_write, "_fsync_dir", slow_fsync)
+    return calls
+
+
+def test_concurrent_writes_share_directory_fsyncs(tmp_path, dir_fsyncs):
+    def worker(tid):
+        for n in range(10):
+            safe_write.atomic_write_json(str(tmp_path / f"chat_{tid}.json"), {"n": n})
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(dir_fsyncs) < 40
+    assert all(read_json(str(tmp_path / f"chat_{t}.json")) == {"n": 9} for t in range(8))
+
+
+def test_lone_writer_does_not_wait_for_a_group(tmp_path, dir_fsyncs, monkeypatch):
+    monkeypatch.setattr(safe_write, "GROUP_COMMIT_WINDOW", 5)
+    start = time.monotonic()
+
+    safe_write.atomic_write_json(str(tmp_path / "chat.json"), {"n": 1})
+
+    assert time.monotonic() - start < 1
+    assert dir_fsyncs == [str(tmp_path)]
+
+
+def test_stuck_leader_does_not_hold_up_other_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(safe_write, "GROUP_COMMIT_MAX_WAIT", 0.05)
+    unstick = threading.Event()
+    leading = threading.Event()
+    calls = []
+
+    def fsync_dir(directory):
+        calls.append(directory)
+        if len(calls) == 1:
+            leading.set()
+            unstick.wait()
+    monkeypatch.setattr(safe_write, "FSYNC_ENABLED", True)
+    monkeypatch.setattr(safe_write, "_fsync_dir", fsync_dir)
+    leader = threading.Thread(target=safe_write.atomic_write_json, args=(str(tmp_path / "a.json"), {"n": 1}))
+    leader.start()
+    leading.wait()
+
+    start = time.monotonic()
+    safe_write.atomic_write_json(str(tmp_path / "b.json"), {"n": 2})
+    waited = time.monotonic() - start
+    unstick.set()
+    leader.join()
+
+    assert waited < 1
+    assert len(calls) == 2
+    assert read_json(str(tmp_path / "b.json")) == {"n": 2}
+
+
+def test_stale_temp_files_are_removed_but_fresh_ones_kept(tmp_path):
+    (tmp_path / "chat.json").write_text('{"n": 1}')
+    stale = tmp_path / "chat.json.123.456.tmp"
+    stale.write_text('{"n": 2, "trunc')
+    os.utime(stale, (0, 0))
+    fresh = tmp_path / "other.json.123.789.tmp"
+    fresh.write_text("{}")
+
+    assert safe_write.remove_stale_temp_files(str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == ["chat.json", "other.json.123.789.tmp"]
+
+
+def test_chat_store_recovers_from_a_crash_before_rename(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(model, "CHAT_STORAGE_MODE", "json")
+    monkeypatch.setattr(model, "_known_user_dirs", set())
+    model._chat_cache.clear()
+    chat_id = model.create_new_chat("alice", "Algebra")
+    # A save that died after writing its temp file, in an earlier process
+    user_dir = tmp_path / model.BASE_CHAT_DIR / "alice"
+    leftover = user_dir / f"{chat_id}.json.999.1.tmp"
+    leftover.write_text('{"id": "half a chat')
+    os.utime(leftover, (0, 0))
+    monkeypatch.setattr(model, "_known_user_dirs", set())
+    model._chat_cache.clear()
+
+    assert model.get_chat_by_id("alice", chat_id)["title"] == "Algebra"
+    assert not leftover.exists()
+    assert [c["id"] for c in model.list_chats_for_user("alice")] == [chat_id]
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+import pytest
+
+import sqlite_store
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    sqlite_store.close_all()
+    path = str(tmp_path / "chats.db")
+    monkeypatch.setattr(sqlite_store, "SQLITE_DB_PATH", path)
+    yield path
+    sqlite_store.close_all()
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    """Count sqlite3.connect calls made by sqlite_store."""
+    calls = []
+    real_connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        calls.append(args[0])
+        return real_connect(*args, **kwargs)
+    monkeypatch.setattr(sqlite_store.sqlite3, "connect", counting_connect)
+    return calls
+
+
+def in_new_thread(fn, *args):
+    """Run fn the way a Streamlit rerun would: on a fresh thread."""
+    result = {}
+    t = threading.Thread(target=lambda: result.setdefault("value", fn(*args)))
+    t.start()
+    t.join()
+    return result.get("value")
+
+
+def test_reruns_on_new_threads_share_one_connection(db_path, connects):
+    chat_id = in_new_thread(sqlite_store.create_new_chat, "alice", "Algebra")
+    for _ in range(5):
+        assert in_new_thread(sqlite_store.list_chat_ids_for_user, "alice") == [chat_id]
+
+    assert connects == [db_path]
+
+
+def test_concurrent_saves_share_the_connection_safely(db_path):
+    chat_ids = [sqlite_store.create_new_chat("alice", f"Chat {n}") for n in range(8)]
+
+    def save(chat_id):
+        messages = []
+        for n in range(20):
+            messages.append({"role": "user", "content": f"{chat_id} {n}"})
+            sqlite_store.save_chat_by_id("alice", chat_id, {"title": "Chat", "messages": messages})
+
+    threads = [threading.Thread(target=save, args=(chat_id,)) for chat_id in chat_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for chat_id in chat_ids:
+        chat = sqlite_store.get_chat_by_id("alice", chat_id)
+        assert [m["content"] for m in chat["messages"]] == [f"{chat_id} {n}" for n in range(20)]
+
+
+def test_switching_path_opens_that_database(db_path, tmp_path, monkeypatch):
+    sqlite_store.create_new_chat("alice")
+    monkeypatch.setattr(sqlite_store, "SQLITE_DB_PATH", str(tmp_path / "other.db"))
+
+    assert sqlite_store.list_chat_ids_for_user("alice") == []
@@ -0,0 +1,357 @@
+"""
+Benchmark the chat persistence layers of the completion chat apps:
+
+  shelve        01_single_user/database.py, one shelve per chat, single-key format
+  shelve_records  the same with SHELVE_STORAGE_MODE=records (open handle, per-message keys)
+  model_json    02_multi_user/model.py, CHAT_STORAGE_MODE=json
+  model_log     02_multi_user/model.py, CHAT_STORAGE_MODE=log
+  model_sqlite  02_multi_user/model.py, CHAT_STORAGE_MODE=sqlite
+  meta_db       02_multi_user/database.py (Database with meta.json)
+
+Each store gets the same synthetic users/chats/messages. The benchmark
+times create, list, load, append, rename and delete, and reports latency
+percentiles plus disk footprint. Results are written as JSON, so runs can
+be diffed or tracked over time:
+
+    python benchmark_chat_stores.py --users 20 --chats 50 --messages 40 --output results.json
+
+--meta-concurrency adds a scenario for database.Database's chat titles:
+several threads create and rename chats for shared users, then a fresh
+Database reopens meta.json and counts writes that did not make it. It runs
+once writing meta.json synchronously (before) and once with the
+write-behind cache (after), reporting operations/sec for each.
+02_multi_user/test_database.py checks the same scenario loses nothing.
+
+This is a small, broad comparison. To time model.py's storage modes on a
+data set of production size (1M chats), use
+02_multi_user/benchmark_storage_at_scale.py.
+
+Run it from this directory with the apps' requirements installed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import threading
+import shutil
+import platform
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SINGLE_USER_DIR = os.path.join(HERE, "01_single_user")
+MULTI_USER_DIR = os.path.join(HERE, "02_multi_user")
+
+def _load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# The multi-user modules import their siblings by bare name
+sys.path.insert(0, MULTI_USER_DIR)
+import model as multi_user_model
+import chat_search
+import sqlite_store
+from database import Database as MetaDatabase
+single_user_database = _load_module("single_user_database", os.path.join(SINGLE_USER_DIR, "database.py"))
+
+def _message(i: int, rng: random.Random) -> Dict[str, str]:
+    words = ["integral", "derivative", "matrix", "vector", "limit", "proof", "series", "function"]
+    return {
+        "role": "user" if i % 2 == 0 else "assistant",
+        "content": " ".join(rng.choice(words) for _ in range(rng.randint(10, 120)))
+    }
+
+class Store:
+    """Uniform adapter; None means the store has no such operation."""
+    name = ""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def create(self, user_id: str, title: str) -> str: ...
+    def list(self, user_id: str) -> list: ...
+    def load(self, user_id: str, chat_id: str) -> list: ...
+    def append(self, user_id: str, chat_id: str, messages: List[Dict]) -> None: ...
+    rename: Optional[Callable] = None
+    def delete(self, user_id: str, chat_id: str) -> None: ...
+
+    def flush(self) -> None:
+        """Write out anything buffered, so the footprint is what is on disk."""
+
+    def close(self) -> None:
+        """Flush and release open handles before the root is removed."""
+        self.flush()
+
+class ShelveStore(Store):
+    def __init__(self, root: str, mode: str = "single") -> None:
+        super().__init__(root)
+        self.mode = mode
+        self.name = "shelve" if mode == "single" else f"shelve_{mode}"
+
+    def _db(self, user_id: str, chat_id: str):
+        return single_user_database.Database(dbName=os.path.join(self.root, f"{user_id}__{chat_id}"), mode=self.mode)
+
+    def create(self, user_id, title):
+        chat_id = f"{random.getrandbits(64):016x}"
+        self._db(user_id, chat_id).save_chat_history([])
+        return chat_id
+
+    def list(self, user_id):
+        return sorted({f.split("__")[1].split(".")[0] for f in os.listdir(self.root) if f.startswith(user_id + "__")})
+
+    def load(self, user_id, chat_id):
+        return self._db(user_id, chat_id).load_chat_history()
+
+    def append(self, user_id, chat_id, messages):
+        db = self._db(user_id, chat_id)
+        db.save_chat_history(db.load_chat_history() + messages)
+
+    def delete(self, user_id, chat_id):
+        self._db(user_id, chat_id).close()
+        prefix = f"{user_id}__{chat_id}"
+        for f in os.listdir(self.root):
+            if f == prefix or f.startswith(prefix + "."):
+                os.remove(os.path.join(self.root, f))
+
+class ModelStore(Store):
+    def __init__(self, root: str, mode: str) -> None:
+        super().__init__(root)
+        self.mode = mode
+        self.name = f"model_{mode}"
+
+    def activate(self) -> None:
+        multi_user_model.CHAT_STORAGE_MODE = self.mode
+        multi_user_model.BASE_CHAT_DIR = os.path.join(self.root, "chats")
+        multi_user_model._chat_cache.clear()
+        multi_user_model._log_state.clear()
+        sqlite_store.SQLITE_DB_PATH = os.path.join(self.root, "chats.db")
+        chat_search.SEARCH_INDEX_DIR = os.path.join(self.root, "search_index")
+
+    def create(self, user_id, title):
+        return multi_user_model.create_new_chat(user_id, title)
+
+    def list(self, user_id):
+        return multi_user_model.list_chats_for_user(user_id)
+
+    def load(self, user_id, chat_id):
+        return multi_user_model.get_chat_by_id(user_id, chat_id)
+
+    def append(self, user_id, chat_id, messages):
+        chat = multi_user_model.get_chat_by_id(user_id, chat_id)
+        chat["messages"].extend(messages)
+        multi_user_model.save_chat_by_id(user_id, chat_id, chat)
+
+    def rename(self, user_id, chat_id, title):
+        multi_user_model.rename_chat_title(user_id, chat_id, title)
+
+    def delete(self, user_id, chat_id):
+        multi_user_model.delete_chat_by_id(user_id, chat_id)
+
+    def close(self):
+        sqlite_store.close_all()
+        chat_search.close_all()
+
+class MetaDatabaseStore(Store):
+    name = "meta_db"
+
+    def __init__(self, root: str) -> None:
+        super().__init__(root)
+        self.db = MetaDatabase(db_root=root)
+
+    def create(self, user_id, title):
+        chat_id = f"{random.getrandbits(64):016x}"
+        self.db.save_chat_history(user_id, chat_id, [])
+        self.db.save_chat_title_if_new(user_id, chat_id, title)
+        return chat_id
+
+    def list(self, user_id):
+        return self.db.list_chats(user_id)
+
+    def load(self, user_id, chat_id):
+        return self.db.load_chat_history(user_id, chat_id)
+
+    def append(self, user_id, chat_id, messages):
+        self.db.save_chat_history(user_id, chat_id, self.db.load_chat_history(user_id, chat_id) + messages)
+
+    def rename(self, user_id, chat_id, title):
+        self.db.rename_chat(user_id, chat_id, title)
+
+    def delete(self, user_id, chat_id):
+        self.db.delete_chat(user_id, chat_id)
+
+    def flush(self):
+        self.db.flush()
+
+    def close(self):
+        self.db.close()
+
+def _footprint(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": samples[-1] * 1000
+    }
+
+def run_meta_concurrency(root: str, write_behind: bool, threads: int, users: int, ops: int) -> Dict:
+    """Concurrent title writes through one Database; counts lost updates."""
+    db = MetaDatabase(db_root=root, write_behind=write_behind)
+    expected: Dict[str, Dict[str, str]] = {}
+    expected_lock = threading.Lock()
+
+    def worker(tid: int) -> None:
+        rng = random.Random(tid)
+        mine = {}
+        for n in range(ops):
+            user_id = f"user_{rng.randrange(users):04d}"
+            if n % 2 == 0 or not mine:
+                # Chat ids are unique per thread, so the final title is known
+                chat_id = f"t{tid}_{n}"
+                db.save_chat_title_if_new(user_id, chat_id, f"Chat {n}")
+                mine[(user_id, chat_id)] = f"Chat {n}"
+            else:
+                user_id, chat_id = rng.choice(list(mine))
+                db.rename_chat(user_id, chat_id, f"Renamed {n}")
+                mine[(user_id, chat_id)] = f"Renamed {n}"
+        with expected_lock:
+            for (user_id, chat_id), title in mine.items():
+                expected.setdefault(user_id, {})[chat_id] = title
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    reopened = MetaDatabase(db_root=root, write_behind=False)
+    lost = sum(
+        1 for user_id, titles in expected.items()
+        for chat_id, title in titles.items()
+        if reopened.list_chats(user_id).get(chat_id) != title
+    )
+    total = threads * ops
+    return {"operations": total, "seconds": elapsed, "ops_per_sec": total / elapsed, "lost_updates": lost}
+
+def run_store(store: Store, users: int, chats: int, messages: int, ops: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    timings = {op: [] for op in ("create", "list", "load", "append", "rename", "delete")}
+
+    def timed(op: str, fn: Callable, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[op].append(time.perf_counter() - start)
+        return result
+
+    layout = {}
+    for u in range(users):
+        user_id = f"user_{u:04d}"
+        layout[user_id] = []
+        for c in range(chats):
+            chat_id = timed("create", store.create, user_id, f"Chat {c}")
+            # Populate untimed with one bulk append
+            store.append(user_id, chat_id, [_message(i, rng) for i in range(messages)])
+            layout[user_id].append(chat_id)
+    store.flush()
+    footprint = _footprint(store.root)
+
+    for _ in range(ops):
+        user_id = rng.choice(list(layout))
+        chat_id = rng.choice(layout[user_id])
+        timed("list", store.list, user_id)
+        timed("load", store.load, user_id, chat_id)
+        timed("append", store.append, user_id, chat_id, [_message(0, rng), _message(1, rng)])
+        if store.rename is not None:
+            timed("rename", store.rename, user_id, chat_id, f"Renamed {rng.random():.6f}")
+
+    for user_id, chat_ids in layout.items():
+        for chat_id in chat_ids:
+            timed("delete", store.delete, user_id, chat_id)
+
+    return {
+        "ops": {op: _summarize(samples) for op, samples in timings.items()},
+        "disk_bytes": footprint
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=50, help="chats per user")
+    parser.add_argument("--messages", type=int, default=40, help="messages per chat")
+    parser.add_argument("--ops", type=int, default=500, help="random list/load/append/rename rounds")
+    parser.add_argument("--stores", default="shelve,shelve_records,model_json,model_log,model_sqlite,meta_db")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", default=None, help="defaults to a temp dir, removed afterwards")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--meta-concurrency", action="store_true", help="also run the concurrent chat title scenario")
+    parser.add_argument("--meta-threads", type=int, default=16)
+    parser.add_argument("--meta-ops", type=int, default=500, help="title writes per thread")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="chat_store_bench_")
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("workdir", "output")},
+        "stores": {}
+    }
+    try:
+        for name in args.stores.split(","):
+            root = os.path.join(workdir, name)
+            os.makedirs(root, exist_ok=True)
+            if name == "shelve":
+                store = ShelveStore(root)
+            elif name == "shelve_records":
+                store = ShelveStore(root, "records")
+            elif name == "meta_db":
+                store = MetaDatabaseStore(root)
+            elif name.startswith("model_"):
+                store = ModelStore(root, name[len("model_"):])
+                store.activate()
+            else:
+                parser.error(f"unknown store {name}")
+            print(f"Running {name}...")
+            try:
+                results["stores"][name] = run_store(store, args.users, args.chats, args.messages, args.ops, args.seed)
+            finally:
+                store.close()
+            for op, stats in results["stores"][name]["ops"].items():
+                if stats:
+                    print(f"  {op:>7}: p50={stats['p50_ms']:.2f} ms  p95={stats['p95_ms']:.2f} ms  p99={stats['p99_ms']:.2f} ms")
+            print(f"  disk: {results['stores'][name]['disk_bytes'] / 1024:.0f} KiB")
+        if args.meta_concurrency:
+            results["meta_concurrency"] = {}
+            for label, write_behind in (("sync", False), ("write_behind", True)):
+                root = os.path.join(workdir, f"meta_concurrency_{label}")
+                stats = run_meta_concurrency(root, write_behind, args.meta_threads, args.users, args.meta_ops)
+                results["meta_concurrency"][label] = stats
+                print(f"meta titles {label:>12}: {stats['ops_per_sec']:8.0f} ops/s, {stats['lost_updates']} lost updates")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
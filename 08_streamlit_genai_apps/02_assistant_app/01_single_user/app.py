@@ -20,7 +20,12 @@ if prompt := st.chat_input("Please Ask a Question"):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    if(st.session_state.bot.isCompleted()):
+    with st.spinner("Thinking..."):
+        completed = st.session_state.bot.isCompleted()
+    if(completed):
         response: MessageItem = st.session_state.bot.get_lastest_response()
         with st.chat_message(response.role):
-            st.markdown(response.content)
\ No newline at end of file
+            st.markdown(response.content)
+    else:
+        run = st.session_state.bot.latest_run
+        st.error(f"The tutor couldn't answer (run status: {run.status if run else 'unknown'}). Please try again.")
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Local registry of the assistants this app has created.
+
+Assistants are keyed by a hash of their configuration (name, instructions,
+model, tools) and the account they live in, so every session with the same
+configuration and account shares one assistant instead of creating its own.
+The account is identified by a fingerprint of the API key plus the
+organization and project, never the key itself. The registry is a small
+JSON file, ASSISTANT_REGISTRY_PATH (next to this module by default),
+mapping key -> assistant id.
+
+get_or_create holds an exclusive flock on <path>.lock while it looks up
+and, if needed, creates the assistant, so sessions starting at once in any
+number of processes create at most one. Ids are also cached per process,
+so after the first lookup a new session costs no I/O at all.
+
+Ids are not checked against the API here; callers validate lazily on first
+use and call forget() if the assistant turned out to be deleted.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+ASSISTANT_REGISTRY_PATH = os.getenv(
+    "ASSISTANT_REGISTRY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assistant_registry.json")
+)
+
+_ids: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def account_id(api_key: Optional[str], organization: Optional[str] = None, project: Optional[str] = None) -> str:
+    """Non-secret identifier of the account an assistant is created in."""
+    fingerprint = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return f"{organization or '-'}/{project or '-'}/{fingerprint}"
+
+
+def config_key(name: str, instructions: str, model: str, tools: List[Dict], account: str) -> str:
+    config = {"name": name, "instructions": instructions, "model": model, "tools": tools, "account": account}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _locked():
+    with _lock:
+        directory = os.path.dirname(ASSISTANT_REGISTRY_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{ASSISTANT_REGISTRY_PATH}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read() -> Dict[str, Dict]:
+    try:
+        with open(ASSISTANT_REGISTRY_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"⚠️ Ignoring unreadable {ASSISTANT_REGISTRY_PATH}: {e}")
+        return {}
+
+
+def _write(entries: Dict[str, Dict]) -> None:
+    tmp_path = f"{ASSISTANT_REGISTRY_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, ASSISTANT_REGISTRY_PATH)
+
+
+def get_or_create(key: str, create: Callable[[], str]) -> str:
+    """Assistant id registered for key, calling create() only if there is none."""
+    assistant_id = _ids.get(key)
+    if assistant_id is not None:
+        return assistant_id
+    with _locked():
+        entries = _read()
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = {"id": create(), "created_at": time.time()}
+            _write(entries)
+        _ids[key] = entry["id"]
+        return entry["id"]
+
+
+def forget(key: str, assistant_id: str) -> None:
+    """Drop key if it still points at assistant_id (e.g. it was deleted remotely)."""
+    with _locked():
+        if _ids.get(key) == assistant_id:
+            del _ids[key]
+        entries = _read()
+        if entries.get(key, {}).get("id") == assistant_id:
+            del entries[key]
+            _write(entries)
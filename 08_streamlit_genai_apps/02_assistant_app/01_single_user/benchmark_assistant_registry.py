@@ -0,0 +1,79 @@
+"""
+Session start-up cost with and without the assistant registry.
+
+Starts N sessions as separate processes, all at once, each building an
+OpenAIBot against a local stub whose assistants.create takes --latency
+seconds and is counted in a shared file:
+
+  legacy    every session creates its own assistant, as __init__ used to
+  registry  sessions share one assistant through assistant_registry
+
+A second registry round, with the registry already populated, shows the
+steady-state cost of a new session.
+
+    python benchmark_assistant_registry.py --sessions 50 --latency 0.3
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from types import SimpleNamespace
+from typing import List, Tuple
+
+import assistant_registry
+from model import OpenAIBot
+
+class StubAssistantsAPI:
+    def __init__(self, created_log: str, latency: float) -> None:
+        self.created_log = created_log
+        self.latency = latency
+        self.api_key, self.organization, self.project = "sk-stub", None, None
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(create=self._create_assistant),
+            threads=SimpleNamespace(create=lambda: SimpleNamespace(id="thread_bench"))
+        )
+
+    def _create_assistant(self, **kwargs):
+        time.sleep(self.latency)
+        with open(self.created_log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        return SimpleNamespace(id=f"asst_{os.getpid()}")
+
+def session(args: Tuple[str, str, float, bool]) -> Tuple[float, str]:
+    workdir, created_log, latency, legacy = args
+    assistant_registry.ASSISTANT_REGISTRY_PATH = os.path.join(workdir, "assistant_registry.json")
+    api = StubAssistantsAPI(created_log, latency)
+    start = time.perf_counter()
+    if legacy:
+        assistant_id = api.beta.assistants.create(name="Math Tutor").id
+    else:
+        assistant_id = OpenAIBot(name="Math Tutor", instructions="You are a math tutor.", client=api).assistant_id
+    return time.perf_counter() - start, assistant_id
+
+def run(label: str, pool, workdir: str, sessions: int, latency: float, legacy: bool) -> None:
+    created_log = os.path.join(workdir, f"{label}.created")
+    open(created_log, "w").close()
+    results = pool.map(session, [(workdir, created_log, latency, legacy)] * sessions)
+    with open(created_log) as f:
+        created = len(f.readlines())
+    timings: List[float] = sorted(t for t, _ in results)
+    ids = {assistant_id for _, assistant_id in results}
+    print(f"{label:>17}: {created:3d} assistants created, {len(ids):3d} distinct ids, "
+          f"start-up p50 {timings[len(timings) // 2] * 1000:7.1f} ms  max {timings[-1] * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds assistants.create takes")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="assistant_registry_bench_")
+    try:
+        with multiprocessing.Pool(args.sessions) as pool:
+            run("legacy", pool, workdir, args.sessions, args.latency, legacy=True)
+            run("registry (cold)", pool, workdir, args.sessions, args.latency, legacy=False)
+            run("registry (warm)", pool, workdir, args.sessions, args.latency, legacy=False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
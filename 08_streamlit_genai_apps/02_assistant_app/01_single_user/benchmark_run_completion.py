@@ -0,0 +1,124 @@
+"""
+Per-turn latency of waiting for an assistant run to finish.
+
+A local stub stands in for the Assistants API; each run completes (or,
+with --fail-rate, fails) at a random time between --min and --max seconds.
+The same turns are timed three ways:
+
+  sleep1    the old isCompleted: sleep 1 s, retrieve, until "completed"
+  backoff   OpenAIBot polling with exponential backoff (no event stream)
+  stream    OpenAIBot following the run's event stream
+
+The report is the delay between the run finishing and the bot noticing,
+plus how many retrieve calls each turn cost.
+
+    python benchmark_run_completion.py --turns 20 --min 0.5 --max 4
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+from types import SimpleNamespace
+from typing import List
+
+import assistant_registry
+from model import OpenAIBot
+
+class StubRunsAPI:
+    def __init__(self, rng: random.Random, low: float, high: float, fail_rate: float, streaming: bool) -> None:
+        self.rng = rng
+        self.low, self.high = low, high
+        self.fail_rate = fail_rate
+        self.streaming = streaming
+        self.retrieves = 0
+        self.finished_at = 0.0
+        self._outcome = "completed"
+        self.api_key, self.organization, self.project = "sk-stub", None, None
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(id="asst_bench")),
+            threads=SimpleNamespace(
+                create=lambda: SimpleNamespace(id="thread_bench"),
+                messages=SimpleNamespace(create=lambda **kwargs: None, list=self._list_messages),
+                runs=SimpleNamespace(create=self._create_run, retrieve=self._retrieve_run, list=self._list_runs)
+            )
+        )
+
+    def _run(self) -> SimpleNamespace:
+        done = time.monotonic() >= self.finished_at
+        return SimpleNamespace(id="run_bench", status=self._outcome if done else "in_progress")
+
+    def _message(self) -> SimpleNamespace:
+        text = SimpleNamespace(text=SimpleNamespace(value="42"))
+        return SimpleNamespace(role="assistant", content=[text])
+
+    def _create_run(self, stream: bool = False, **kwargs):
+        if stream and not self.streaming:
+            # Before drawing, so every mode times the same sequence of runs
+            raise TypeError("stream is not supported")
+        self.finished_at = time.monotonic() + self.rng.uniform(self.low, self.high)
+        self._outcome = "failed" if self.rng.random() < self.fail_rate else "completed"
+        if not stream:
+            return self._run()
+        return self._events()
+
+    def _events(self):
+        yield SimpleNamespace(event="thread.run.created", data=self._run())
+        time.sleep(max(0.0, self.finished_at - time.monotonic()))
+        if self._outcome == "completed":
+            yield SimpleNamespace(event="thread.message.completed", data=self._message())
+        yield SimpleNamespace(event=f"thread.run.{self._outcome}", data=self._run())
+
+    def _retrieve_run(self, **kwargs):
+        self.retrieves += 1
+        return self._run()
+
+    def _list_runs(self, **kwargs):
+        return SimpleNamespace(data=[self._run()] if self.finished_at else [])
+
+    def _list_messages(self, **kwargs):
+        return SimpleNamespace(data=[self._message()])
+
+def sleep1_turn(bot: OpenAIBot) -> None:
+    """The old isCompleted loop, kept here for comparison."""
+    run = bot.client.beta.threads.runs.create(
+        thread_id=bot.thread.id, assistant_id=bot.assistant_id, instructions=bot.instructions
+    )
+    while run.status != "completed":
+        time.sleep(1)
+        run = bot.client.beta.threads.runs.retrieve(thread_id=bot.thread.id, run_id=run.id)
+
+def bench(label: str, args, streaming: bool) -> None:
+    api = StubRunsAPI(random.Random(args.seed), args.min, args.max, args.fail_rate, streaming)
+    bot = OpenAIBot(name="bench", instructions="Answer briefly.", client=api)
+    lags: List[float] = []
+    outcomes = {"completed": 0, "other": 0}
+    for _ in range(args.turns):
+        if label == "sleep1":
+            sleep1_turn(bot)
+            completed = True
+        else:
+            bot.send_message("What is 6 x 7?")
+            completed = bot.isCompleted()
+            if completed:
+                bot.get_lastest_response()
+        lags.append(time.monotonic() - api.finished_at)
+        outcomes["completed" if completed else "other"] += 1
+    lags.sort()
+    print(f"{label:>8}: lag avg {sum(lags) / len(lags) * 1000:7.1f} ms  p90 {lags[int(0.9 * (len(lags) - 1))] * 1000:7.1f} ms  "
+          f"{api.retrieves / args.turns:5.1f} retrieves/turn  {outcomes}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--min", type=float, default=0.5, help="fastest run, seconds")
+    parser.add_argument("--max", type=float, default=4.0, help="slowest run, seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of runs that fail (sleep1 would hang on them)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    assistant_registry.ASSISTANT_REGISTRY_PATH = os.path.join(tempfile.mkdtemp(), "assistant_registry.json")
+    if args.fail_rate == 0:
+        bench("sleep1", args, streaming=False)
+    bench("backoff", args, streaming=False)
+    bench("stream", args, streaming=True)
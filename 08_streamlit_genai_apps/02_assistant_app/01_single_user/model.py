@@ -1,12 +1,25 @@
-from openai import OpenAI
-from openai.types.beta import Assistant
+from openai import OpenAI, NotFoundError
 from openai.types.beta.thread import Thread
 from openai.types.beta.threads import Message
 from openai.types.beta.threads.run import Run
 import json
+import os
 from dotenv import load_dotenv, find_dotenv
 import time
-from typing import Any
+from typing import Any, Optional
+import assistant_registry
+
+# Give up on a run that hasn't finished after this many seconds
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", 120))
+# Fallback polling: first delay, growth factor and cap, in seconds. The gap
+# grows to the old fixed 1s interval and no further: short runs are noticed
+# sooner, long ones on average as soon, though any one check may land a
+# little later than a 1s tick would have.
+POLL_INITIAL = 0.1
+POLL_FACTOR = 1.5
+POLL_MAX = 1.0
+# Statuses after which a run will not change any more
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled", "incomplete", "requires_action"}
 
 class MessageItem:
     def __init__(self, role: str, content: str | Any):
@@ -14,21 +27,66 @@ class MessageItem:
         self.content: str | Any = content   
 
 class OpenAIBot:
-    def __init__(self, name:str, instructions:str, model:str = "gpt-3.5-turbo-1106")->None:
+    def __init__(self, name:str, instructions:str, model:str = "gpt-3.5-turbo-1106", client: OpenAI = None)->None:
         self.name: str = name
         self.instructions: str = instructions
         self.model: str = model
         load_dotenv(find_dotenv()) 
-        self.client : OpenAI = OpenAI()
-        self.assistant: Assistant = self.client.beta.assistants.create(
+        self.client : OpenAI = client or OpenAI()
+        self.tools: list[dict] = [{"type": "code_interpreter"}]
+        account = assistant_registry.account_id(self.client.api_key, self.client.organization, self.client.project)
+        self.assistant_key: str = assistant_registry.config_key(self.name, self.instructions, self.model, self.tools, account)
+        # Reused across sessions; checked by the first run that uses it
+        self.assistant_id: str = assistant_registry.get_or_create(self.assistant_key, self._create_assistant)
+        self._assistant_checked: bool = False
+        self.thread: Thread  = self.client.beta.threads.create()
+        self.messages: list[MessageItem] = []
+        # Event stream of the latest run, or None when it is polled instead
+        self._run_events = None
+        self._completed_message: Optional[Message] = None
+        self.latest_run: Optional[Run] = None
+        self._previous_run_id: Optional[str] = None
+
+
+    def _create_assistant(self) -> str:
+        return self.client.beta.assistants.create(
             name=self.name,
             instructions= self.instructions,
-            tools=[{"type": "code_interpreter"}],
+            tools=self.tools,
             model=self.model
-        )
-        self.thread: Thread  = self.client.beta.threads.create()
-        self.messages: list[MessageItem] = []
-        
+        ).id
+
+    def _create_run(self, **kwargs):
+        try:
+            run = self.client.beta.threads.runs.create(
+                thread_id=self.thread.id,
+                assistant_id=self.assistant_id,
+                instructions=self.instructions,
+                **kwargs
+            )
+        except NotFoundError as e:
+            if self._assistant_checked or not self._assistant_missing(e):
+                # e.g. the thread is gone; a new assistant wouldn't help
+                raise
+            # The registered assistant was deleted; register a new one
+            print(f"⚠️ Assistant {self.assistant_id} no longer exists, creating a new one")
+            assistant_registry.forget(self.assistant_key, self.assistant_id)
+            self.assistant_id = assistant_registry.get_or_create(self.assistant_key, self._create_assistant)
+            run = self.client.beta.threads.runs.create(
+                thread_id=self.thread.id,
+                assistant_id=self.assistant_id,
+                instructions=self.instructions,
+                **kwargs
+            )
+        self._assistant_checked = True
+        return run
+
+    def _assistant_missing(self, error: NotFoundError) -> bool:
+        """True if the 404 is about our assistant rather than the thread."""
+        body = error.body if isinstance(error.body, dict) else {}
+        if body.get("param"):
+            return body["param"] == "assistant_id"
+        return self.assistant_id in str(body.get("message") or error)
 
     def get_name(self):
         return self.name
@@ -46,30 +104,105 @@ class OpenAIBot:
             content=message
         )
 
-        self.latest_run: Run = self.client.beta.threads.runs.create(
-            thread_id=self.thread.id,
-            assistant_id=self.assistant.id,
-            instructions=self.instructions
-        )
+        self._completed_message = None
+        # The run before this turn's; a stream that fails early must not
+        # fall back to it
+        self._previous_run_id = self.latest_run.id if self.latest_run is not None else None
+        self.latest_run = None
+        try:
+            # Server-sent run events tell us the moment the run finishes.
+            # The timeout bounds each read, so a stalled stream can't wait
+            # past RUN_DEADLINE for its next event.
+            self._run_events = self._create_run(stream=True, timeout=RUN_DEADLINE)
+        except NotFoundError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Run streaming unavailable, polling instead: {e}")
+            self._run_events = None
+            # The request may have failed after the run was created
+            self.latest_run: Run = self._find_latest_run() or self._create_run()
 
         # print("message sent on thread id: ", self.thread.id)
 
         self.addMessage(MessageItem(role="user", content=message))
 
     def isCompleted(self)->bool:
-        print("Status: ", self.latest_run.status)
-        while self.latest_run.status != "completed":
-            print("Going to sleep")
-            time.sleep(1)
+        """Wait for the latest run to end; True only if it completed.
+
+        Follows the run's event stream, or polls with exponential backoff
+        if there is none. Either way it stops on any terminal status or
+        after RUN_DEADLINE seconds.
+        """
+        deadline = time.monotonic() + RUN_DEADLINE
+        if self._run_events is not None:
+            try:
+                self._follow_run_events(deadline)
+            except Exception as e:
+                print(f"⚠️ Run event stream failed, polling instead: {e}")
+            finally:
+                self._close_run_events()
+            if self.latest_run is None:
+                # The stream broke before thread.run.created; find the run
+                self.latest_run = self._find_latest_run()
+        if self.latest_run is not None and self.latest_run.status not in TERMINAL_STATUSES:
+            self._poll_run(deadline)
+        status = self.latest_run.status if self.latest_run is not None else "unknown"
+        if status != "completed":
+            print(f"❌ Run ended with status: {status}")
+        return status == "completed"
+
+    def _follow_run_events(self, deadline: float):
+        for event in self._run_events:
+            if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step"):
+                self.latest_run = event.data
+            elif event.event == "thread.message.completed":
+                self._completed_message = event.data
+            if self.latest_run is not None and self.latest_run.status in TERMINAL_STATUSES:
+                return
+            if time.monotonic() > deadline:
+                # Stop reading; _poll_run reports the deadline
+                return
+
+    def _close_run_events(self):
+        """Release the event stream's connection, even if it was left unread."""
+        try:
+            self._run_events.close()
+        except Exception as e:
+            print(f"⚠️ Closing run event stream failed: {e}")
+        finally:
+            self._run_events = None
+
+    def _find_latest_run(self) -> Optional[Run]:
+        """This turn's run, if the server created one; None otherwise."""
+        try:
+            runs = self.client.beta.threads.runs.list(thread_id=self.thread.id, limit=1)
+        except Exception as e:
+            print(f"⚠️ Listing runs failed: {e}")
+            return None
+        if not runs.data or runs.data[0].id == self._previous_run_id:
+            return None
+        return runs.data[0]
+
+    def _poll_run(self, deadline: float):
+        delay = POLL_INITIAL
+        while self.latest_run.status not in TERMINAL_STATUSES:
+            if time.monotonic() + delay > deadline:
+                print(f"❌ Run {self.latest_run.id} still {self.latest_run.status} after {RUN_DEADLINE:.0f}s")
+                return
+            time.sleep(delay)
+            delay = min(delay * POLL_FACTOR, POLL_MAX)
             self.latest_run : Run = self.client.beta.threads.runs.retrieve(
                 thread_id=self.thread.id,
                 run_id=self.latest_run.id
             )
-            print("Latest Status: ", self.latest_run.status)
-            # print("Latest Run: ", self.latest_run)
-        return True
     
     def get_lastest_response(self)-> MessageItem:
+        if self._completed_message is not None:
+            # Already delivered by the run's event stream
+            message = self._completed_message
+            m = MessageItem(message.role, message.content[0].text.value)
+            self.addMessage(m)
+            return m
         messages = self.client.beta.threads.messages.list(
             thread_id=self.thread.id
         )
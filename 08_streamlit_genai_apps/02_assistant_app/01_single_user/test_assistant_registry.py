@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import NotFoundError
+
+import assistant_registry
+from model import OpenAIBot
+
+KEY = assistant_registry.config_key("Math Tutor", "You are a math tutor.", "gpt-4o", [], "org/proj/abc")
+
+
+def start_session(args):
+    """One app process starting up: look up the tutor, creating it if needed."""
+    registry_path, created_log = args
+    assistant_registry.ASSISTANT_REGISTRY_PATH = registry_path
+
+    def create():
+        time.sleep(0.2)
+        with open(created_log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        return f"asst_{os.getpid()}"
+    return assistant_registry.get_or_create(KEY, create)
+
+
+def test_processes_starting_together_create_one_assistant(tmp_path):
+    created_log = tmp_path / "created.log"
+    created_log.touch()
+    args = (str(tmp_path / "assistant_registry.json"), str(created_log))
+
+    with multiprocessing.get_context("fork").Pool(8) as pool:
+        ids = pool.map(start_session, [args] * 16)
+
+    assert len(created_log.read_text().splitlines()) == 1
+    assert len(set(ids)) == 1
+
+
+def test_default_path_is_next_to_the_module():
+    assert os.path.dirname(assistant_registry.ASSISTANT_REGISTRY_PATH) == os.path.dirname(assistant_registry.__file__)
+
+
+def test_key_depends_on_the_account_but_holds_no_secret():
+    alice = assistant_registry.account_id("sk-alice-secret", "org-1")
+    bob = assistant_registry.account_id("sk-bob-secret", "org-1")
+
+    assert alice != bob
+    assert "secret" not in alice
+    args = ("Math Tutor", "You are a math tutor.", "gpt-4o", [])
+    assert assistant_registry.config_key(*args, alice) != assistant_registry.config_key(*args, bob)
+
+
+def not_found(message: str, param: str = None) -> NotFoundError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/threads/thread_test/runs")
+    body = {"message": message, "type": "invalid_request_error", "param": param, "code": None}
+    return NotFoundError(message, response=httpx.Response(404, request=request), body=body)
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.setattr(assistant_registry, "ASSISTANT_REGISTRY_PATH", str(tmp_path / "assistant_registry.json"))
+    monkeypatch.setattr(assistant_registry, "_ids", {})
+    created = iter(["asst_1", "asst_2"])
+    client = SimpleNamespace(
+        api_key="sk-test", organization=None, project=None,
+        beta=SimpleNamespace(
+            assistants=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(id=next(created))),
+            threads=SimpleNamespace(create=lambda: SimpleNamespace(id="thread_test"), runs=SimpleNamespace())
+        )
+    )
+    return OpenAIBot(name="test", instructions="Be brief.", client=client)
+
+
+def test_deleted_assistant_is_replaced(bot):
+    def create(assistant_id, **kwargs):
+        if assistant_id == "asst_1":
+            raise not_found("No assistant found with id 'asst_1'.")
+        return SimpleNamespace(id="run_1", status="queued")
+    bot.client.beta.threads.runs.create = create
+
+    assert bot._create_run().id == "run_1"
+    assert bot.assistant_id == "asst_2"
+
+
+def test_missing_thread_keeps_the_assistant(bot):
+    def create(assistant_id, **kwargs):
+        raise not_found("No thread found with id 'thread_test'.")
+    bot.client.beta.threads.runs.create = create
+
+    with pytest.raises(NotFoundError):
+        bot._create_run()
+
+    assert bot.assistant_id == "asst_1"
+    assert assistant_registry._read()[bot.assistant_key]["id"] == "asst_1"
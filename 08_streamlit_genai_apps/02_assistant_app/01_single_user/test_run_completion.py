@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+
+import assistant_registry
+import model
+from model import OpenAIBot
+
+
+def run(run_id: str, status: str) -> SimpleNamespace:
+    return SimpleNamespace(id=run_id, status=status)
+
+
+class EventStream:
+    """Run event stream that remembers whether it was closed."""
+
+    def __init__(self, events, error: Exception = None):
+        self.events = events
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        yield from self.events
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRunsAPI:
+    def __init__(self):
+        self.streams = []          # returned by create(stream=True), in order
+        self.runs = []             # runs on the thread, oldest first
+        self.statuses = {}         # run id -> statuses retrieve() walks through
+        self.create_kwargs = []
+        self.api_key, self.organization, self.project = "sk-stub", None, None
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(id="asst_test")),
+            threads=SimpleNamespace(
+                create=lambda: SimpleNamespace(id="thread_test"),
+                messages=SimpleNamespace(create=lambda **kwargs: None),
+                runs=SimpleNamespace(create=self._create, retrieve=self._retrieve, list=self._list),
+            )
+        )
+
+    def _create(self, stream: bool = False, **kwargs):
+        self.create_kwargs.append(dict(kwargs, stream=stream))
+        if stream:
+            return self.streams.pop(0)
+        new = run(f"run_{len(self.runs)}", "queued")
+        self.runs.append(new)
+        return new
+
+    def _retrieve(self, thread_id: str, run_id: str):
+        statuses = self.statuses[run_id]
+        return run(run_id, statuses.pop(0) if len(statuses) > 1 else statuses[0])
+
+    def _list(self, thread_id: str, limit: int = 20):
+        return SimpleNamespace(data=self.runs[::-1][:limit])
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(assistant_registry, "ASSISTANT_REGISTRY_PATH", str(tmp_path / "assistant_registry.json"))
+    monkeypatch.setattr(assistant_registry, "_ids", {})
+    monkeypatch.setattr(model, "POLL_INITIAL", 0.001)
+    return FakeRunsAPI()
+
+
+def test_stream_is_closed_and_its_request_bounded(api):
+    done = run("run_0", "completed")
+    stream = EventStream([
+        SimpleNamespace(event="thread.run.created", data=run("run_0", "queued")),
+        SimpleNamespace(event="thread.run.completed", data=done),
+        SimpleNamespace(event="thread.run.step.delta", data=None),
+    ])
+    api.streams.append(stream)
+    bot = OpenAIBot(name="test", instructions="Be brief.", client=api)
+
+    bot.send_message("2 + 2?")
+    assert bot.isCompleted()
+
+    # Left with an event unread, but the connection is released anyway
+    assert stream.closed
+    assert api.create_kwargs[0]["timeout"] == model.RUN_DEADLINE
+
+
+def test_stream_broken_before_run_created_polls_the_listed_run(api):
+    api.runs.append(run("run_0", "queued"))
+    api.statuses["run_0"] = ["in_progress", "completed"]
+    stream = EventStream([], error=ConnectionError("stream reset"))
+    api.streams.append(stream)
+    bot = OpenAIBot(name="test", instructions="Be brief.", client=api)
+
+    bot.send_message("2 + 2?")
+    assert bot.isCompleted()
+    assert bot.latest_run.id == "run_0"
+    assert stream.closed
+
+
+def test_previous_turns_run_is_not_mistaken_for_this_one(api):
+    bot = OpenAIBot(name="test", instructions="Be brief.", client=api)
+    api.runs.append(run("run_0", "completed"))
+    api.streams.append(EventStream([SimpleNamespace(event="thread.run.completed", data=api.runs[0])]))
+    bot.send_message("2 + 2?")
+    assert bot.isCompleted()
+
+    # The next stream dies before the server created a run
+    api.streams.append(EventStream([], error=ConnectionError("stream reset")))
+    bot.send_message("3 + 3?")
+
+    assert not bot.isCompleted()
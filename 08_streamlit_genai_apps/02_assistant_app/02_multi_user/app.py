@@ -1,53 +1,61 @@
 # app.py
+import os
+import sys
+# chat_common (helpers shared by the chat apps) lives two folders up
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 import streamlit as st
-from model import SharedAssistant, OpenAIBot, MessageItem
+from model import SharedAssistant, OpenAIBot, MessageItem, owns_thread, api_key_hash
+from circuit_breaker import breaker_status
+from chat_common.stream_renderer import StreamRenderer
+from chat_common.turn_metrics import TurnMetrics, summarize
+import chat_registry
+from message_prefetcher import MessagePrefetcher, neighbours
 import uuid
 import time
-import json
-import os
 
 # -------------------------------
 # File Paths
 # -------------------------------
+# Old single file shared by all users; imported into the registry once
 CHAT_DATA_FILE = "chat_data.json"
 
 # -------------------------------
 # Load & Save Chat Metadata
 # -------------------------------
+def registry_user(api_key):
+    """Registry shard for a key. Threads belong to the key that made them."""
+    return api_key_hash(api_key)[:32]
+
 def load_chat_data(api_key):
-    if not os.path.exists(CHAT_DATA_FILE):
-        return {}
     try:
-        with open(CHAT_DATA_FILE, "r") as f:
-            raw = json.load(f)
-        chats = {}
-        for chat_id, data in raw.items():
-            thread_id = data.get("thread_id")
-            bot = OpenAIBot(
-                name=data["name"],
-                api_key=api_key,
-                thread_id=thread_id
-            ) if thread_id else None
-            chats[chat_id] = {
+        user = registry_user(api_key)
+        try:
+            chat_registry.import_legacy(user, CHAT_DATA_FILE, lambda thread_id: owns_thread(api_key, thread_id))
+        except Exception as e:
+            # Not marked done, so it is retried on the next load
+            print(f"⚠️ Importing legacy chats failed: {e}")
+        # Bots are built on first use by get_bot; only one chat is shown
+        return {
+            chat_id: {
                 "name": data["name"],
-                "thread_id": thread_id,
-                "bot": bot
+                "thread_id": data["thread_id"],
+                "bot": None
             }
-        return chats
+            for chat_id, data in chat_registry.load_chats(user).items()
+        }
     except Exception as e:
         st.error(f"Error loading chat  {e}")
         return {}
 
-def save_chat_data(chats):
-    data = {
-        cid: {
-            "name": c["name"],
-            "thread_id": c["thread_id"]
-        }
-        for cid, c in chats.items() if c.get("thread_id")
-    }
-    with open(CHAT_DATA_FILE, "w") as f:
-        json.dump(data, f)
+def get_bot(chat):
+    """The chat's OpenAIBot, created on first access (shares the key's client)."""
+    if chat.get("bot") is None and chat.get("thread_id"):
+        chat["bot"] = OpenAIBot(
+            name=chat["name"],
+            api_key=st.session_state.api_key,
+            thread_id=chat["thread_id"]
+        )
+    return chat.get("bot")
 
 # -------------------------------
 # Page Config
@@ -69,6 +77,10 @@ if "chats" not in st.session_state:
     st.session_state.chats = {}
 if "current_chat_id" not in st.session_state:
     st.session_state.current_chat_id = None
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = MessagePrefetcher()
+if "recent_chats" not in st.session_state:
+    st.session_state.recent_chats = []
 
 def new_chat():
     """Create a new chat. Auto-recreates assistant if missing."""
@@ -102,7 +114,7 @@ def new_chat():
         "bot": bot
     }
     st.session_state.current_chat_id = chat_id
-    save_chat_data(st.session_state.chats)
+    chat_registry.put_chat(registry_user(st.session_state.api_key), chat_id, bot.name, bot.thread_id)
     st.rerun()
 
 # -------------------------------
@@ -161,6 +173,17 @@ if not st.session_state.assistant_initialized or not SharedAssistant.is_assistan
 # Show status
 if st.session_state.assistant_initialized:
     st.sidebar.success("✅ Tutor Ready")
+    validity = SharedAssistant.get_validity_status()
+    if validity["last_check"]:
+        st.sidebar.caption(
+            f"Assistant checked {time.time() - validity['last_check']:.0f}s ago · "
+            f"{validity['checks']} checks, {validity['errors']} errors"
+        )
+    for endpoint, breaker in breaker_status(api_key_hash(st.session_state.api_key)).items():
+        if breaker["state"] == "open":
+            st.sidebar.error(f"⛔ {endpoint} failing; new prompts fail fast for {breaker['retry_in']:.0f}s")
+        elif breaker["state"] == "half_open":
+            st.sidebar.warning(f"🩺 {endpoint} recovering; probing the API")
 else:
     st.sidebar.warning("⚙️ Initializing...")
 
@@ -202,13 +225,13 @@ if st.session_state.assistant_initialized:
         if len(st.session_state.chats) > 1:
             if st.button("❌ Delete"):
                 chat = st.session_state.chats[st.session_state.current_chat_id]
-                if chat.get("bot"):
+                if get_bot(chat):
                     chat["bot"].delete_thread()
+                chat_registry.delete_chat(registry_user(st.session_state.api_key), st.session_state.current_chat_id)
                 del st.session_state.chats[st.session_state.current_chat_id]
                 if st.session_state.current_chat_id == selected:
                     remaining = list(st.session_state.chats.keys())
                     st.session_state.current_chat_id = remaining[0] if remaining else None
-                save_chat_data(st.session_state.chats)
                 st.rerun()
 
     current = st.session_state.chats[st.session_state.current_chat_id]
@@ -216,7 +239,7 @@ if st.session_state.assistant_initialized:
     if st.sidebar.button("✅ Save"):
         current["name"] = rename
         st.session_state.chats[st.session_state.current_chat_id]["name"] = rename
-        save_chat_data(st.session_state.chats)
+        chat_registry.rename_chat(registry_user(st.session_state.api_key), st.session_state.current_chat_id, rename)
         st.rerun()
 
 # -------------------------------
@@ -229,15 +252,38 @@ if st.session_state.current_chat_id not in st.session_state.chats:
     new_chat()
     st.rerun()
 
-bot = st.session_state.chats[st.session_state.current_chat_id]["bot"]
+bot = get_bot(st.session_state.chats[st.session_state.current_chat_id])
+prefetcher = st.session_state.prefetcher
 
-with st.spinner("📥 Loading chat history..."):
-    try:
-        messages = bot.getMessages()
-    except Exception as e:
-        st.error("Failed to load messages.")
-        messages = []
-        print(f"Error: {e}")
+recent = st.session_state.recent_chats
+if not recent or recent[-1] != st.session_state.current_chat_id:
+    if st.session_state.current_chat_id in recent:
+        recent.remove(st.session_state.current_chat_id)
+    recent.append(st.session_state.current_chat_id)
+    del recent[:-8]
+
+load_start = time.perf_counter()
+# Usually already fetched in the background after an earlier render
+messages = prefetcher.get(bot.thread_id)
+if messages is None:
+    with st.spinner("📥 Loading chat history..."):
+        try:
+            messages = bot.getMessages()
+            prefetcher.put(bot.thread_id, messages)
+        except Exception as e:
+            st.error("Failed to load messages.")
+            messages = []
+            print(f"Error: {e}")
+load_history_s = time.perf_counter() - load_start
+
+# Warm the chats a switch most likely goes to next (and refresh this one)
+prefetch_ids = [st.session_state.current_chat_id] + neighbours(
+    list(st.session_state.chats), st.session_state.current_chat_id, recent
+)
+prefetcher.schedule(
+    get_bot(st.session_state.chats[chat_id]) for chat_id in prefetch_ids
+    if st.session_state.chats[chat_id].get("thread_id")
+)
 
 # -------------------------------
 # Display Messages with Colors
@@ -262,6 +308,9 @@ for msg in messages:
 # Handle New Input
 # -------------------------------
 if prompt := st.chat_input("Ask a math question..."):
+    metrics = TurnMetrics("assistant_multi_user")
+    metrics.add("load_history", load_history_s)
+    turn_error = None
     with st.chat_message("user"):
         st.markdown(
             f'<div style="background-color: #e6f2ff; padding: 10px; border-radius: 10px; margin-bottom: 5px;">'
@@ -271,25 +320,33 @@ if prompt := st.chat_input("Ask a math question..."):
 
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        full_response = ""
         try:
-            for chunk in bot.stream_response(prompt):
-                full_response += chunk
-                placeholder.markdown(
+            # Redraws are coalesced to a few frames per second
+            with StreamRenderer(metrics.timed(
+                "render", lambda text, done: placeholder.markdown(
                     f'<div style="background-color: #fff9e6; padding: 10px; border-radius: 10px; margin-bottom: 5px;">'
-                    f'<strong>Math Tutor:</strong> {full_response}▌</div>',
+                    f'<strong>Math Tutor:</strong> {text}{"" if done else "▌"}</div>',
                     unsafe_allow_html=True
                 )
-                time.sleep(0.02)
-            placeholder.markdown(
-                f'<div style="background-color: #fff9e6; padding: 10px; border-radius: 10px; margin-bottom: 5px;">'
-                f'<strong>Math Tutor:</strong> {full_response}</div>',
-                unsafe_allow_html=True
-            )
+            )) as renderer:
+                with metrics.stage("stream"):
+                    for chunk in bot.stream_response(prompt, metrics=metrics):
+                        renderer.write(chunk)
+            # The cached history is missing this turn now
+            prefetcher.invalidate(bot.thread_id)
         except Exception as e:
+            turn_error = e
             placeholder.markdown(
                 f'<div style="background-color: #ffe6e6; padding: 10px; border-radius: 10px;">'
                 f'<strong>Math Tutor:</strong> Sorry, I encountered an error: {str(e)}</div>',
                 unsafe_allow_html=True
             )
-            print(f"Error in chat: {e}")
\ No newline at end of file
+            print(f"Error in chat: {e}")
+
+    turn_records = st.session_state.setdefault("turn_metrics", [])
+    turn_records.append(metrics.finish(turn_error))
+    del turn_records[:-50]
+
+if st.session_state.get("turn_metrics"):
+    with st.sidebar.expander("⏱️ Turn timings"):
+        st.json(summarize(st.session_state.turn_metrics))
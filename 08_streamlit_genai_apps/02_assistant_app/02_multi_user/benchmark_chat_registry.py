@@ -0,0 +1,137 @@
+"""
+Concurrency benchmark for chat metadata persistence.
+
+Simulates N Streamlit sessions as separate processes, each creating,
+renaming and deleting chats, two sessions (tabs) per user:
+
+  legacy    every session rewrites the shared chat_data.json from its own
+            copy of the chats, as the old save_chat_data did
+  registry  chat_registry journals, one per user, under flock
+
+Afterwards every chat a session still holds must be on disk with its last
+name; the report counts lost updates and per-operation latency.
+
+    python benchmark_chat_registry.py --sessions 50 --ops 40
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from typing import Dict, List, Tuple
+
+import chat_registry
+
+def _session_ops(session: int, ops: int):
+    """Deterministic create/rename/delete script for one session."""
+    rng = random.Random(session)
+    live: Dict[str, str] = {}
+    for n in range(ops):
+        roll = rng.random()
+        if not live or roll < 0.5:
+            chat_id = f"s{session}-c{n}"
+            live[chat_id] = f"Chat {n}"
+            yield "create", chat_id, live[chat_id]
+        elif roll < 0.8:
+            chat_id = rng.choice(list(live))
+            live[chat_id] = f"Renamed {n}"
+            yield "rename", chat_id, live[chat_id]
+        else:
+            chat_id = rng.choice(list(live))
+            del live[chat_id]
+            yield "delete", chat_id, None
+
+def legacy_session(args: Tuple[str, int, int]) -> List[float]:
+    path, session, ops = args
+    try:
+        with open(path, "r") as f:
+            chats = json.load(f)
+    except (FileNotFoundError, ValueError):
+        chats = {}
+    timings = []
+    for op, chat_id, name in _session_ops(session, ops):
+        start = time.perf_counter()
+        if op == "delete":
+            chats.pop(chat_id, None)
+        else:
+            chats[chat_id] = {"name": name, "thread_id": f"thread_{chat_id}"}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(chats, f)
+        os.replace(tmp_path, path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def registry_session(args: Tuple[str, int, int]) -> List[float]:
+    registry_dir, session, ops = args
+    chat_registry.CHAT_REGISTRY_DIR = registry_dir
+    user = f"user{session // 2}"
+    timings = []
+    for op, chat_id, name in _session_ops(session, ops):
+        start = time.perf_counter()
+        if op == "create":
+            chat_registry.put_chat(user, chat_id, name, f"thread_{chat_id}")
+        elif op == "rename":
+            chat_registry.rename_chat(user, chat_id, name)
+        else:
+            chat_registry.delete_chat(user, chat_id)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def expected_state(sessions: int, ops: int) -> Dict[str, Dict[str, str]]:
+    """user -> {chat_id: final name} for chats no session deleted."""
+    expected: Dict[str, Dict[str, str]] = {}
+    for session in range(sessions):
+        live = expected.setdefault(f"user{session // 2}", {})
+        for op, chat_id, name in _session_ops(session, ops):
+            if op == "delete":
+                live.pop(chat_id, None)
+            else:
+                live[chat_id] = name
+    return expected
+
+def report(label: str, timings: List[List[float]], elapsed: float, lost: int, total: int) -> None:
+    flat = sorted(t for session in timings for t in session)
+    pick = lambda q: flat[min(len(flat) - 1, int(q * len(flat)))] * 1000
+    print(f"{label:>9}: {len(flat) / elapsed:7.0f} ops/s  p50={pick(0.5):6.2f} ms  p99={pick(0.99):6.2f} ms  "
+          f"lost {lost} of {total} chats")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=40, help="operations per session")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat_registry_bench_")
+    expected = expected_state(args.sessions, args.ops)
+    total = sum(len(chats) for chats in expected.values())
+    try:
+        with multiprocessing.Pool(args.sessions) as pool:
+            legacy_path = os.path.join(workdir, "chat_data.json")
+            start = time.perf_counter()
+            timings = pool.map(legacy_session, [(legacy_path, s, args.ops) for s in range(args.sessions)])
+            elapsed = time.perf_counter() - start
+            with open(legacy_path, "r") as f:
+                on_disk = json.load(f)
+            lost = sum(
+                1 for chats in expected.values() for chat_id, name in chats.items()
+                if on_disk.get(chat_id, {}).get("name") != name
+            )
+            report("legacy", timings, elapsed, lost, total)
+
+            registry_dir = os.path.join(workdir, "chat_registry")
+            start = time.perf_counter()
+            timings = pool.map(registry_session, [(registry_dir, s, args.ops) for s in range(args.sessions)])
+            elapsed = time.perf_counter() - start
+            chat_registry.CHAT_REGISTRY_DIR = registry_dir
+            lost = 0
+            for user, chats in expected.items():
+                on_disk = chat_registry.load_chats(user)
+                lost += sum(1 for chat_id, name in chats.items() if on_disk.get(chat_id, {}).get("name") != name)
+                assert set(on_disk) <= set(chats), f"deleted chats came back for {user}"
+            report("registry", timings, elapsed, lost, total)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,67 @@
+"""
+Session startup cost of loading saved chats: building an OpenAIBot with its
+own openai.OpenAI client for every chat (the old load_chat_data) against
+lazy records where only the displayed chat gets a bot, sharing the key's
+pooled client. Reports wall time and memory retained by the chats dict.
+
+    python benchmark_chat_startup.py --chats 200
+
+No requests are sent; clients are only constructed.
+"""
+import gc
+import time
+import argparse
+import tracemalloc
+
+import openai
+from model import OpenAIBot, get_client
+
+def eager(raw, api_key):
+    chats = {}
+    for chat_id, data in raw.items():
+        bot = OpenAIBot(name=data["name"], api_key=api_key, thread_id=data["thread_id"])
+        # Every bot used to own a client, and with it a connection pool
+        bot.client = openai.OpenAI(api_key=api_key)
+        chats[chat_id] = {"name": data["name"], "thread_id": data["thread_id"], "bot": bot}
+    return chats
+
+def lazy(raw, api_key):
+    chats = {
+        chat_id: {"name": data["name"], "thread_id": data["thread_id"], "bot": None}
+        for chat_id, data in raw.items()
+    }
+    # The app then builds a bot for the one chat it displays
+    first = next(iter(chats.values()))
+    first["bot"] = OpenAIBot(name=first["name"], api_key=api_key, thread_id=first["thread_id"])
+    return chats
+
+def measure(label, load, raw, api_key, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load(raw, api_key)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    chats = load(raw, api_key)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    times.sort()
+    print(f"{label:>6}: {times[len(times) // 2] * 1000:8.1f} ms median startup, "
+          f"{retained / 1024:8.0f} KiB retained for {len(chats)} chats")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    api_key = "sk-benchmark-not-a-real-key"
+    raw = {f"chat-{i}": {"name": f"Chat {i}", "thread_id": f"thread_{i:06d}"} for i in range(args.chats)}
+    # Warm imports and the shared client outside the timings
+    get_client(api_key)
+    openai.OpenAI(api_key=api_key)
+
+    measure("eager", eager, raw, api_key, args.repeats)
+    measure("lazy", lazy, raw, api_key, args.repeats)
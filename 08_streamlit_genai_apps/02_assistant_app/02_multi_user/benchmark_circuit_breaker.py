@@ -0,0 +1,88 @@
+"""
+Fault-injection check for the circuit breakers in OpenAIBot.stream_response.
+
+A local stub stands in for the Assistants API. It answers normally, then
+goes degraded (every call hangs for --timeout seconds and fails), then
+recovers. The same prompt sequence runs with the breakers disabled and
+enabled, reporting per-prompt latency in each phase.
+
+    python benchmark_circuit_breaker.py --timeout 1.0
+"""
+import time
+import argparse
+import contextlib
+from types import SimpleNamespace
+from typing import List
+
+import circuit_breaker
+from model import OpenAIBot, api_key_hash
+
+class FaultInjectingAPI:
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.degraded = False
+        self.calls = 0
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            messages=SimpleNamespace(create=self._create_message),
+            runs=SimpleNamespace(stream=self._stream_run)
+        ))
+
+    def with_options(self, **options):
+        return self
+
+    def _fail_if_degraded(self):
+        self.calls += 1
+        if self.degraded:
+            time.sleep(self.timeout)
+            raise TimeoutError("Request timed out.")
+
+    def _create_message(self, **kwargs):
+        self._fail_if_degraded()
+
+    @contextlib.contextmanager
+    def _stream_run(self, **kwargs):
+        self._fail_if_degraded()
+        delta = SimpleNamespace(content=[SimpleNamespace(type="text", text=SimpleNamespace(value="42"))])
+        yield [SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=delta))]
+
+def ask(bot: OpenAIBot) -> float:
+    start = time.perf_counter()
+    "".join(bot.stream_response("What is 6 x 7?"))
+    return time.perf_counter() - start
+
+def run(label: str, timeout: float, healthy: int, degraded: int, recovery_wait: float) -> None:
+    circuit_breaker._breakers.clear()
+    api = FaultInjectingAPI(timeout)
+    bot = OpenAIBot(name="bench", api_key="sk-bench", thread_id="thread_bench")
+    bot.client = api
+
+    phases = {}
+    phases["healthy"] = [ask(bot) for _ in range(healthy)]
+    api.degraded = True
+    phases["degraded"] = [ask(bot) for _ in range(degraded)]
+    api.degraded = False
+    time.sleep(recovery_wait)
+    phases["recovered"] = [ask(bot) for _ in range(healthy)]
+
+    def fmt(samples: List[float]) -> str:
+        return f"avg {sum(samples) / len(samples) * 1000:7.1f} ms, max {max(samples) * 1000:7.1f} ms"
+    print(f"{label}: {api.calls} API calls")
+    for phase, samples in phases.items():
+        print(f"  {phase:>9}: {fmt(samples)}")
+    for endpoint, status in circuit_breaker.breaker_status(api_key_hash(bot.api_key)).items():
+        print(f"  {endpoint}: state={status['state']} trips={status['trips']} "
+              f"rejected={status['rejected']} failures={status['failures']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=1.0, help="seconds a degraded call hangs")
+    parser.add_argument("--healthy", type=int, default=5)
+    parser.add_argument("--degraded", type=int, default=20)
+    args = parser.parse_args()
+
+    circuit_breaker.BREAKER_OPEN_SECONDS = 2 * args.timeout
+    min_calls = circuit_breaker.BREAKER_MIN_CALLS
+    circuit_breaker.BREAKER_MIN_CALLS = 10 ** 9
+    run("breakers disabled", args.timeout, args.healthy, args.degraded, 0)
+    circuit_breaker.BREAKER_MIN_CALLS = min_calls
+    run("breakers enabled", args.timeout, args.healthy, args.degraded, 2 * args.timeout)
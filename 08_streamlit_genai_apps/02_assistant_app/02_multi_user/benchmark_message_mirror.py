@@ -0,0 +1,98 @@
+"""
+Compare reloading a whole thread on every rerun against the incremental
+message mirror in OpenAIBot.getMessages, using a fake Assistants endpoint
+with a fixed per-request latency plus a small per-message cost.
+
+    python benchmark_message_mirror.py --messages 400 --reruns 60
+"""
+import time
+import argparse
+from types import SimpleNamespace
+from typing import List
+
+from model import OpenAIBot, MessageItem, MESSAGE_PAGE_SIZE
+
+class FakeMessages:
+    """threads.messages with the list() cursor semantics the mirror relies on."""
+
+    def __init__(self, latency: float, per_message: float) -> None:
+        self.threads = {}
+        self.latency = latency
+        self.per_message = per_message
+        self.calls = 0
+
+    def add(self, thread_id: str, role: str, text: str, status: str = "completed"):
+        thread = self.threads.setdefault(thread_id, [])
+        msg = SimpleNamespace(
+            id=f"msg_{len(thread):06d}", role=role, status=status,
+            content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))]
+        )
+        thread.append(msg)
+        return msg
+
+    def list(self, thread_id: str, order: str = "desc", after: str = None, limit: int = 20):
+        self.calls += 1
+        data = self.threads.get(thread_id, [])
+        if order == "desc":
+            data = data[::-1]
+        if after is not None:
+            ids = [m.id for m in data]
+            data = data[ids.index(after) + 1:]
+        page = data[:limit]
+        time.sleep(self.latency + self.per_message * len(page))
+        return SimpleNamespace(data=page, has_more=len(data) > limit)
+
+def legacy_get_messages(client, thread_id: str) -> List[MessageItem]:
+    """The old behaviour: list the whole thread and rebuild every item."""
+    newest_first, after = [], None
+    while True:
+        params = {"thread_id": thread_id, "limit": MESSAGE_PAGE_SIZE}
+        if after:
+            params["after"] = after
+        response = client.beta.threads.messages.list(**params)
+        newest_first.extend(response.data)
+        if not response.has_more:
+            break
+        after = response.data[-1].id
+    return [
+        MessageItem(role=msg.role, content=content_block.text.value)
+        for msg in reversed(newest_first)
+        for content_block in msg.content
+        if content_block.type == "text"
+    ]
+
+def run(label: str, get_messages, api: FakeMessages, thread_id: str, reruns: int, turn_every: int) -> None:
+    api.calls = 0
+    start = time.perf_counter()
+    worst = 0.0
+    for i in range(reruns):
+        if i and i % turn_every == 0:
+            api.add(thread_id, "user", f"question {i}")
+            api.add(thread_id, "assistant", f"answer {i} " * 40)
+        t = time.perf_counter()
+        messages = get_messages()
+        worst = max(worst, time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    assert [m.content for m in messages] == [m.content[0].text.value for m in api.threads[thread_id]]
+    print(f"{label:>12}: {api.calls:5d} list calls, {elapsed / reruns * 1000:7.1f} ms/rerun avg, "
+          f"{worst * 1000:7.1f} ms worst")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=400, help="messages already in the thread")
+    parser.add_argument("--reruns", type=int, default=60)
+    parser.add_argument("--turn-every", type=int, default=5, help="reruns between new turns")
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per list request")
+    parser.add_argument("--per-message", type=float, default=0.0002, help="seconds per returned message")
+    args = parser.parse_args()
+
+    for label, incremental in (("full reload", False), ("mirror", True)):
+        api = FakeMessages(args.latency, args.per_message)
+        client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(messages=api)))
+        thread_id = f"thread_{label.replace(' ', '_')}"
+        for i in range(args.messages):
+            api.add(thread_id, "user" if i % 2 == 0 else "assistant", f"message {i}")
+        bot = OpenAIBot(name="bench", api_key="sk-bench", thread_id=thread_id)
+        bot.client = client
+        get_messages = bot.getMessages if incremental else (lambda: legacy_get_messages(client, thread_id))
+        run(label, get_messages, api, thread_id, args.reruns, args.turn_every)
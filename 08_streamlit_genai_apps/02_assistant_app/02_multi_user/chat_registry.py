@@ -0,0 +1,184 @@
+"""
+Per-user chat registry (chat id -> name and thread id).
+
+Each user has an append-only journal, CHAT_REGISTRY_DIR/<user>.jsonl, with
+one JSON record per line:
+
+    {"op": "put", "id": ..., "name": ..., "thread_id": ...}
+    {"op": "rename", "id": ..., "name": ...}
+    {"op": "del", "id": ...}
+
+Create, rename and delete append a single record, so their cost does not
+depend on how many chats (or users) exist. Loading replays the journal, and
+once it passes REGISTRY_COMPACT_BYTES it is rewritten with only the live
+chats and atomically replaced. All access to a user's journal holds an
+exclusive flock on <user>.lock, so sessions in other processes are safe too.
+"""
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+CHAT_REGISTRY_DIR = os.getenv("CHAT_REGISTRY_DIR", "chat_registry")
+REGISTRY_COMPACT_BYTES = int(os.getenv("REGISTRY_COMPACT_BYTES", 64 * 1024))
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _journal_path(user_id: str) -> str:
+    return os.path.join(CHAT_REGISTRY_DIR, f"{user_id}.jsonl")
+
+
+@contextmanager
+def _locked(user_id: str):
+    os.makedirs(CHAT_REGISTRY_DIR, exist_ok=True)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(user_id, threading.Lock())
+    with thread_lock:
+        with open(os.path.join(CHAT_REGISTRY_DIR, f"{user_id}.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _replay(path: str) -> Dict[str, Dict]:
+    chats: Dict[str, Dict] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write cut short by a crash; later records are intact
+                    continue
+                if record["op"] == "put":
+                    chats[record["id"]] = {"name": record["name"], "thread_id": record["thread_id"]}
+                elif record["op"] == "rename":
+                    if record["id"] in chats:
+                        chats[record["id"]]["name"] = record["name"]
+                elif record["op"] == "del":
+                    chats.pop(record["id"], None)
+    except FileNotFoundError:
+        pass
+    return chats
+
+
+def _append(user_id: str, record: Dict) -> None:
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    with open(_journal_path(user_id), "a+b") as f:
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Don't glue this record onto a line a crash cut short
+                line = b"\n" + line
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_snapshot(user_id: str, chats: Dict[str, Dict]) -> None:
+    """Replace the journal with one put per live chat (lock held)."""
+    path = _journal_path(user_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for chat_id, chat in chats.items():
+            f.write(json.dumps({"op": "put", "id": chat_id, **chat}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_chats(user_id: str) -> Dict[str, Dict]:
+    """{chat_id: {"name", "thread_id"}} in creation order."""
+    with _locked(user_id):
+        path = _journal_path(user_id)
+        chats = _replay(path)
+        if os.path.exists(path) and os.path.getsize(path) > REGISTRY_COMPACT_BYTES:
+            _write_snapshot(user_id, chats)
+        return chats
+
+
+def put_chat(user_id: str, chat_id: str, name: str, thread_id: str) -> None:
+    with _locked(user_id):
+        _append(user_id, {"op": "put", "id": chat_id, "name": name, "thread_id": thread_id})
+
+
+def rename_chat(user_id: str, chat_id: str, name: str) -> None:
+    with _locked(user_id):
+        _append(user_id, {"op": "rename", "id": chat_id, "name": name})
+
+
+def delete_chat(user_id: str, chat_id: str) -> None:
+    with _locked(user_id):
+        _append(user_id, {"op": "del", "id": chat_id})
+
+
+def _read_legacy(legacy_path: str) -> Dict[str, Dict]:
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def import_legacy(user_id: str, legacy_path: str, owns_thread: Callable[[str], bool]) -> int:
+    """Move a user's chats from the old all-users chat_data.json into their journal.
+
+    The legacy file has no owner field, so each chat is claimed only if
+    owns_thread(thread_id) confirms the calling key can reach its thread.
+    Claimed chats are taken out of the legacy file and the rest are left for
+    other users; once it is empty it is renamed to <path>.migrated. A marker,
+    <user>.imported, makes this run once per user. Returns the number of
+    chats imported.
+    """
+    marker = os.path.join(CHAT_REGISTRY_DIR, f"{user_id}.imported")
+    if os.path.exists(marker):
+        return 0
+    with _locked("_legacy"):
+        raw = _read_legacy(legacy_path)
+    # One request per thread; don't hold other users up while checking
+    candidates = {
+        chat_id: data["thread_id"]
+        for chat_id, data in raw.items()
+        if data.get("thread_id") and owns_thread(data["thread_id"])
+    }
+
+    with _locked("_legacy"), _locked(user_id):
+        if os.path.exists(marker):
+            return 0
+        # Re-read: another user may have claimed chats meanwhile
+        raw = _read_legacy(legacy_path)
+        claimed = {
+            chat_id: {"name": raw[chat_id]["name"], "thread_id": thread_id}
+            for chat_id, thread_id in candidates.items()
+            if chat_id in raw and raw[chat_id].get("thread_id") == thread_id
+        }
+        if claimed:
+            chats = _replay(_journal_path(user_id))
+            for chat_id, chat in claimed.items():
+                chats.setdefault(chat_id, chat)
+            _write_snapshot(user_id, chats)
+            remaining = {chat_id: data for chat_id, data in raw.items() if chat_id not in claimed}
+            if remaining:
+                tmp_path = f"{legacy_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(remaining, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, legacy_path)
+            else:
+                os.replace(legacy_path, f"{legacy_path}.migrated")
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(f"{len(claimed)}\n")
+        return len(claimed)
@@ -0,0 +1,197 @@
+"""
+Per-key, per-endpoint circuit breakers for the Assistants API.
+
+A breaker watches a rolling window of call outcomes. Once at least
+BREAKER_MIN_CALLS calls in the last BREAKER_WINDOW seconds failed at a
+rate of BREAKER_ERROR_RATE or more, it opens: calls fail immediately with
+CircuitOpenError instead of each waiting out the client timeout. After
+BREAKER_OPEN_SECONDS (doubling on repeated trips, capped) it goes half-open
+and lets one probe call through; success closes it, failure reopens it.
+
+Only transient errors (429, 5xx, timeouts, connection failures) count as
+failures. A bad request or a revoked key says nothing about the API's
+health, so it is released without an outcome, as is a stream the caller
+stopped reading. Each API key has its own breakers, so one user's bad key
+or exhausted quota doesn't lock everyone else out.
+
+Retries go through call(), which sleeps with full jitter and spends from a
+retry budget: each call earns BREAKER_RETRY_RATIO of a retry, so a degraded
+API sees at most that fraction of extra traffic.
+"""
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Tuple
+
+import openai
+
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", 30))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 5))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 10))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv("BREAKER_MAX_OPEN_SECONDS", 120))
+BREAKER_RETRY_RATIO = float(os.getenv("BREAKER_RETRY_RATIO", 0.2))
+BREAKER_MAX_RETRIES = int(os.getenv("BREAKER_MAX_RETRIES", 2))
+BREAKER_RETRY_BASE = float(os.getenv("BREAKER_RETRY_BASE", 0.25))
+# Breakers kept at most (two per active key); the least recently used go
+BREAKER_CACHE_MAX = int(os.getenv("BREAKER_CACHE_MAX", 1024))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"{endpoint} is unavailable; retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_retriable(error: Exception) -> bool:
+    """Only errors where the server rejected the request (429, 5xx)."""
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def is_failure(error: Exception) -> bool:
+    """Errors that say the API is unhealthy: retriable ones, timeouts, no connection."""
+    return is_retriable(error) or isinstance(
+        error, (openai.APITimeoutError, openai.APIConnectionError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint: str, clock: Callable[[], float] = time.monotonic) -> None:
+        self.endpoint = endpoint
+        self._clock = clock
+        self.state = CLOSED
+        self._outcomes: "deque[Tuple[float, bool]]" = deque()
+        self._opened_at = 0.0
+        self._open_seconds = BREAKER_OPEN_SECONDS
+        self._probing = False
+        self._retry_tokens = 1.0
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "retries": 0, "trips": 0}
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > BREAKER_WINDOW:
+            self._outcomes.popleft()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            now = self._clock()
+            if self.state == OPEN:
+                remaining = self._opened_at + self._open_seconds - now
+                if remaining > 0:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(self.endpoint, remaining)
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(self.endpoint, 0)
+                self._probing = True
+            self.counters["calls"] += 1
+            self._retry_tokens = min(10.0, self._retry_tokens + BREAKER_RETRY_RATIO)
+
+    def release(self) -> None:
+        """End an allowed call without an outcome (not the API's doing)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                # Let the next call probe instead
+                self._probing = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            now = self._clock()
+            if not ok:
+                self.counters["failures"] += 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._open_seconds = BREAKER_OPEN_SECONDS
+                else:
+                    self._trip(now, backoff=True)
+                return
+            self._outcomes.append((now, ok))
+            self._prune(now)
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if (self.state == CLOSED and len(self._outcomes) >= BREAKER_MIN_CALLS
+                    and failures / len(self._outcomes) >= BREAKER_ERROR_RATE):
+                self._trip(now, backoff=False)
+
+    def _trip(self, now: float, backoff: bool) -> None:
+        if backoff:
+            self._open_seconds = min(self._open_seconds * 2, BREAKER_MAX_OPEN_SECONDS)
+        self.state = OPEN
+        self._opened_at = now
+        self.counters["trips"] += 1
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self.state != CLOSED or self._retry_tokens < 1:
+                return False
+            self._retry_tokens -= 1
+            self.counters["retries"] += 1
+            return True
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn under the breaker, retrying retriable errors within budget."""
+        attempt = 0
+        while True:
+            self.allow()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_failure(e):
+                    self.release()
+                    raise
+                self.record(False)
+                if attempt < BREAKER_MAX_RETRIES and is_retriable(e) and self._take_retry():
+                    time.sleep(random.uniform(0, BREAKER_RETRY_BASE * 2 ** attempt))
+                    attempt += 1
+                    continue
+                raise
+            self.record(True)
+            return result
+
+    def status(self) -> Dict:
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            status = dict(self.counters)
+            status["state"] = self.state
+            status["window_calls"] = len(self._outcomes)
+            status["window_failures"] = sum(1 for _, ok in self._outcomes if not ok)
+            status["retry_in"] = (max(0.0, self._opened_at + self._open_seconds - now)
+                                  if self.state == OPEN else 0.0)
+        return status
+
+
+# (key, endpoint) -> CircuitBreaker, least recently used first
+_breakers: "OrderedDict[Tuple[str, str], CircuitBreaker]" = OrderedDict()
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str, key: str) -> CircuitBreaker:
+    """The breaker for an endpoint as used by one API key (pass its hash)."""
+    with _breakers_lock:
+        breaker = _breakers.get((key, endpoint))
+        if breaker is None:
+            breaker = _breakers[(key, endpoint)] = CircuitBreaker(endpoint)
+            while len(_breakers) > BREAKER_CACHE_MAX:
+                _breakers.popitem(last=False)
+        else:
+            _breakers.move_to_end((key, endpoint))
+        return breaker
+
+
+def breaker_status(key: str) -> Dict[str, Dict]:
+    """{endpoint: status} for one key's breakers."""
+    with _breakers_lock:
+        breakers = [b for (k, _), b in _breakers.items() if k == key]
+    return {b.endpoint: b.status() for b in breakers}
@@ -0,0 +1,127 @@
+"""
+Background prefetch of chat messages.
+
+After each render the app asks a session's MessagePrefetcher to fetch the
+recently used and neighbouring chats. The fetches run on one process-wide
+pool of PREFETCH_WORKERS threads (so sessions can't pile up threads), and
+their results are kept per session for PREFETCH_MAX_AGE seconds. A chat
+switch then renders from that cache instead of waiting on the API.
+
+Streamlit has no session-end callback, so close() also runs when the
+session state holding the prefetcher is garbage-collected, cancelling
+whatever it still has queued.
+"""
+import os
+import time
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+PREFETCH_MAX_AGE = float(os.getenv("PREFETCH_MAX_AGE", 30))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def _cancel_all(futures: Dict[str, Future], lock: threading.Lock) -> None:
+    with lock:
+        for future in futures.values():
+            future.cancel()
+        futures.clear()
+
+
+class MessagePrefetcher:
+    def __init__(self, max_age: float = None) -> None:
+        self.max_age = PREFETCH_MAX_AGE if max_age is None else max_age
+        # thread_id -> (messages, fetched_at)
+        self._cache: Dict[str, Tuple[list, float]] = {}
+        # thread_id -> queued or running fetch
+        self._futures: Dict[str, Future] = {}
+        # thread_id -> bumped by invalidate(), so older fetches are discarded
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._finalizer = weakref.finalize(self, _cancel_all, self._futures, self._lock)
+
+    def get(self, thread_id: str) -> Optional[list]:
+        """Messages fetched within max_age, or None."""
+        with self._lock:
+            entry = self._cache.get(thread_id)
+            if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, thread_id: str, messages: list) -> None:
+        with self._lock:
+            self._cache[thread_id] = (messages, time.monotonic())
+
+    def invalidate(self, thread_id: str) -> None:
+        """Forget a thread, e.g. after posting to it."""
+        with self._lock:
+            self._cache.pop(thread_id, None)
+            self._generations[thread_id] = self._generations.get(thread_id, 0) + 1
+
+    def schedule(self, bots: Iterable) -> None:
+        """Queue a fetch for each bot whose thread isn't cached or in flight."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._finalizer.alive:
+                return
+            for bot in bots:
+                thread_id = bot.thread_id
+                entry = self._cache.get(thread_id)
+                if thread_id in self._futures or (entry and now - entry[1] < self.max_age / 2):
+                    continue
+                # Hold only a weak reference so queued work doesn't keep an
+                # ended session's prefetcher alive
+                self._futures[thread_id] = _executor.submit(
+                    _fetch, weakref.ref(self), bot, self._generations.get(thread_id, 0)
+                )
+
+    def _done(self, thread_id: str, messages: Optional[list], generation: int) -> None:
+        with self._lock:
+            self._futures.pop(thread_id, None)
+            if messages is not None and generation == self._generations.get(thread_id, 0):
+                self._cache[thread_id] = (messages, time.monotonic())
+
+    def close(self) -> None:
+        """Cancel queued fetches; called when the session goes away."""
+        self._finalizer()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "cached": len(self._cache), "in_flight": len(self._futures)}
+
+
+def _fetch(prefetcher_ref, bot, generation: int) -> None:
+    if prefetcher_ref() is None:
+        return
+    try:
+        messages = bot.getMessages()
+    except Exception as e:
+        print(f"⚠️ Prefetch failed for {bot.thread_id}: {e}")
+        messages = None
+    prefetcher = prefetcher_ref()
+    if prefetcher is not None:
+        prefetcher._done(bot.thread_id, messages, generation)
+
+
+def neighbours(chat_ids: List[str], current: str, recent: List[str], limit: int = 4) -> List[str]:
+    """Chats worth prefetching: those either side of current, then most recent."""
+    picks = []
+    if current in chat_ids:
+        i = chat_ids.index(current)
+        picks += [c for c in (chat_ids[i - 1] if i > 0 else None,
+                              chat_ids[i + 1] if i + 1 < len(chat_ids) else None) if c]
+    picks += [c for c in reversed(recent) if c in chat_ids]
+    seen, ordered = {current}, []
+    for chat_id in picks:
+        if chat_id not in seen:
+            seen.add(chat_id)
+            ordered.append(chat_id)
+    return ordered[:limit]
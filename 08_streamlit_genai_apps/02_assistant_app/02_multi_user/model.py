@@ -1,44 +1,326 @@
 # model.py
 import openai
 import os
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+# chat_common (helpers shared by the chat apps) lives two folders up
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from chat_common.turn_metrics import TurnMetrics
+from circuit_breaker import CircuitOpenError, get_breaker, is_failure
 
 # File to persist assistant ID
 ASSISTANT_ID_FILE = "assistant_id.txt"
 
+# How long a validation result is trusted, in seconds. Rejected keys are
+# rechecked sooner so a fixed key works again quickly.
+API_KEY_VALID_TTL = float(os.getenv("API_KEY_VALID_TTL", 600))
+API_KEY_INVALID_TTL = float(os.getenv("API_KEY_INVALID_TTL", 30))
+# Validation results kept at most. Rejected keys get their own, smaller
+# table so a flood of random keys can't push out the good ones.
+API_KEY_CACHE_MAX = int(os.getenv("API_KEY_CACHE_MAX", 1024))
+API_KEY_INVALID_CACHE_MAX = int(os.getenv("API_KEY_INVALID_CACHE_MAX", 256))
+# Seconds between background checks that the shared assistant still exists
+ASSISTANT_REVALIDATE_INTERVAL = float(os.getenv("ASSISTANT_REVALIDATE_INTERVAL", 60))
+# Threads whose messages are mirrored in memory, and the list page size
+MESSAGE_MIRROR_MAX_THREADS = int(os.getenv("MESSAGE_MIRROR_MAX_THREADS", 256))
+MESSAGE_PAGE_SIZE = 100
+# Clients (one connection pool each) kept open at most, one per API key
+CLIENT_CACHE_MAX = int(os.getenv("CLIENT_CACHE_MAX", 256))
+
+
+def api_key_hash(api_key: str) -> str:
+    """Cache key for an API key; the raw key is never stored."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+# key hash -> openai.OpenAI, least recently used first; one client (and
+# connection pool) per key
+_clients: "OrderedDict[str, openai.OpenAI]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def _close_clients(clients: list):
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"⚠️ Closing OpenAI client failed: {e}")
+
+
+def get_client(api_key: str) -> "openai.OpenAI":
+    """Shared client for an API key, so every bot reuses its connections.
+
+    At most CLIENT_CACHE_MAX clients are kept; the least recently used is
+    closed to free its sockets. The shared assistant's client is never
+    evicted.
+    """
+    key_hash = api_key_hash(api_key)
+    evicted = []
+    with _clients_lock:
+        client = _clients.get(key_hash)
+        if client is None:
+            client = _clients[key_hash] = openai.OpenAI(api_key=api_key)
+        _clients.move_to_end(key_hash)
+        for old_hash in list(_clients)[:-1]:
+            if len(_clients) <= CLIENT_CACHE_MAX:
+                break
+            if _clients[old_hash] is not SharedAssistant.client:
+                evicted.append(_clients.pop(old_hash))
+    # Closing waits on the pool; don't hold up other sessions meanwhile
+    _close_clients(evicted)
+    return client
+
+
+def discard_client(api_key: str):
+    """Close and forget the client for a key that was rejected."""
+    with _clients_lock:
+        client = _clients.pop(api_key_hash(api_key), None)
+    if client is not None and client is not SharedAssistant.client:
+        _close_clients([client])
+
+
+def owns_thread(api_key: str, thread_id: str) -> bool:
+    """True if the key can reach the thread, i.e. it is in the key's project."""
+    try:
+        get_client(api_key).beta.threads.retrieve(thread_id)
+        return True
+    except (openai.NotFoundError, openai.PermissionDeniedError):
+        return False
+
 
 class MessageItem:
+    __slots__ = ("role", "content")
+
     def __init__(self, role: str, content: str):
         self.role = role
         self.content = content
 
 
+class _ThreadMirror:
+    """Messages of one thread seen so far, and the id of the last one."""
+    __slots__ = ("messages", "cursor", "lock")
+
+    def __init__(self):
+        self.messages: List[MessageItem] = []
+        self.cursor = None
+        self.lock = threading.Lock()
+
+
+# thread_id -> _ThreadMirror, least recently used first
+_mirrors: "OrderedDict[str, _ThreadMirror]" = OrderedDict()
+_mirrors_lock = threading.Lock()
+
+
+def _get_mirror(thread_id: str) -> _ThreadMirror:
+    with _mirrors_lock:
+        mirror = _mirrors.get(thread_id)
+        if mirror is None:
+            mirror = _mirrors[thread_id] = _ThreadMirror()
+            while len(_mirrors) > MESSAGE_MIRROR_MAX_THREADS:
+                _mirrors.popitem(last=False)
+        else:
+            _mirrors.move_to_end(thread_id)
+        return mirror
+
+
 class SharedAssistant:
     assistant_id = None
     client = None
 
+    # key hash -> (valid, expires_at), least recently used first;
+    # shared by every session. Accepted keys are in _validations, rejected
+    # ones in _rejections.
+    _validations: "OrderedDict[str, tuple]" = OrderedDict()
+    _rejections: "OrderedDict[str, tuple]" = OrderedDict()
+    # key hash -> Event set when the in-flight check for it finishes
+    _validating: Dict[str, threading.Event] = {}
+    _validation_lock = threading.Lock()
+
+    # Stale-while-revalidate verdict on assistant_id; see is_assistant_valid
+    _validity = {
+        "assistant_id": None,   # id the verdict is about
+        "valid": False,
+        "last_check": None,     # wall time of the last completed check
+        "checks": 0,
+        "errors": 0,            # checks that failed without a verdict
+        "last_error": None
+    }
+    _validity_lock = threading.Lock()
+    _revalidator = None
+
+    @staticmethod
+    def _cached_validation(key_hash: str):
+        """Unexpired verdict for a key, or None; call with _validation_lock held."""
+        for table in (SharedAssistant._validations, SharedAssistant._rejections):
+            entry = table.get(key_hash)
+            if entry is None:
+                continue
+            if entry[1] > time.monotonic():
+                table.move_to_end(key_hash)
+                return entry
+            del table[key_hash]
+        return None
+
+    @staticmethod
+    def _store_validation(key_hash: str, entry: tuple):
+        """Remember a verdict, evicting the least recently used; lock held."""
+        if entry[0]:
+            table, other, limit = SharedAssistant._validations, SharedAssistant._rejections, API_KEY_CACHE_MAX
+        else:
+            table, other, limit = SharedAssistant._rejections, SharedAssistant._validations, API_KEY_INVALID_CACHE_MAX
+        other.pop(key_hash, None)
+        table[key_hash] = entry
+        table.move_to_end(key_hash)
+        while len(table) > limit:
+            table.popitem(last=False)
+
     @staticmethod
     def validate_api_key(api_key: str) -> bool:
-        """Validate the OpenAI API key."""
+        """Validate the OpenAI API key.
+
+        Results are cached per key hash for API_KEY_VALID_TTL (or
+        API_KEY_INVALID_TTL if rejected) in bounded LRU tables, and
+        concurrent sessions checking the same key share one models.list()
+        call.
+        """
+        key_hash = api_key_hash(api_key)
+        pending = None
+        with SharedAssistant._validation_lock:
+            entry = SharedAssistant._cached_validation(key_hash)
+            if entry is None:
+                pending = SharedAssistant._validating.get(key_hash)
+                if pending is None:
+                    SharedAssistant._validating[key_hash] = threading.Event()
+
+        if entry is None and pending is not None:
+            # Another session is checking this key; use its answer
+            pending.wait(timeout=30)
+            with SharedAssistant._validation_lock:
+                entry = SharedAssistant._cached_validation(key_hash)
+            if entry is None:
+                # It failed without a verdict (e.g. network error); try ourselves
+                return SharedAssistant._check_api_key(api_key, key_hash, owner=False)
+
+        if entry is not None:
+            if entry[0]:
+                SharedAssistant.client = get_client(api_key)
+            return entry[0]
+        return SharedAssistant._check_api_key(api_key, key_hash, owner=True)
+
+    @staticmethod
+    def _check_api_key(api_key: str, key_hash: str, owner: bool) -> bool:
+        entry = None
         try:
-            SharedAssistant.client = openai.OpenAI(api_key=api_key)
-            SharedAssistant.client.models.list()
-            return True
+            client = get_client(api_key)
+            client.models.list()
+            entry = (True, time.monotonic() + API_KEY_VALID_TTL)
+            SharedAssistant.client = client
+        except openai.AuthenticationError as e:
+            print(f"API key validation failed: {e}")
+            entry = (False, time.monotonic() + API_KEY_INVALID_TTL)
+            discard_client(api_key)
         except Exception as e:
+            # Not a verdict on the key; don't cache it
             print(f"API key validation failed: {e}")
-            return False
+        finally:
+            with SharedAssistant._validation_lock:
+                if entry is not None:
+                    SharedAssistant._store_validation(key_hash, entry)
+                if owner:
+                    SharedAssistant._validating.pop(key_hash).set()
+        return entry is not None and entry[0]
 
     @staticmethod
     def is_assistant_valid() -> bool:
-        """Check if the current assistant exists on OpenAI (not deleted)."""
+        """Check if the current assistant exists on OpenAI (not deleted).
+
+        A "valid" verdict for the current assistant is answered from memory
+        and refreshed every ASSISTANT_REVALIDATE_INTERVAL seconds by a
+        background thread. Only an unknown or missing assistant costs a
+        blocking retrieve.
+        """
         if not SharedAssistant.client or not SharedAssistant.assistant_id:
             return False
+        with SharedAssistant._validity_lock:
+            state = SharedAssistant._validity
+            if state["valid"] and state["assistant_id"] == SharedAssistant.assistant_id:
+                return True
+        return SharedAssistant._check_assistant(background=False)
+
+    @staticmethod
+    def _check_assistant(background: bool) -> bool:
+        assistant_id = SharedAssistant.assistant_id
+        client = SharedAssistant.client
+        if not client or not assistant_id:
+            return False
+        valid = None
         try:
-            SharedAssistant.client.beta.assistants.retrieve(SharedAssistant.assistant_id)
-            return True
-        except Exception as e:
+            client.beta.assistants.retrieve(assistant_id)
+            valid = True
+        except openai.NotFoundError as e:
             print(f"Assistant is invalid or deleted: {e}")
-            SharedAssistant.assistant_id = None
-            return False
+            valid = False
+        except Exception as e:
+            if background:
+                # Keep serving the last verdict through transient failures
+                print(f"⚠️ Assistant revalidation failed: {e}")
+            else:
+                print(f"Assistant is invalid or deleted: {e}")
+                valid = False
+            with SharedAssistant._validity_lock:
+                SharedAssistant._validity["errors"] += 1
+                SharedAssistant._validity["last_error"] = str(e)
+        with SharedAssistant._validity_lock:
+            state = SharedAssistant._validity
+            state["checks"] += 1
+            state["last_check"] = time.time()
+            if valid is not None and SharedAssistant.assistant_id == assistant_id:
+                state["assistant_id"] = assistant_id
+                state["valid"] = valid
+                if not valid:
+                    SharedAssistant.assistant_id = None
+        if valid:
+            SharedAssistant._start_revalidator()
+        return bool(valid)
+
+    @staticmethod
+    def _mark_valid(assistant_id: str):
+        with SharedAssistant._validity_lock:
+            SharedAssistant._validity["assistant_id"] = assistant_id
+            SharedAssistant._validity["valid"] = True
+        SharedAssistant._start_revalidator()
+
+    @staticmethod
+    def _start_revalidator():
+        with SharedAssistant._validity_lock:
+            if SharedAssistant._revalidator is not None:
+                return
+            SharedAssistant._revalidator = threading.Thread(
+                target=SharedAssistant._revalidate_forever, name="assistant-revalidate", daemon=True
+            )
+            SharedAssistant._revalidator.start()
+
+    @staticmethod
+    def _revalidate_forever():
+        while True:
+            time.sleep(ASSISTANT_REVALIDATE_INTERVAL)
+            with SharedAssistant._validity_lock:
+                # Missing assistants are rechecked by the next caller instead
+                due = SharedAssistant._validity["valid"]
+            if due:
+                SharedAssistant._check_assistant(background=True)
+
+    @staticmethod
+    def get_validity_status() -> dict:
+        """Current verdict plus last check time and error counts, for the UI."""
+        with SharedAssistant._validity_lock:
+            status = dict(SharedAssistant._validity)
+        status["valid"] = status["valid"] and status["assistant_id"] == SharedAssistant.assistant_id
+        return status
 
     @staticmethod
     def initialize(api_key: str, name: str, instructions: str, model: str) -> bool:
@@ -47,7 +329,7 @@ class SharedAssistant:
         Ensures one valid assistant is always available.
         """
         if SharedAssistant.client is None:
-            SharedAssistant.client = openai.OpenAI(api_key=api_key)
+            SharedAssistant.client = get_client(api_key)
 
         # Try to load saved assistant ID
         if os.path.exists(ASSISTANT_ID_FILE):
@@ -66,6 +348,7 @@ class SharedAssistant:
                 model=model
             )
             SharedAssistant.assistant_id = assistant.id
+            SharedAssistant._mark_valid(assistant.id)
             # Save for future runs
             with open(ASSISTANT_ID_FILE, "w") as f:
                 f.write(assistant.id)
@@ -84,7 +367,7 @@ class OpenAIBot:
     def __init__(self, name: str, api_key: str, thread_id: str = None):
         self.name = name
         self.api_key = api_key
-        self.client = openai.OpenAI(api_key=api_key)
+        self._client = None
 
         if thread_id:
             self.thread_id = thread_id
@@ -92,48 +375,126 @@ class OpenAIBot:
             thread = self.client.beta.threads.create()
             self.thread_id = thread.id
 
+    @property
+    def client(self) -> "openai.OpenAI":
+        """The key's shared client.
+
+        Looked up on every use, so a bot kept in the session never holds on
+        to a client that get_client has since closed. Assigning pins one.
+        """
+        if self._client is not None:
+            return self._client
+        return get_client(self.api_key)
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
     def getMessages(self) -> list:
-        """Fetch messages from OpenAI thread."""
-        try:
-            response = self.client.beta.threads.messages.list(thread_id=self.thread_id)
-            messages = []
-            for msg in reversed(response.data):
-                for content_block in msg.content:
-                    if content_block.type == "text":
-                        messages.append(MessageItem(
-                            role=msg.role,
-                            content=content_block.text.value
-                        ))
-            return messages
-        except Exception as e:
-            print(f"Error fetching messages: {e}")
-            return []
+        """Fetch messages from OpenAI thread.
+
+        Messages already seen are served from a per-thread mirror; only
+        ones after its cursor are listed from the API.
+        """
+        mirror = _get_mirror(self.thread_id)
+        with mirror.lock:
+            # Messages still being written are returned but not mirrored,
+            # so the next call lists them again
+            unfinished = []
+            after = mirror.cursor
+            try:
+                while True:
+                    params = {"thread_id": self.thread_id, "order": "asc", "limit": MESSAGE_PAGE_SIZE}
+                    if after:
+                        params["after"] = after
+                    response = self.client.beta.threads.messages.list(**params)
+                    for msg in response.data:
+                        items = [
+                            MessageItem(role=msg.role, content=content_block.text.value)
+                            for content_block in msg.content
+                            if content_block.type == "text"
+                        ]
+                        if unfinished or getattr(msg, "status", None) == "in_progress":
+                            unfinished.extend(items)
+                        else:
+                            mirror.messages.extend(items)
+                            mirror.cursor = msg.id
+                        after = msg.id
+                    if not response.has_more or not response.data:
+                        break
+            except Exception as e:
+                print(f"Error fetching messages: {e}")
+            return mirror.messages + unfinished
+
+    def stream_response(self, prompt: str, metrics: TurnMetrics = None):
+        """Stream response from assistant. Auto-healing handled in app layer.
 
-    def stream_response(self, prompt: str):
-        """Stream response from assistant. Auto-healing handled in app layer."""
+        Both API calls go through this key's per-endpoint circuit breakers,
+        so while the API is failing a prompt is answered in milliseconds.
+        """
+        if metrics is None:
+            metrics = TurnMetrics("assistant_multi_user")
+        # The breakers own retries; don't stack the client's on top
+        client = self.client.with_options(max_retries=0)
+        key_hash = api_key_hash(self.api_key)
         try:
-            self.client.beta.threads.messages.create(
-                thread_id=self.thread_id,
-                role="user",
-                content=prompt
-            )
+            # Check the run's breaker before posting: a message no run
+            # answers would be picked up by the next turn's run instead
+            runs = get_breaker("runs.stream", key_hash)
+            runs.allow()
+            ok = None
+            posted = False
+            try:
+                # Posting the message is this app's persistence step
+                with metrics.stage("persist"):
+                    get_breaker("messages.create", key_hash).call(
+                        client.beta.threads.messages.create,
+                        thread_id=self.thread_id,
+                        role="user",
+                        content=prompt
+                    )
+                posted = True
 
-            with self.client.beta.threads.runs.stream(
-                thread_id=self.thread_id,
-                assistant_id=SharedAssistant.get_assistant_id(),
-            ) as stream:
-                for event in stream:
-                    if hasattr(event, 'event') and event.event == "thread.message.delta":
-                        for content in event.data.delta.content:
-                            if content.type == "text" and content.text.value:
-                                yield content.text.value
+                # A half-read stream can't be replayed, so runs are never retried
+                request_start = time.perf_counter()
+                with client.beta.threads.runs.stream(
+                    thread_id=self.thread_id,
+                    assistant_id=SharedAssistant.get_assistant_id(),
+                ) as stream:
+                    metrics.add("llm_request", time.perf_counter() - request_start)
+                    for event in stream:
+                        if hasattr(event, 'event') and event.event == "thread.message.delta":
+                            for content in event.data.delta.content:
+                                if content.type == "text" and content.text.value:
+                                    metrics.delta(content.text.value)
+                                    yield content.text.value
+                ok = True
+            except Exception as e:
+                # Posting failures are the messages breaker's business
+                if posted and is_failure(e):
+                    ok = False
+                raise
+            finally:
+                if ok is None:
+                    # No run was started, a client error, or the session
+                    # stopped reading (GeneratorExit): says nothing about
+                    # the runs endpoint's health
+                    runs.release()
+                else:
+                    runs.record(ok)
 
+        except CircuitOpenError as e:
+            metrics.error = str(e)
+            yield f"⚠️ The tutor service is having problems, so requests are paused: {e}. Please try again shortly."
         except Exception as e:
+            metrics.error = str(e)
             yield f"🔧 Temporary issue: {str(e)}. The assistant has been restored. Please try again."
             print(f"Stream error: {e}")
 
     def delete_thread(self):
         """Delete this thread."""
+        with _mirrors_lock:
+            _mirrors.pop(self.thread_id, None)
         try:
             self.client.beta.threads.delete(self.thread_id)
         except Exception as e:
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import chat_registry
+
+
+@pytest.fixture
+def legacy(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_registry, "CHAT_REGISTRY_DIR", str(tmp_path / "registry"))
+    path = tmp_path / "chat_data.json"
+    path.write_text(json.dumps({
+        "c1": {"name": "Alice algebra", "thread_id": "thread_alice_1"},
+        "c2": {"name": "Bob geometry", "thread_id": "thread_bob_1"},
+        "c3": {"name": "Alice calculus", "thread_id": "thread_alice_2"},
+        "c4": {"name": "Never started", "thread_id": None},
+    }))
+    return path
+
+
+def key_for(owner):
+    """owns_thread for a key that can only reach its owner's threads."""
+    checked = []
+
+    def owns_thread(thread_id):
+        checked.append(thread_id)
+        return thread_id.startswith(f"thread_{owner}_")
+    owns_thread.checked = checked
+    return owns_thread
+
+
+def test_only_chats_the_key_owns_are_imported(legacy):
+    assert chat_registry.import_legacy("alice", str(legacy), key_for("alice")) == 2
+
+    assert chat_registry.load_chats("alice") == {
+        "c1": {"name": "Alice algebra", "thread_id": "thread_alice_1"},
+        "c3": {"name": "Alice calculus", "thread_id": "thread_alice_2"},
+    }
+    # Bob's chat is left for Bob
+    assert set(json.loads(legacy.read_text())) == {"c2", "c4"}
+
+
+def test_legacy_file_is_retired_once_every_chat_is_claimed(legacy):
+    chat_registry.import_legacy("alice", str(legacy), key_for("alice"))
+    legacy.write_text(json.dumps({"c2": {"name": "Bob geometry", "thread_id": "thread_bob_1"}}))
+
+    assert chat_registry.import_legacy("bob", str(legacy), key_for("bob")) == 1
+
+    assert not legacy.exists()
+    assert legacy.with_name("chat_data.json.migrated").exists()
+    assert list(chat_registry.load_chats("bob")) == ["c2"]
+
+
+def test_import_runs_once_per_user(legacy):
+    chat_registry.import_legacy("carol", str(legacy), key_for("carol"))
+    again = key_for("alice")
+
+    assert chat_registry.import_legacy("carol", str(legacy), again) == 0
+    assert again.checked == []
+    assert chat_registry.load_chats("carol") == {}
+
+
+def test_failed_check_leaves_the_import_to_retry(legacy):
+    def unreachable(thread_id):
+        raise ConnectionError("API unreachable")
+
+    with pytest.raises(ConnectionError):
+        chat_registry.import_legacy("alice", str(legacy), unreachable)
+
+    assert chat_registry.import_legacy("alice", str(legacy), key_for("alice")) == 2
+
+
+def test_existing_chats_are_kept(legacy):
+    chat_registry.put_chat("alice", "c9", "New chat", "thread_alice_9")
+
+    chat_registry.import_legacy("alice", str(legacy), key_for("alice"))
+
+    assert list(chat_registry.load_chats("alice")) == ["c9", "c1", "c3"]
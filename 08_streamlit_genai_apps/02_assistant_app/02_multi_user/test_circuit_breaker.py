@@ -0,0 +1,197 @@
+import contextlib
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import circuit_breaker
+import model
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/threads/t1/messages")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def api_error(status: int) -> openai.APIStatusError:
+    error = {400: openai.BadRequestError, 401: openai.AuthenticationError,
+             404: openai.NotFoundError, 429: openai.RateLimitError}.get(status, openai.InternalServerError)
+    return error(f"status {status}", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def fail_with(error):
+    def call():
+        raise error
+    return call
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MAX_RETRIES", 0)
+    monkeypatch.setattr(circuit_breaker, "_breakers", OrderedDict())
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def trip(breaker):
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS):
+        with pytest.raises(openai.APITimeoutError):
+            breaker.call(fail_with(openai.APITimeoutError(request=REQUEST)))
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker("messages.create", clock=clock)
+    trip(breaker)
+    assert breaker.state == OPEN
+
+    clock.now += circuit_breaker.BREAKER_OPEN_SECONDS - 1
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "ok")
+    assert breaker.status()["retry_in"] == pytest.approx(1)
+
+    clock.now += 1
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: "ok") == "ok"
+
+
+def test_failed_probe_reopens_for_longer(clock):
+    breaker = CircuitBreaker("messages.create", clock=clock)
+    trip(breaker)
+    clock.now += circuit_breaker.BREAKER_OPEN_SECONDS
+
+    with pytest.raises(openai.APIConnectionError):
+        breaker.call(fail_with(openai.APIConnectionError(request=REQUEST)))
+
+    assert breaker.state == OPEN
+    assert breaker.status()["retry_in"] == 2 * circuit_breaker.BREAKER_OPEN_SECONDS
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_do_not_trip(clock, status):
+    breaker = CircuitBreaker("messages.create", clock=clock)
+    for _ in range(3 * circuit_breaker.BREAKER_MIN_CALLS):
+        with pytest.raises(openai.APIStatusError):
+            breaker.call(fail_with(api_error(status)))
+
+    assert breaker.state == CLOSED
+    assert breaker.status()["failures"] == 0
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_errors_trip(clock, status):
+    breaker = CircuitBreaker("messages.create", clock=clock)
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS):
+        with pytest.raises(openai.APIStatusError):
+            breaker.call(fail_with(api_error(status)))
+
+    assert breaker.state == OPEN
+
+
+def test_client_error_frees_the_half_open_probe(clock):
+    breaker = CircuitBreaker("messages.create", clock=clock)
+    trip(breaker)
+    clock.now += circuit_breaker.BREAKER_OPEN_SECONDS
+
+    with pytest.raises(openai.BadRequestError):
+        breaker.call(fail_with(api_error(400)))
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_each_key_has_its_own_breakers():
+    trip(circuit_breaker.get_breaker("messages.create", "key-a"))
+
+    assert circuit_breaker.get_breaker("messages.create", "key-b").state == CLOSED
+    assert circuit_breaker.breaker_status("key-a")["messages.create"]["state"] == OPEN
+    assert circuit_breaker.breaker_status("key-b")["messages.create"]["state"] == CLOSED
+
+
+class FakeAssistantsAPI:
+    """Just enough of the client for stream_response; counts posted messages."""
+
+    def __init__(self):
+        self.posted = []
+        self.post_error = None
+        delta = SimpleNamespace(content=[SimpleNamespace(type="text", text=SimpleNamespace(value="4"))])
+        event = SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=delta))
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            messages=SimpleNamespace(create=self._post),
+            runs=SimpleNamespace(stream=lambda **kwargs: contextlib.nullcontext([event, event])),
+        ))
+
+    def with_options(self, **options):
+        return self
+
+    def _post(self, **kwargs):
+        if self.post_error is not None:
+            raise self.post_error
+        self.posted.append(kwargs["content"])
+
+
+@pytest.fixture
+def bot():
+    bot = model.OpenAIBot(name="test", api_key="sk-test", thread_id="t1")
+    bot.client = FakeAssistantsAPI()
+    return bot
+
+
+def half_open(endpoint):
+    breaker = circuit_breaker.get_breaker(endpoint, model.api_key_hash("sk-test"))
+    trip(breaker)
+    breaker._opened_at = -circuit_breaker.BREAKER_MAX_OPEN_SECONDS
+    return breaker
+
+
+def test_open_runs_breaker_posts_no_message(bot):
+    trip(circuit_breaker.get_breaker("runs.stream", model.api_key_hash("sk-test")))
+
+    reply = "".join(bot.stream_response("2 + 2?"))
+
+    assert "paused" in reply
+    assert bot.client.posted == []
+
+
+def test_failed_post_frees_the_runs_probe(bot):
+    runs = half_open("runs.stream")
+    bot.client.post_error = openai.APITimeoutError(request=REQUEST)
+
+    "".join(bot.stream_response("2 + 2?"))
+
+    # Not the runs endpoint's failure: the next prompt still gets to probe
+    assert runs.state == HALF_OPEN
+    bot.client.post_error = None
+    assert "".join(bot.stream_response("2 + 2?")) == "44"
+    assert runs.state == CLOSED
+
+
+def test_abandoned_stream_is_neither_success_nor_failure(bot):
+    runs = half_open("runs.stream")
+
+    reply = bot.stream_response("2 + 2?")
+    assert next(reply) == "4"
+    reply.close()
+
+    # Still half-open, and the next prompt may probe
+    assert runs.state == HALF_OPEN
+    assert "".join(bot.stream_response("2 + 2?")) == "44"
+    assert runs.state == CLOSED
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+import pytest
+
+import model
+from model import OpenAIBot, SharedAssistant
+
+
+class FakeClient:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def clients(monkeypatch):
+    monkeypatch.setattr(model.openai, "OpenAI", FakeClient)
+    monkeypatch.setattr(model, "_clients", OrderedDict())
+    monkeypatch.setattr(model, "CLIENT_CACHE_MAX", 2)
+    monkeypatch.setattr(SharedAssistant, "client", None)
+    return model._clients
+
+
+def test_least_recently_used_client_is_closed(clients):
+    a = model.get_client("sk-a")
+    b = model.get_client("sk-b")
+    assert model.get_client("sk-a") is a
+    c = model.get_client("sk-c")
+
+    assert b.closed and not a.closed and not c.closed
+    assert [client.api_key for client in clients.values()] == ["sk-a", "sk-c"]
+
+
+def test_shared_assistant_client_is_kept_open(clients):
+    SharedAssistant.client = model.get_client("sk-owner")
+    for n in range(5):
+        model.get_client(f"sk-{n}")
+
+    assert not SharedAssistant.client.closed
+    assert len(clients) == 2
+    assert SharedAssistant.client in clients.values()
+
+
+def test_rejected_key_client_is_discarded(clients):
+    client = model.get_client("sk-typo")
+    model.discard_client("sk-typo")
+
+    assert client.closed
+    assert not clients
+
+
+def test_bot_picks_up_a_new_client_after_eviction():
+    bot = OpenAIBot(name="test", api_key="sk-a", thread_id="t1")
+    first = bot.client
+    model.get_client("sk-b")
+    model.get_client("sk-c")
+
+    assert first.closed
+    assert bot.client is not first and not bot.client.closed
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import model
+from model import SharedAssistant
+
+
+class FakeModels:
+    """models.list() that only accepts keys starting with "sk-good"."""
+
+    def __init__(self, api_key: str, calls: list):
+        self.api_key = api_key
+        self.calls = calls
+
+    def list(self):
+        self.calls.append(self.api_key)
+        if not self.api_key.startswith("sk-good"):
+            response = httpx.Response(401, request=httpx.Request("GET", "https://api.openai.com/v1/models"))
+            raise openai.AuthenticationError("Incorrect API key provided", response=response, body=None)
+        return []
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(model, "get_client", lambda api_key: SimpleNamespace(models=FakeModels(api_key, calls)))
+    monkeypatch.setattr(SharedAssistant, "_validations", OrderedDict())
+    monkeypatch.setattr(SharedAssistant, "_rejections", OrderedDict())
+    monkeypatch.setattr(SharedAssistant, "client", None)
+    return calls
+
+
+def test_random_keys_do_not_grow_the_cache(calls, monkeypatch):
+    monkeypatch.setattr(model, "API_KEY_INVALID_CACHE_MAX", 8)
+    assert SharedAssistant.validate_api_key("sk-good-1")
+
+    for n in range(500):
+        assert not SharedAssistant.validate_api_key(f"sk-random-{n}")
+
+    assert len(SharedAssistant._rejections) == 8
+    assert len(SharedAssistant._validations) == 1
+    # The good key is still answered from memory
+    calls.clear()
+    assert SharedAssistant.validate_api_key("sk-good-1")
+    assert calls == []
+
+
+def test_accepted_keys_are_bounded_least_recently_used_first(calls, monkeypatch):
+    monkeypatch.setattr(model, "API_KEY_CACHE_MAX", 2)
+    for key in ("sk-good-a", "sk-good-b", "sk-good-a", "sk-good-c"):
+        SharedAssistant.validate_api_key(key)
+
+    assert list(SharedAssistant._validations) == [model.api_key_hash("sk-good-a"), model.api_key_hash("sk-good-c")]
+
+
+def test_rejections_are_cached_only_briefly(calls, monkeypatch):
+    assert not SharedAssistant.validate_api_key("sk-typo")
+    assert not SharedAssistant.validate_api_key("sk-typo")
+    assert calls == ["sk-typo"]
+
+    monkeypatch.setattr(model, "API_KEY_INVALID_TTL", 0)
+    assert not SharedAssistant.validate_api_key("sk-typo-2")
+    assert not SharedAssistant.validate_api_key("sk-typo-2")
+    assert calls == ["sk-typo", "sk-typo-2", "sk-typo-2"]
+    # The expired verdict was replaced, not left behind
+    assert len(SharedAssistant._rejections) == 2
+
+
+def test_network_errors_are_not_cached(calls, monkeypatch):
+    def unreachable(api_key):
+        raise openai.APIConnectionError(request=httpx.Request("GET", "https://api.openai.com/v1/models"))
+    monkeypatch.setattr(model, "get_client", unreachable)
+
+    assert not SharedAssistant.validate_api_key("sk-good-1")
+    assert not SharedAssistant._validations and not SharedAssistant._rejections
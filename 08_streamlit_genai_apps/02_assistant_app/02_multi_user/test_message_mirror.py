@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+import model
+from model import OpenAIBot
+
+
+class FakeMessages:
+    """threads.messages with the list() cursor semantics the mirror relies on."""
+
+    def __init__(self):
+        self.threads = {}
+        self.calls = []
+        self.fail = False
+
+    def add(self, thread_id: str, role: str, text: str, status: str = "completed"):
+        thread = self.threads.setdefault(thread_id, [])
+        msg = SimpleNamespace(
+            id=f"msg_{len(thread):06d}", role=role, status=status,
+            content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))]
+        )
+        thread.append(msg)
+        return msg
+
+    def list(self, thread_id: str, order: str = "desc", after: str = None, limit: int = 20):
+        self.calls.append(after)
+        if self.fail:
+            raise RuntimeError("connection reset")
+        data = self.threads.get(thread_id, [])
+        if order == "desc":
+            data = data[::-1]
+        if after is not None:
+            ids = [m.id for m in data]
+            data = data[ids.index(after) + 1:]
+        page = data[:limit]
+        return SimpleNamespace(data=page, has_more=len(data) > limit)
+
+    def delete(self, thread_id: str):
+        self.threads.pop(thread_id, None)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeMessages()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(messages=api, delete=api.delete)))
+    monkeypatch.setattr(model, "get_client", lambda api_key: client)
+    monkeypatch.setattr(model, "_mirrors", OrderedDict())
+    return api
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+def test_only_new_messages_are_listed(api):
+    for n in range(5):
+        api.add("t1", "user", f"message {n}")
+    bot = OpenAIBot(name="test", api_key="sk-test", thread_id="t1")
+
+    assert contents(bot.getMessages()) == [f"message {n}" for n in range(5)]
+    api.add("t1", "assistant", "message 5")
+    api.calls.clear()
+
+    assert contents(bot.getMessages()) == [f"message {n}" for n in range(6)]
+    assert api.calls == ["msg_000004"]
+
+
+def test_long_threads_are_paged(api, monkeypatch):
+    monkeypatch.setattr(model, "MESSAGE_PAGE_SIZE", 10)
+    for n in range(25):
+        api.add("t1", "user", f"message {n}")
+    bot = OpenAIBot(name="test", api_key="sk-test", thread_id="t1")
+
+    assert contents(bot.getMessages()) == [f"message {n}" for n in range(25)]
+    assert api.calls == [None, "msg_000009", "msg_000019"]
+
+
+def test_message_in_progress_is_listed_again(api):
+    api.add("t1", "user", "question")
+    reply = api.add("t1", "assistant", "partial", status="in_progress")
+    bot = OpenAIBot(name="test", api_key="sk-test", thread_id="t1")
+
+    assert contents(bot.getMessages()) == ["question", "partial"]
+    reply.content[0].text.value, reply.status = "full answer", "completed"
+
+    assert contents(bot.getMessages()) == ["question", "full answer"]
+    assert api.calls == [None, "msg_000000"]
+
+
+def test_sessions_on_one_thread_share_the_mirror(api):
+    api.add("t1", "user", "question")
+    OpenAIBot(name="a", api_key="sk-test", thread_id="t1").getMessages()
+    api.calls.clear()
+
+    other = OpenAIBot(name="b", api_key="sk-test", thread_id="t1")
+    assert contents(other.getMessages()) == ["question"]
+    assert api.calls == ["msg_000000"]
+
+
+def test_failed_listing_keeps_what_was_mirrored(api):
+    api.add("t1", "user", "question")
+    bot = OpenAIBot(name="test", api_key="sk-test", thread_id="t1")
+    bot.getMessages()
+
+    api.fail = True
+    assert contents(bot.getMessages()) == ["question"]
+    api.fail = False
+    api.add("t1", "assistant", "answer")
+    assert contents(bot.getMessages()) == ["question", "answer"]
+
+
+def test_mirrors_are_bounded_and_dropped_with_the_thread(api, monkeypatch):
+    monkeypatch.setattr(model, "MESSAGE_MIRROR_MAX_THREADS", 2)
+    bots = {}
+    for thread_id in ("t1", "t2", "t3"):
+        api.add(thread_id, "user", f"hello from {thread_id}")
+        bots[thread_id] = OpenAIBot(name="test", api_key="sk-test", thread_id=thread_id)
+        bots[thread_id].getMessages()
+
+    assert list(model._mirrors) == ["t2", "t3"]
+    bots["t3"].delete_thread()
+    assert list(model._mirrors) == ["t2"]
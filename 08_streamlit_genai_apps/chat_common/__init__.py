@@ -0,0 +1,6 @@
+"""
+Helpers shared by the chat apps in this folder.
+
+The apps import their own modules by bare name, so each app.py puts this
+folder's parent on sys.path and imports these as chat_common.<module>.
+"""
@@ -0,0 +1,82 @@
+import pytest
+
+from chat_common import turn_metrics
+from chat_common.stream_renderer import StreamRenderer
+from chat_common.turn_metrics import TurnMetrics, summarize
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def no_export(monkeypatch):
+    monkeypatch.setattr(turn_metrics, "TURN_METRICS_EXPORT", "")
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_render_inside_stream_is_not_counted_twice(clock):
+    metrics = TurnMetrics("test", clock=clock)
+    slow_render = metrics.timed("render", lambda text, done: clock.sleep(0.02))
+
+    with StreamRenderer(slow_render, interval=0, flush_bytes=0) as renderer:
+        with metrics.stage("stream"):
+            for delta in metrics.stream(["a", "b", "c"]):
+                clock.sleep(0.01)
+                renderer.write(delta)
+    record = metrics.finish()
+
+    stages = record["stages_s"]
+    # Three redraws while streaming plus the final one on close
+    assert stages["render"] == pytest.approx(0.08)
+    # Streaming alone; with the redraws counted again it'd be 0.09s
+    assert stages["stream"] == pytest.approx(0.03)
+    assert sum(stages.values()) == pytest.approx(record["total_s"])
+
+
+def test_time_added_inside_a_stage_is_taken_out_of_it(clock):
+    metrics = TurnMetrics("test", clock=clock)
+    metrics.add("load_history", 0.5)
+    with metrics.stage("stream"):
+        clock.sleep(0.05)
+        metrics.add("llm_request", 0.04)
+
+    assert metrics.stages["load_history"] == 0.5
+    assert metrics.stages["llm_request"] == 0.04
+    assert metrics.stages["stream"] == pytest.approx(0.01)
+
+
+def test_ttft_and_throughput_come_from_the_deltas(clock):
+    metrics = TurnMetrics("test", clock=clock)
+    clock.sleep(0.3)
+    for delta in metrics.stream(["a", "b", "c"]):
+        clock.sleep(0.1)
+    record = metrics.finish()
+
+    assert record["ttft_s"] == pytest.approx(0.3)
+    assert record["tokens"] == 3
+    # Two deltas after the first, over the 0.2s between first and last
+    assert record["tokens_per_s"] == pytest.approx(10.0)
+
+
+def test_summary_reports_mean_stage_times():
+    records = []
+    for _ in range(2):
+        metrics = TurnMetrics("test")
+        metrics.add("persist", 0.01)
+        records.append(metrics.finish())
+
+    summary = summarize(records)
+    assert summary["turns"] == 2
+    assert summary["mean_stage_ms"] == {"persist": 10.0}
@@ -0,0 +1,242 @@
+"""
+Per-turn latency instrumentation for the chat apps.
+
+A TurnMetrics covers one user turn: time to first token (TTFT), streamed
+deltas per second (one delta is roughly one token), and how long each stage
+took (history load, LLM request, render, persistence).
+
+Stage times are exclusive: a stage timed inside another one (render calls
+made while streaming) is taken out of the enclosing stage, as is time
+add()ed while a stage is open. So the stages of a turn add up to at most
+its total instead of counting the same time twice.
+
+    metrics = TurnMetrics("completion_multi_user")
+    with metrics.stage("load_history"):
+        chat = get_chat_by_id(...)
+    for delta in metrics.stream(deltas):
+        renderer.write(delta)
+    record = metrics.finish()
+
+Finished turns are exported per TURN_METRICS_EXPORT (comma-separated):
+"jsonl" appends one JSON line per turn to a size-rotated TURN_METRICS_JSONL,
+"prometheus" rewrites TURN_METRICS_PROM in the Prometheus text format (point
+node_exporter's textfile collector at it). summarize() reduces a session's
+records for the sidebar.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+TURN_METRICS_EXPORT = os.getenv("TURN_METRICS_EXPORT", "jsonl")
+TURN_METRICS_JSONL = os.getenv("TURN_METRICS_JSONL", os.path.join("metrics", "turns.jsonl"))
+TURN_METRICS_PROM = os.getenv("TURN_METRICS_PROM", os.path.join("metrics", "turns.prom"))
+TURN_METRICS_MAX_BYTES = int(os.getenv("TURN_METRICS_MAX_BYTES", 5 * 1024 * 1024))
+TURN_METRICS_BACKUPS = int(os.getenv("TURN_METRICS_BACKUPS", 3))
+
+# Upper bounds (seconds) of the TTFT and turn duration histograms
+BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+class TurnMetrics:
+    def __init__(self, app: str, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.app = app
+        self._clock = clock
+        self.started = clock()
+        self.stages: Dict[str, float] = {}
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.deltas = 0
+        self.chars = 0
+        self.error: Optional[str] = None
+        # Time spent in nested stages of each open stage, innermost last
+        self._open: List[float] = []
+
+    def _record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Count seconds measured elsewhere; inside an open stage they are taken out of it."""
+        self._record(stage, seconds)
+        if self._open:
+            self._open[-1] += seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = self._clock()
+        self._open.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - start
+            self._record(name, elapsed - self._open.pop())
+            if self._open:
+                self._open[-1] += elapsed
+
+    def timed(self, name: str, fn):
+        """Wrap a callback (e.g. a StreamRenderer render) so its calls count as `name`."""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def delta(self, text: str) -> None:
+        if not text:
+            return
+        now = self._clock()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.deltas += 1
+        self.chars += len(text)
+
+    def stream(self, deltas: Iterable[str]) -> Iterator[str]:
+        """Pass text deltas through, recording TTFT and throughput."""
+        for text in deltas:
+            self.delta(text)
+            yield text
+
+    def finish(self, error: Exception = None) -> Dict:
+        if error is not None:
+            self.error = str(error)
+        total = self._clock() - self.started
+        record = {
+            "ts": time.time(),
+            "app": self.app,
+            "total_s": round(total, 4),
+            "ttft_s": None,
+            "tokens": self.deltas,
+            "chars": self.chars,
+            "tokens_per_s": None,
+            "stages_s": {k: round(v, 4) for k, v in self.stages.items()},
+            "error": self.error
+        }
+        if self.first_token_at is not None:
+            record["ttft_s"] = round(self.first_token_at - self.started, 4)
+            generation = self.last_token_at - self.first_token_at
+            if generation > 0 and self.deltas > 1:
+                record["tokens_per_s"] = round((self.deltas - 1) / generation, 2)
+        export(record)
+        return record
+
+# --- Export ---
+_logger: Optional[logging.Logger] = None
+_lock = threading.Lock()
+_totals = {
+    "turns": {},          # (app, status) -> count
+    "tokens": {},         # app -> count
+    "stage_sum": {},      # (app, stage) -> seconds
+    "stage_count": {},    # (app, stage) -> count
+    "ttft": {},           # app -> [bucket counts..., sum, count]
+    "duration": {}        # app -> [bucket counts..., sum, count]
+}
+
+def _jsonl_logger() -> logging.Logger:
+    global _logger
+    with _lock:
+        if _logger is not None:
+            return _logger
+        logger = logging.getLogger("turn_metrics")
+        # The logger outlives a Streamlit module reload; keep one handler
+        if not logger.handlers:
+            os.makedirs(os.path.dirname(TURN_METRICS_JSONL) or ".", exist_ok=True)
+            handler = RotatingFileHandler(
+                TURN_METRICS_JSONL, maxBytes=TURN_METRICS_MAX_BYTES,
+                backupCount=TURN_METRICS_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _logger = logger
+        return _logger
+
+def _observe(histograms: Dict, app: str, value: float) -> None:
+    h = histograms.setdefault(app, [0] * len(BUCKETS) + [0.0, 0])
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            h[i] += 1
+    h[-2] += value
+    h[-1] += 1
+
+def _prometheus_text() -> str:
+    lines = [
+        "# HELP chat_turns_total Chat turns completed.",
+        "# TYPE chat_turns_total counter"
+    ]
+    for (app, status), n in sorted(_totals["turns"].items()):
+        lines.append(f'chat_turns_total{{app="{app}",status="{status}"}} {n}')
+    lines += ["# HELP chat_stream_tokens_total Streamed deltas (about one token each).",
+              "# TYPE chat_stream_tokens_total counter"]
+    for app, n in sorted(_totals["tokens"].items()):
+        lines.append(f'chat_stream_tokens_total{{app="{app}"}} {n}')
+    lines += ["# HELP chat_stage_seconds Time spent per turn stage.",
+              "# TYPE chat_stage_seconds summary"]
+    for (app, stage), total in sorted(_totals["stage_sum"].items()):
+        labels = f'app="{app}",stage="{stage}"'
+        lines.append(f"chat_stage_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"chat_stage_seconds_count{{{labels}}} {_totals['stage_count'][(app, stage)]}")
+    for metric, key, help_text in (
+        ("chat_ttft_seconds", "ttft", "Time to first streamed token."),
+        ("chat_turn_seconds", "duration", "Wall time of a whole turn.")
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for app, h in sorted(_totals[key].items()):
+            for bound, n in zip(BUCKETS, h):
+                lines.append(f'{metric}_bucket{{app="{app}",le="{bound}"}} {n}')
+            lines.append(f'{metric}_bucket{{app="{app}",le="+Inf"}} {h[-1]}')
+            lines.append(f'{metric}_sum{{app="{app}"}} {h[-2]:.6f}')
+            lines.append(f'{metric}_count{{app="{app}"}} {h[-1]}')
+    return "\n".join(lines) + "\n"
+
+def _write_prometheus() -> None:
+    os.makedirs(os.path.dirname(TURN_METRICS_PROM) or ".", exist_ok=True)
+    tmp_path = f"{TURN_METRICS_PROM}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(_prometheus_text())
+    # Scrapers must never see a half-written file
+    os.replace(tmp_path, TURN_METRICS_PROM)
+
+def export(record: Dict) -> None:
+    exporters = {e.strip() for e in TURN_METRICS_EXPORT.split(",")}
+    try:
+        if "jsonl" in exporters:
+            _jsonl_logger().info(json.dumps(record, ensure_ascii=False))
+        if "prometheus" in exporters:
+            app = record["app"]
+            with _lock:
+                status = "ok" if record["error"] is None else "error"
+                _totals["turns"][(app, status)] = _totals["turns"].get((app, status), 0) + 1
+                _totals["tokens"][app] = _totals["tokens"].get(app, 0) + record["tokens"]
+                for stage, seconds in record["stages_s"].items():
+                    _totals["stage_sum"][(app, stage)] = _totals["stage_sum"].get((app, stage), 0.0) + seconds
+                    _totals["stage_count"][(app, stage)] = _totals["stage_count"].get((app, stage), 0) + 1
+                if record["ttft_s"] is not None:
+                    _observe(_totals["ttft"], app, record["ttft_s"])
+                _observe(_totals["duration"], app, record["total_s"])
+                _write_prometheus()
+    except OSError as e:
+        # Metrics must never break a chat turn
+        print(f"⚠️ Failed to export turn metrics: {e}")
+
+def summarize(records: List[Dict]) -> Dict:
+    """Session summary for the sidebar: medians of TTFT/throughput, mean stage times."""
+    def median(values):
+        values = sorted(v for v in values if v is not None)
+        return values[len(values) // 2] if values else None
+
+    stages: Dict[str, List[float]] = {}
+    for record in records:
+        for stage, seconds in record["stages_s"].items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        "turns": len(records),
+        "errors": sum(1 for r in records if r["error"]),
+        "median_ttft_s": median(r["ttft_s"] for r in records),
+        "median_tokens_per_s": median(r["tokens_per_s"] for r in records),
+        "median_total_s": median(r["total_s"] for r in records),
+        "mean_stage_ms": {k: round(sum(v) / len(v) * 1000, 1) for k, v in stages.items()}
+    }